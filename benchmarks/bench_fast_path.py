@@ -0,0 +1,127 @@
+"""
+So sánh fast path ASGI (/fast/...) với đường WSGI hiện tại (/api/...) cho việc nhận dữ liệu
+và đọc giá trị mới nhất. Request được gửi trực tiếp vào ứng dụng trong cùng process
+(không qua mạng) nên chỉ đo chi phí của Django + database.
+
+Chạy từ thư mục gốc của dự án:
+    python benchmarks/bench_fast_path.py --requests 2000 --concurrency 500
+
+Lưu ý: dùng database thật (DJANGO_SETTINGS_MODULE) và sẽ ghi thêm Reading vào đó.
+"""
+import argparse
+import asyncio
+import io
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from urllib.parse import urlencode
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'water_monitor.settings')
+
+from water_monitor.asgi import application as asgi_application  # noqa: E402
+from django.core.wsgi import get_wsgi_application  # noqa: E402
+
+wsgi_application = get_wsgi_application()
+
+BODY = urlencode({'ph': 7.2, 'ntu': 1.5, 'tds': 320}).encode()
+FORM = [(b'content-type', b'application/x-www-form-urlencoded'), (b'host', b'localhost')]
+
+
+async def asgi_call(method, path, body=b''):
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+        'method': method, 'scheme': 'http', 'path': path, 'raw_path': path.encode(),
+        'query_string': b'', 'root_path': '', 'headers': FORM + [(b'content-length', str(len(body)).encode())],
+        'client': ('127.0.0.1', 0), 'server': ('localhost', 8000),
+    }
+    sent = False
+    status = None
+
+    async def receive():
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {'type': 'http.request', 'body': body, 'more_body': False}
+        await asyncio.sleep(3600)
+
+    async def send(message):
+        nonlocal status
+        if message['type'] == 'http.response.start':
+            status = message['status']
+
+    await asgi_application(scope, receive, send)
+    return status
+
+
+def wsgi_call(method, path, body=b''):
+    environ = {
+        'REQUEST_METHOD': method, 'PATH_INFO': path, 'QUERY_STRING': '', 'SERVER_NAME': 'localhost',
+        'SERVER_PORT': '8000', 'HTTP_HOST': 'localhost', 'REMOTE_ADDR': '127.0.0.1',
+        'CONTENT_TYPE': 'application/x-www-form-urlencoded', 'CONTENT_LENGTH': str(len(body)),
+        'wsgi.input': io.BytesIO(body), 'wsgi.url_scheme': 'http', 'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True, 'wsgi.multiprocess': False, 'wsgi.run_once': False,
+        'wsgi.version': (1, 0),
+    }
+    status = []
+    body_iter = wsgi_application(environ, lambda s, h, exc_info=None: status.append(s))
+    b''.join(body_iter)
+    return int(status[0].split()[0])
+
+
+def report(name, latencies, elapsed, statuses):
+    latencies.sort()
+    errors = sum(1 for s in statuses if s != 200)
+    print(f"{name:<28} {len(latencies) / elapsed:9.0f} req/s   "
+          f"p50 {statistics.median(latencies) * 1000:7.2f} ms   "
+          f"p99 {latencies[int(len(latencies) * 0.99) - 1] * 1000:7.2f} ms   lỗi {errors}")
+
+
+async def run_asgi(name, method, path, body, requests, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, statuses = [], []
+
+    async def one():
+        async with semaphore:
+            started = time.perf_counter()
+            statuses.append(await asgi_call(method, path, body))
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    report(name, latencies, time.perf_counter() - started, statuses)
+
+
+def run_wsgi(name, method, path, body, requests, concurrency):
+    latencies, statuses = [], []
+
+    def one(_):
+        started = time.perf_counter()
+        statuses.append(wsgi_call(method, path, body))
+        latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=min(concurrency, 64)) as pool:
+        list(pool.map(one, range(requests)))
+    report(name, latencies, time.perf_counter() - started, statuses)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=500)
+    args = parser.parse_args()
+    n, c = args.requests, args.concurrency
+
+    print(f"{n} request, {c} đồng thời (WSGI: tối đa 64 thread)")
+    asyncio.run(run_asgi('ASGI fast  POST upload', 'POST', '/fast/upload-reading/', BODY, n, c))
+    run_wsgi('WSGI       POST upload', 'POST', '/api/upload-reading/', BODY, n, c)
+    asyncio.run(run_asgi('ASGI fast  GET latest', 'GET', '/fast/latest-reading/', b'', n, c))
+    run_wsgi('WSGI       GET latest', 'GET', '/api/latest-reading/', b'', n, c)
+
+
+if __name__ == '__main__':
+    main()
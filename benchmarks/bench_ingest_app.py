@@ -0,0 +1,116 @@
+"""
+So sánh ứng dụng ingestion rút gọn (water_monitor.ingest_wsgi, settings_ingest) với ứng dụng
+đầy đủ (water_monitor.wsgi) cho một worker WSGI:
+
+- thời gian khởi động worker (import + get_wsgi_application + nạp URLconf), trung vị nhiều lần
+- RSS sau khi khởi động và sau khi xử lý request
+- chi phí mỗi request POST /api/upload-reading/ và GET /api/latest-reading/ (tuần tự, trong process)
+
+Mỗi cấu hình chạy trong một process Python mới vì settings Django là toàn cục.
+Chạy từ thư mục gốc của dự án:
+    python benchmarks/bench_ingest_app.py --requests 2000 --startups 5
+
+Lưu ý: dùng database thật (DJANGO_SETTINGS_MODULE/WATER_MONITOR_DB) và sẽ ghi thêm Reading vào đó.
+"""
+import argparse
+import io
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+PROFILES = {
+    'đầy đủ': ('water_monitor.wsgi', 'water_monitor.settings'),
+    'ingestion': ('water_monitor.ingest_wsgi', 'water_monitor.settings_ingest'),
+}
+
+
+def rss_mb():
+    with open('/proc/self/status') as status:
+        for line in status:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) / 1024
+    return float('nan')
+
+
+def call(application, method, path, body=b''):
+    environ = {
+        'REQUEST_METHOD': method, 'PATH_INFO': path, 'QUERY_STRING': '', 'SERVER_NAME': 'localhost',
+        'SERVER_PORT': '8000', 'HTTP_HOST': 'localhost', 'REMOTE_ADDR': '127.0.0.1',
+        'CONTENT_TYPE': 'application/x-www-form-urlencoded', 'CONTENT_LENGTH': str(len(body)),
+        'wsgi.input': io.BytesIO(body), 'wsgi.url_scheme': 'http', 'wsgi.errors': sys.stderr,
+        'wsgi.multithread': False, 'wsgi.multiprocess': True, 'wsgi.run_once': False,
+        'wsgi.version': (1, 0),
+    }
+    status = []
+    b''.join(application(environ, lambda s, h, exc_info=None: status.append(s)))
+    return int(status[0].split()[0])
+
+
+def per_request(application, method, path, body, requests):
+    for _ in range(min(50, requests)):  # làm nóng: kết nối DB, cache, URL resolver
+        call(application, method, path, body)
+    started = time.perf_counter()
+    errors = sum(call(application, method, path, body) != 200 for _ in range(requests))
+    return (time.perf_counter() - started) / requests * 1e6, errors
+
+
+def worker(module, requests):
+    """Chạy trong process con: đo và in kết quả dạng JSON"""
+    started = time.perf_counter()
+    import importlib
+    application = importlib.import_module(module).application
+    from django.conf import settings
+    from django.urls import get_resolver
+    get_resolver(settings.ROOT_URLCONF).url_patterns  # URLconf (và các view) được nạp ở request đầu
+    startup = time.perf_counter() - started
+    result = {'startup': startup, 'rss_start': rss_mb(), 'modules': len(sys.modules)}
+    if requests:
+        from urllib.parse import urlencode
+        body = urlencode({'ph': 7.2, 'ntu': 1.5, 'tds': 320}).encode()
+        result['upload'] = per_request(application, 'POST', '/api/upload-reading/', body, requests)
+        result['latest'] = per_request(application, 'GET', '/api/latest-reading/', b'', requests)
+        result['rss_end'] = rss_mb()
+    print(json.dumps(result))
+
+
+def spawn(module, settings_module, requests):
+    env = {**os.environ, 'DJANGO_SETTINGS_MODULE': settings_module}
+    output = subprocess.run(
+        [sys.executable, __file__, '--worker', module, '--requests', str(requests)],
+        cwd=ROOT, env=env, check=True, capture_output=True, text=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--startups', type=int, default=5)
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        sys.path.insert(0, str(ROOT))
+        worker(args.worker, args.requests)
+        return
+
+    print(f"{'cấu hình':<10} {'khởi động':>10} {'module':>7} {'RSS đầu':>9} {'RSS cuối':>9} "
+          f"{'POST upload':>13} {'GET latest':>12}")
+    for name, (module, settings_module) in PROFILES.items():
+        startups = [spawn(module, settings_module, 0) for _ in range(args.startups)]
+        run = spawn(module, settings_module, args.requests)
+        startup = statistics.median(s['startup'] for s in startups) * 1000
+        rss = statistics.median(s['rss_start'] for s in startups)
+        errors = run['upload'][1] + run['latest'][1]
+        print(f"{name:<10} {startup:8.0f} ms {run['modules']:7d} {rss:6.1f} MB {run['rss_end']:6.1f} MB "
+              f"{run['upload'][0]:9.0f} µs {run['latest'][0]:8.0f} µs" + (f"   lỗi {errors}" if errors else ""))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""
+So sánh chạy lại cảnh báo từng dòng (DeviceDetector, như worker shard) với bản vectơ hoá
+(services/replay.detect) trên dữ liệu tổng hợp trong bộ nhớ, và kiểm tra hai bên cho cùng kết quả.
+
+Chạy từ thư mục gốc của dự án:
+    python benchmarks/bench_replay.py --rows 200000 --devices 8
+
+Không đọc/ghi database; tốc độ nạp từ DB/CSV xem `manage.py replay_alerts`.
+"""
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'water_monitor.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+import numpy as np  # noqa: E402
+
+from monitoring.services.anomaly import DeviceDetector  # noqa: E402
+from monitoring.services.replay import detect  # noqa: E402
+
+INTERVAL = 60.0  # giây giữa hai Reading của một thiết bị
+
+
+def series(rows, seed):
+    rng = np.random.default_rng(seed)
+    columns = {
+        'ph': 7 + 0.1 * rng.standard_normal(rows) + (rng.random(rows) < 0.001) * 2,
+        'tds': 300 + 10 * rng.standard_normal(rows) + (rng.random(rows) < 0.0005) * 900,
+        'ntu': np.abs(1 + 0.5 * rng.standard_normal(rows)),
+    }
+    return 1.7e9 + np.arange(rows) * INTERVAL, columns
+
+
+def per_row(device_id, timestamps, columns):
+    detector, alerts = DeviceDetector(), []
+    lists = {field: values.tolist() for field, values in columns.items()}
+    for i, ts in enumerate(timestamps.tolist()):
+        alerts += detector.update(device_id, ts, {field: values[i] for field, values in lists.items()})
+    return alerts
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=200000, help="Số Reading mỗi thiết bị")
+    parser.add_argument('--devices', type=int, default=4)
+    args = parser.parse_args()
+
+    data = [series(args.rows, seed) for seed in range(args.devices)]
+    simulated = args.rows * INTERVAL * args.devices
+
+    started = time.perf_counter()
+    slow = [per_row(i, *d) for i, d in enumerate(data)]
+    slow_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    fast = [detect(i, *d) for i, d in enumerate(data)]
+    fast_time = time.perf_counter() - started
+
+    same = [[a.message for a in s] for s in slow] == [[a.message for a in f] for f in fast]
+    total = args.rows * args.devices
+    print(f"{total} bản ghi, {sum(map(len, fast))} cảnh báo, kết quả {'giống nhau' if same else 'KHÁC NHAU'}")
+    for name, elapsed in (('từng dòng', slow_time), ('vectơ hoá', fast_time)):
+        print(f"{name:<10} {elapsed:7.2f} s  {total / elapsed:12,.0f} bản ghi/s  "
+              f"nhanh gấp {simulated / elapsed:14,.0f} lần thời gian thực")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,3 +1,39 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import Alert, Device, LoginHistory, Report, UserActionHistory
+
+
+# list_select_related: __str__ và các cột user/recipient không tạo một truy vấn cho mỗi dòng
+@admin.register(Report)
+class ReportAdmin(admin.ModelAdmin):
+    list_display = ('title', 'report_type', 'recipient', 'status', 'created_at')
+    list_select_related = ('recipient',)
+    raw_id_fields = ('created_by', 'recipient', 'device', 'readings', 'forecasts')
+
+
+@admin.register(LoginHistory)
+class LoginHistoryAdmin(admin.ModelAdmin):
+    list_display = ('user', 'status', 'ip_address', 'timestamp')
+    list_select_related = ('user',)
+
+
+@admin.register(UserActionHistory)
+class UserActionHistoryAdmin(admin.ModelAdmin):
+    list_display = ('user', 'action', 'ip_address', 'timestamp')
+    list_select_related = ('user',)
+
+
+@admin.register(Alert)
+class AlertAdmin(admin.ModelAdmin):
+    list_display = ('timestamp', 'device', 'type', 'severity', 'status')
+    list_filter = ('status', 'severity', 'type')
+    list_select_related = ('device',)
+    raw_id_fields = ('device',)
+
+
+@admin.register(Device)
+class DeviceAdmin(admin.ModelAdmin):
+    list_display = ('name', 'user', 'location', 'last_reading_at', 'offline_since')
+    list_select_related = ('user',)
+    raw_id_fields = ('user',)
+    readonly_fields = ('api_key',)  # khoá cấu hình trên firmware để upload Reading có device_id
@@ -6,4 +6,5 @@ class MonitoringConfig(AppConfig):
     name = 'monitoring'
 
     def ready(self):
+        import monitoring.checks
         import monitoring.signals 
\ No newline at end of file
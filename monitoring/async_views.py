@@ -0,0 +1,63 @@
+"""
+Fast path async cho thiết bị: nhận dữ liệu và trả giá trị mới nhất.
+
+Chạy dưới ASGI (water_monitor/asgi.py) với bộ middleware rút gọn FAST_PATH_MIDDLEWARE,
+không qua session/CSRF/messages/auth. Dưới WSGI các view này vẫn dùng được (Django tự bọc).
+Khi settings.INGEST_SHARDS được cấu hình, Reading được chuyển tới worker shard (services/sharding.py).
+"""
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.db import DatabaseError, IntegrityError
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+
+from .models import Reading
+from .services import sharding
+from .services.devices import request_device_key, verify_device_key
+from .services.ingest import (
+    LATEST_READING_KEY, LATEST_READING_TIMEOUT, arecord_reading, latest_payload, local_latest, parse_reading,
+    remember_latest,
+)
+
+
+@csrf_exempt
+@require_POST
+async def upload_reading_fast(request):
+    try:
+        fields = parse_reading(request.POST)
+    except (TypeError, ValueError) as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    if 'device_id' in fields and not await sync_to_async(verify_device_key)(fields['device_id'], request_device_key(request)):
+        return JsonResponse({'error': 'Khoá thiết bị không hợp lệ'}, status=403)
+    client = sharding.get_client()
+    if client is not None:
+        try:
+            # Socket chặn: chạy trong thread pool, mỗi thread có kết nối riêng tới worker
+            result = await sync_to_async(client.submit, thread_sensitive=False)(fields)
+        except OSError as e:
+            return JsonResponse({'error': f"Worker ingestion không phản hồi: {e}"}, status=503)
+        payload, code = sharding.reply(result)
+        return JsonResponse(payload, status=code)
+    try:
+        reading = await arecord_reading(**fields)
+    except IntegrityError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    except DatabaseError:
+        return JsonResponse({'error': 'Database unavailable'}, status=503)
+    return JsonResponse({'message': 'Data received successfully', 'id': reading.pk})
+
+
+@require_GET
+async def latest_reading_fast(request):
+    data = local_latest()
+    if data is None:
+        data = await cache.aget(LATEST_READING_KEY)
+        if data is None:
+            reading = await Reading.objects.order_by('-timestamp').afirst()
+            if reading is None:
+                return JsonResponse({"error": "No data"}, status=404)
+            data = latest_payload(reading)
+            await cache.aset(LATEST_READING_KEY, data, LATEST_READING_TIMEOUT)
+        remember_latest(data)
+    return JsonResponse(data)
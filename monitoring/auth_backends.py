@@ -0,0 +1,57 @@
+"""
+Backend xác thực có cache User: AuthenticationMiddleware gọi get_user() ở mỗi request,
+bản mặc định luôn truy vấn bảng user. Bản cache bị xoá khi User được lưu/xoá
+(đổi vai trò, đổi/đặt lại mật khẩu, last_login) và khi đăng xuất, xem monitoring/signals.py.
+
+Chỉ cache các trường cần cho xác thực/phân quyền cùng session auth hash, không cache mật khẩu
+(đã băm). User dựng lại từ cache có trường password ở dạng deferred: đọc tới mới truy vấn DB,
+save() chỉ ghi các trường đã nạp. Việc xoá cache chỉ có hiệu lực ở mọi worker khi cache dùng
+chung, nên với cache trong process (LocMem) backend này không cache (monitoring/checks.py).
+
+Lưu ý: QuerySet.update() trên User không phát signal nên phải tự gọi invalidate_user().
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+
+from monitoring.checks import is_shared_cache
+
+USER_CACHE_KEY = 'auth_user:{}'
+USER_CACHE_FIELDS = (
+    'id', 'username', 'email', 'role', 'first_name', 'last_name',
+    'is_active', 'is_staff', 'is_superuser', 'last_login', 'date_joined',
+)
+
+
+def user_cache_key(user_id):
+    return USER_CACHE_KEY.format(user_id)
+
+
+def invalidate_user(user_id):
+    cache.delete(user_cache_key(user_id))
+
+
+def _from_cache(data):
+    fields, session_hash = data
+    model = get_user_model()
+    names = [f.attname for f in model._meta.concrete_fields if f.attname in fields]  # from_db cần đúng thứ tự cột
+    user = model.from_db('default', names, [fields[name] for name in names])
+    # Kiểm tra session không cần đọc mật khẩu (deferred)
+    user.get_session_auth_hash = lambda: session_hash
+    return user
+
+
+class CachedModelBackend(ModelBackend):
+    def get_user(self, user_id):
+        if not is_shared_cache():
+            return super().get_user(user_id)
+        key = user_cache_key(user_id)
+        data = cache.get(key)
+        if data is not None:
+            return _from_cache(data)
+        user = super().get_user(user_id)
+        if user is not None:
+            fields = {name: getattr(user, name) for name in USER_CACHE_FIELDS}
+            cache.set(key, (fields, user.get_session_auth_hash()), getattr(settings, 'AUTH_USER_CACHE_TIMEOUT', 300))
+        return user
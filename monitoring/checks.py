@@ -0,0 +1,31 @@
+"""
+Kiểm tra cấu hình lúc khởi động (Django system checks).
+
+Các bản cache trong process (auth_backends, services/render_cache) chỉ đúng khi việc xoá/đổi phiên
+bản từ một process có hiệu lực ở mọi process khác, tức CACHES['default'] phải là cache dùng chung
+(Redis, Memcached, database, file). Với LocMem/Dummy các tính năng đó tự tắt và check này cảnh báo.
+"""
+from django.conf import settings
+from django.core import checks
+
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def is_shared_cache(alias='default'):
+    """Cache `alias` có dùng chung giữa các process không"""
+    return settings.CACHES[alias]['BACKEND'] not in PROCESS_LOCAL_CACHES
+
+
+@checks.register(checks.Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    if is_shared_cache():
+        return []
+    return [checks.Warning(
+        "CACHES['default'] chỉ nằm trong từng process: cache User của CachedModelBackend "
+        "và cache trang/biểu đồ (services/render_cache.py) bị tắt.",
+        hint="Đặt REDIS_URL (hoặc cấu hình cache dùng chung) khi chạy nhiều worker.",
+        id='monitoring.W001',
+    )]
@@ -0,0 +1,14 @@
+from .services import alerts as alerts_service
+from .services.devices import owned_device_ids
+
+
+def alert_badge(request):
+    """Số cảnh báo NEW cho badge trên thanh điều hướng, chỉ tính khi template dùng tới"""
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        return {}
+
+    def count():
+        return alerts_service.new_count(None if user.role == 'admin' else owned_device_ids(user))
+
+    return {'new_alert_count': count}
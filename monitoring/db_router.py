@@ -0,0 +1,106 @@
+"""
+Định tuyến đọc/ghi: Reading/Forecast/Alert được đọc từ alias 'replica' trong các view/lệnh
+được đánh dấu use_replica (dashboard, báo cáo, export). Mọi thao tác ghi, auth, ingestion
+và các truy vấn khác luôn dùng 'default' (primary).
+
+Sau khi một request ghi vào các bảng trên, client được "ghim" vào primary trong
+REPLICA_STICKY_SECONDS giây (cookie, xem monitoring.middleware.ReplicaStickyMiddleware)
+để đọc được ngay dữ liệu vừa ghi.
+"""
+import logging
+import time
+from contextlib import ContextDecorator
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+REPLICA_ALIAS = 'replica'
+REPLICA_MODELS = {'reading', 'forecast', 'alert'}
+
+_use_replica = ContextVar('use_replica', default=False)
+_pinned = ContextVar('pinned_to_primary', default=False)
+_wrote = ContextVar('wrote_replicated_model', default=None)
+
+_health = {'checked_at': 0.0, 'ok': False}
+
+
+def replica_available():
+    """Replica có được cấu hình và kết nối được không (kết quả cache vài giây)"""
+    if REPLICA_ALIAS not in settings.DATABASES:
+        return False
+    now = time.monotonic()
+    if now - _health['checked_at'] >= getattr(settings, 'REPLICA_HEALTH_CHECK_INTERVAL', 10):
+        try:
+            connection = connections[REPLICA_ALIAS]
+            connection.ensure_connection()
+            ok = connection.is_usable()
+        except Exception:
+            logger.warning("Replica không kết nối được, đọc từ primary", exc_info=True)
+            ok = False
+        _health.update(checked_at=now, ok=ok)
+    return _health['ok']
+
+
+class use_replica(ContextDecorator):
+    """Cho phép đọc Reading/Forecast/Alert từ replica trong phạm vi này (decorator hoặc with)"""
+
+    def _recreate_cm(self):
+        # Mỗi lần gọi hàm được decorate dùng đối tượng riêng: các thread chạy song song
+        # không ghi đè token của nhau
+        return type(self)()
+
+    def __enter__(self):
+        self._tokens = (_use_replica.set(True), _pinned.set(_pinned.get()))
+        return self
+
+    def __exit__(self, *exc):
+        replica, pinned = self._tokens
+        _use_replica.reset(replica)
+        if _wrote.get() is None:
+            # Ngoài request (lệnh quản trị, script) việc ghim chỉ có hiệu lực trong khối này
+            _pinned.reset(pinned)
+        return False
+
+
+def _is_replicated(model):
+    return model._meta.app_label == 'monitoring' and model._meta.model_name in REPLICA_MODELS
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if _use_replica.get() and not _pinned.get() and _is_replicated(model) and replica_available():
+            return REPLICA_ALIAS
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        wrote = _wrote.get()
+        if _is_replicated(model) and (wrote is not None or _use_replica.get()):
+            if wrote is not None:
+                wrote[0] = True
+            # Trong cùng request/khối use_replica, các lần đọc sau phải thấy dữ liệu vừa ghi
+            _pinned.set(True)
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replica là bản sao của primary nên quan hệ giữa hai alias luôn hợp lệ
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return True
+
+
+def begin_request(pinned):
+    """Gọi đầu mỗi request: trả về (tokens, cờ ghi) để end_request khôi phục"""
+    wrote = [False]
+    tokens = (_pinned.set(pinned), _wrote.set(wrote), _use_replica.set(False))
+    return tokens, wrote
+
+
+def end_request(tokens):
+    pinned, wrote, replica = tokens
+    _pinned.reset(pinned)
+    _wrote.reset(wrote)
+    _use_replica.reset(replica)
@@ -0,0 +1,58 @@
+"""
+View đồng bộ cho ứng dụng chỉ nhận dữ liệu (water_monitor/settings_ingest.py).
+
+Cùng URL và định dạng với upload_reading/latest_reading trong views.py nhưng không qua DRF
+(api_view, authentication, content negotiation), và module này không import auth/mail/DRF
+nên worker khởi động nhanh và nhẹ hơn.
+
+Reading có device_id phải kèm khoá của thiết bị đó (services/devices.verify_device_key).
+Khi settings.INGEST_SHARDS được cấu hình, upload_reading chuyển Reading tới worker shard sở hữu
+thiết bị (services/sharding.py) thay vì tự ghi.
+"""
+from django.core.cache import cache
+from django.db import IntegrityError
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+
+from .models import Reading
+from .services import sharding
+from .services.devices import request_device_key, verify_device_key
+from .services.ingest import (
+    LATEST_READING_KEY, LATEST_READING_TIMEOUT, latest_payload, local_latest, parse_reading, record_reading,
+    remember_latest,
+)
+
+
+@csrf_exempt
+@require_POST
+def upload_reading(request):
+    try:
+        fields = parse_reading(request.POST)
+        if 'device_id' in fields and not verify_device_key(fields['device_id'], request_device_key(request)):
+            return JsonResponse({'error': 'Khoá thiết bị không hợp lệ'}, status=403)
+        client = sharding.get_client()
+        if client is not None:
+            payload, code = sharding.reply(client.submit(fields))
+            return JsonResponse(payload, status=code)
+        reading = record_reading(**fields)
+    except (TypeError, ValueError, IntegrityError) as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    except OSError as e:
+        return JsonResponse({'error': f"Worker ingestion không phản hồi: {e}"}, status=503)
+    return JsonResponse({'message': 'Data received successfully', 'id': reading.pk})
+
+
+@require_GET
+def latest_reading(request):
+    data = local_latest()
+    if data is None:
+        data = cache.get(LATEST_READING_KEY)
+        if data is None:
+            reading = Reading.objects.order_by('-timestamp').first()
+            if reading is None:
+                return JsonResponse({"error": "No data"}, status=404)
+            data = latest_payload(reading)
+            cache.set(LATEST_READING_KEY, data, LATEST_READING_TIMEOUT)
+        remember_latest(data)
+    return JsonResponse(data)
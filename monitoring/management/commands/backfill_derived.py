@@ -0,0 +1,72 @@
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Q
+
+from monitoring.models import Reading
+from monitoring.services import derived, render_cache
+from monitoring.services.anomaly import METRICS
+
+
+class Command(BaseCommand):
+    help = "Tính chỉ số dẫn xuất (wqi, quality_band, baseline_deviation) cho Reading cũ, theo từng batch"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--device', type=int, nargs='+')
+        parser.add_argument('--all', action='store_true', help="Tính lại cả các bản ghi đã có giá trị")
+        parser.add_argument('--baselines', action='store_true',
+                            help="Tính lại giá trị nền của thiết bị trước (trung bình BASELINE_DAYS ngày gần nhất)")
+        parser.add_argument('--stale-baselines', action='store_true',
+                            help="Chỉ tính lại giá trị nền chưa có hoặc cũ hơn BASELINE_REFRESH (chạy định kỳ)")
+
+    def handle(self, *args, **options):
+        fields = derived.fields()
+        if not fields:
+            raise CommandError("DERIVED_METRICS['METRICS'] đang trống")
+        if options['baselines']:
+            updated = derived.update_baselines(options['device'])
+            self.stdout.write(f"Đã cập nhật giá trị nền cho {updated} thiết bị")
+        elif options['stale_baselines']:
+            stale = derived.stale_devices(options['device'])
+            updated = derived.update_baselines(stale) if stale else 0
+            self.stdout.write(f"Đã cập nhật giá trị nền cho {updated} thiết bị")
+
+        readings = Reading.objects.all()
+        if options['device']:
+            readings = readings.filter(device_id__in=options['device'])
+        if not options['all']:
+            # Dòng thiếu bất kỳ cột nào đang bật (vd. chỉ số mới thêm vào METRICS)
+            missing = Q()
+            for field in fields:
+                missing |= Q(**{f'{field}__isnull': True})
+            readings = readings.filter(missing)
+
+        qn = connection.ops.quote_name
+        sql = (f"UPDATE {qn(Reading._meta.db_table)} SET "
+               f"{', '.join(f'{qn(f)} = %s' for f in fields)} WHERE {qn('id')} = %s")
+        last_pk, total = 0, 0
+        while True:
+            rows = list(
+                readings.filter(pk__gt=last_pk).order_by('pk')
+                .values_list('pk', 'device_id', *METRICS)[:options['batch_size']]
+            )
+            if not rows:
+                break
+            n = len(rows)
+            columns = {
+                metric: np.fromiter((row[i] for row in rows), dtype=np.float64, count=n)
+                for i, metric in enumerate(METRICS, start=2)
+            }
+            updates = derived.assign([Reading(pk=row[0]) for row in rows],
+                                     derived.compute([row[1] for row in rows], columns))
+            # Một câu UPDATE theo khoá chính cho mỗi dòng (executemany): bulk_update sinh CASE WHEN
+            # với cả batch cho mỗi dòng nên chậm dần theo batch_size
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.executemany(sql, [[getattr(r, f) for f in fields] + [r.pk] for r in updates])
+            last_pk = rows[-1][0]
+            total += n
+
+        if total:
+            render_cache.bump_all()  # bảng dữ liệu hiển thị WQI
+        self.stdout.write(self.style.SUCCESS(f"Đã tính chỉ số dẫn xuất cho {total} bản ghi"))
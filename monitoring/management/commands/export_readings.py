@@ -0,0 +1,44 @@
+import csv
+
+from django.core.management.base import BaseCommand
+from django.utils.dateparse import parse_datetime
+
+from monitoring.db_router import use_replica
+from monitoring.models import Reading
+
+EXPORT_FIELDS = ('id', 'device_id', 'timestamp', 'ph', 'tds', 'ntu', 'battery', 'signal', 'potability')
+
+
+class Command(BaseCommand):
+    help = "Xuất Reading ra CSV (dùng cho sensor_analysis/train_potability.py)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--out', help="File CSV đầu ra (mặc định: stdout)")
+        parser.add_argument('--device', type=int)
+        parser.add_argument('--since', help="ISO datetime")
+        parser.add_argument('--until', help="ISO datetime")
+        parser.add_argument('--chunk-size', type=int, default=5000)
+
+    @use_replica()
+    def handle(self, *args, **options):
+        readings = Reading.objects.order_by('pk')
+        if options['device'] is not None:
+            readings = readings.filter(device_id=options['device'])
+        if options['since']:
+            readings = readings.filter(timestamp__gte=parse_datetime(options['since']))
+        if options['until']:
+            readings = readings.filter(timestamp__lt=parse_datetime(options['until']))
+
+        out = open(options['out'], 'w', newline='') if options['out'] else self.stdout
+        try:
+            writer = csv.writer(out, lineterminator='\n')
+            writer.writerow(EXPORT_FIELDS)
+            count = 0
+            for row in readings.values_list(*EXPORT_FIELDS).iterator(chunk_size=options['chunk_size']):
+                writer.writerow(row)
+                count += 1
+        finally:
+            if out is not self.stdout:
+                out.close()
+        if options['out']:
+            self.stdout.write(self.style.SUCCESS(f"Đã xuất {count} bản ghi ra {options['out']}"))
@@ -0,0 +1,70 @@
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from monitoring.models import Device, LegacyImportCheckpoint
+from monitoring.services.legacy_import import (
+    LegacySource, plan_ranges, import_range, _import_range_worker,
+)
+
+
+class Command(BaseCommand):
+    help = "Nhập dữ liệu lịch sử từ bảng `sensor` cũ (water_data) sang Reading, có thể chạy tiếp khi bị ngắt"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sqlite', help="Đường dẫn file SQLite thay cho MySQL (dùng khi test)")
+        parser.add_argument('--mysql-host', default='localhost')
+        parser.add_argument('--mysql-port', default=3306, type=int)
+        parser.add_argument('--mysql-user', default='root')
+        parser.add_argument('--mysql-password', default='root')
+        parser.add_argument('--mysql-db', default='water_data')
+        parser.add_argument('--table', default='sensor')
+        parser.add_argument('--device', type=int, help="ID thiết bị gán cho các Reading được nhập")
+        parser.add_argument('--start-id', type=int, help="Bắt đầu sau id này (mặc định: MIN(id) - 1)")
+        parser.add_argument('--end-id', type=int, help="Kết thúc tại id này (mặc định: MAX(id))")
+        parser.add_argument('--chunk-size', type=int, default=5000)
+        parser.add_argument('--workers', type=int, default=1, help="Số process chạy song song theo đoạn id")
+        parser.add_argument('--source-tz', help="Múi giờ của cột created_at cũ (mặc định: TIME_ZONE)")
+
+    def handle(self, *args, **options):
+        if options['sqlite']:
+            source = LegacySource.sqlite(options['sqlite'], options['table'])
+        else:
+            source = LegacySource.mysql(
+                options['mysql_host'], options['mysql_user'], options['mysql_password'],
+                options['mysql_db'], options['mysql_port'], options['table'],
+            )
+
+        device_id = options['device']
+        if device_id is not None and not Device.objects.filter(pk=device_id).exists():
+            raise CommandError(f"Thiết bị {device_id} không tồn tại")
+
+        lo, hi = source.key_bounds()
+        source.close()
+        if lo is None:
+            self.stdout.write("Bảng nguồn không có dữ liệu")
+            return
+        end = options['end_id'] if options['end_id'] is not None else hi
+        start = options['start_id'] if options['start_id'] is not None else lo - 1
+        # Chạy tiếp các đoạn dở dang, sau đó chỉ nhập các khoảng id chưa có checkpoint
+        checkpoints = LegacyImportCheckpoint.objects.filter(source=source.label)
+        ranges = plan_ranges(
+            checkpoints.values_list('range_start', 'range_end', 'finished'), start, end, options['workers'],
+        )
+        jobs = [(source, s, e, device_id, options['chunk_size'], options['source_tz']) for s, e in ranges]
+
+        if not jobs:
+            self.stdout.write("Không có dữ liệu mới cần nhập")
+            return
+        if len(jobs) == 1:
+            total = import_range(*jobs[0])
+        else:
+            # Đóng kết nối trước khi fork để các process con không dùng chung socket
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=len(jobs)) as pool:
+                total = sum(pool.map(_import_range_worker, jobs))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Đã nhập {total} bản ghi từ {source.label} ({len(jobs)} đoạn id)"
+        ))
@@ -0,0 +1,61 @@
+import multiprocessing
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+def _serve(address, addresses):
+    """Điểm vào của process con (spawn): nạp Django rồi chạy worker"""
+    import django
+
+    django.setup()
+    from monitoring.services.shard_worker import ShardWorker
+
+    ShardWorker(address, addresses).run()
+
+
+class Command(BaseCommand):
+    help = (
+        "Chạy các worker ingestion theo shard (mỗi địa chỉ trong INGEST_SHARDS một process). "
+        "Front (water_monitor.ingest_wsgi) chuyển Reading tới worker sở hữu thiết bị."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--shards', nargs='+', help="Địa chỉ worker, mặc định settings.INGEST_SHARDS")
+        parser.add_argument('--only', help="Chỉ chạy worker có địa chỉ này trong process hiện tại")
+
+    def handle(self, *args, **options):
+        addresses = options['shards'] or list(getattr(settings, 'INGEST_SHARDS', ()))
+        if not addresses:
+            raise CommandError("Chưa cấu hình INGEST_SHARDS (hoặc --shards)")
+        if options['only']:
+            if options['only'] not in addresses:
+                raise CommandError(f"{options['only']} không có trong {addresses}")
+            from monitoring.services.shard_worker import ShardWorker
+
+            ShardWorker(options['only'], addresses).run()
+            return
+
+        context = multiprocessing.get_context('spawn')
+        processes = {}
+        try:
+            while True:
+                # Khởi động lại worker nào bị dừng; trạng thái trong bộ nhớ được dựng lại từ DB
+                for address in addresses:
+                    process = processes.get(address)
+                    if process is None or not process.is_alive():
+                        if process is not None:
+                            self.stderr.write(f"Worker {address} dừng (mã {process.exitcode}), khởi động lại")
+                        process = context.Process(target=_serve, args=(address, addresses), name=f'shard {address}')
+                        process.start()
+                        processes[address] = process
+                        self.stdout.write(f"Worker {address}: pid {process.pid}")
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            for process in processes.values():
+                process.terminate()
+            for process in processes.values():
+                process.join()
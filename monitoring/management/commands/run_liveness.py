@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from monitoring.checks import is_shared_cache
+from monitoring.services.liveness import get_config, tracker
+
+
+class Command(BaseCommand):
+    help = (
+        "Theo dõi thiết bị mất kết nối cho toàn bộ thiết bị (monitoring/services/liveness.py). "
+        "Chạy một process; process thứ hai chờ khoá leader trong cache dùng chung."
+    )
+
+    def handle(self, *args, **options):
+        if not get_config()['ENABLED']:
+            raise CommandError("LIVENESS['ENABLED'] đang tắt")
+        if not is_shared_cache():
+            self.stderr.write(
+                "CACHES['default'] không dùng chung giữa các process: khoá leader không có tác dụng "
+                "và /api/fleet-health/ đọc từ DB. Chỉ chạy một process run_liveness."
+            )
+        try:
+            tracker.run()
+        except KeyboardInterrupt:
+            pass
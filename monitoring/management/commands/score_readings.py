@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from monitoring.models import Reading
+from monitoring.services import potability
+
+
+class Command(BaseCommand):
+    help = "Chấm điểm potability cho các Reading chưa có điểm, theo từng batch"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        if potability.get_model()[0] is None:
+            raise CommandError("Chưa có mô hình potability, hãy chạy sensor_analysis/train_potability.py")
+
+        last_pk, total = 0, 0
+        while True:
+            rows = list(
+                Reading.objects.filter(potability__isnull=True, pk__gt=last_pk)
+                .order_by('pk')
+                .values_list('pk', 'device_id', 'timestamp', 'ph', 'tds', 'ntu')[:options['batch_size']]
+            )
+            if not rows:
+                break
+            potability.score_rows(rows)
+            last_pk = rows[-1][0]
+            total += len(rows)
+
+        self.stdout.write(self.style.SUCCESS(f"Đã chấm điểm {total} bản ghi"))
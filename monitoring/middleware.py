@@ -0,0 +1,32 @@
+import time
+
+from django.conf import settings
+
+from .db_router import begin_request, end_request
+
+PRIMARY_COOKIE = 'wm_primary_until'
+
+
+class ReplicaStickyMiddleware:
+    """
+    Ghim client vào primary trong REPLICA_STICKY_SECONDS giây sau khi request của họ ghi
+    vào Reading/Forecast/Alert (read-your-writes khi dùng replica).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        try:
+            pinned = float(request.COOKIES.get(PRIMARY_COOKIE, 0)) > time.time()
+        except ValueError:
+            pinned = False
+        tokens, wrote = begin_request(pinned)
+        try:
+            response = self.get_response(request)
+        finally:
+            end_request(tokens)
+        if wrote[0]:
+            seconds = getattr(settings, 'REPLICA_STICKY_SECONDS', 5)
+            response.set_cookie(PRIMARY_COOKIE, str(time.time() + seconds), max_age=seconds, httponly=True, samesite='Lax')
+        return response
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitoring', '0004_useractionhistory'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LegacyImportCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(max_length=100)),
+                ('range_start', models.BigIntegerField()),
+                ('range_end', models.BigIntegerField()),
+                ('last_id', models.BigIntegerField()),
+                ('imported', models.BigIntegerField(default=0)),
+                ('finished', models.BooleanField(default=False)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'unique_together': {('source', 'range_start', 'range_end')},
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitoring', '0005_legacyimportcheckpoint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reading',
+            name='potability',
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
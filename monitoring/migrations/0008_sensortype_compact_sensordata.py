@@ -0,0 +1,67 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def forwards(apps, schema_editor):
+    SensorType = apps.get_model('monitoring', 'SensorType')
+    SensorData = apps.get_model('monitoring', 'SensorData')
+    codes = SensorData.objects.order_by().values_list('sensor_type', flat=True).distinct()
+    for code in list(codes):
+        sensor_type = SensorType.objects.create(code=code)
+        SensorData.objects.filter(sensor_type=code).update(sensor_type_ref=sensor_type)
+
+
+def backwards(apps, schema_editor):
+    SensorType = apps.get_model('monitoring', 'SensorType')
+    SensorData = apps.get_model('monitoring', 'SensorData')
+    for sensor_type in SensorType.objects.all():
+        SensorData.objects.filter(sensor_type_ref=sensor_type).update(sensor_type=sensor_type.code)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitoring', '0007_reading_time_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SensorType',
+            fields=[
+                ('id', models.SmallAutoField(primary_key=True, serialize=False)),
+                ('code', models.CharField(max_length=50, unique=True)),
+                ('name', models.CharField(blank=True, max_length=100)),
+                ('unit', models.CharField(blank=True, max_length=20)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='sensordata',
+            name='sensor_type_ref',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='data', to='monitoring.sensortype'),
+        ),
+        migrations.RunPython(forwards, backwards),
+        # Có default để khi rollback cột cũ được tạo lại trước khi backwards() điền dữ liệu
+        migrations.AlterField(
+            model_name='sensordata',
+            name='sensor_type',
+            field=models.CharField(default='', max_length=50),
+        ),
+        migrations.RemoveField(
+            model_name='sensordata',
+            name='sensor_type',
+        ),
+        migrations.RenameField(
+            model_name='sensordata',
+            old_name='sensor_type_ref',
+            new_name='sensor_type',
+        ),
+        migrations.AlterField(
+            model_name='sensordata',
+            name='sensor_type',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='data', to='monitoring.sensortype'),
+        ),
+        migrations.AddIndex(
+            model_name='sensordata',
+            index=models.Index(fields=['device', 'sensor_type', 'timestamp'], name='monitoring__device__d34c10_idx'),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-19 07:02
+
+from django.db import migrations, models
+
+
+def fill_last_reading(apps, schema_editor):
+    Device = apps.get_model('monitoring', 'Device')
+    Reading = apps.get_model('monitoring', 'Reading')
+    for device in Device.objects.all():
+        reading = Reading.objects.filter(device=device).order_by('-timestamp').first()
+        if reading is not None:
+            Device.objects.filter(pk=device.pk).update(
+                last_reading_at=reading.timestamp, last_ph=reading.ph, last_tds=reading.tds, last_ntu=reading.ntu,
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitoring', '0008_sensortype_compact_sensordata'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='device',
+            name='last_ntu',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='device',
+            name='last_ph',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='device',
+            name='last_reading_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='device',
+            name='last_tds',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.RunPython(fill_last_reading, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-19 07:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitoring', '0009_device_last_reading'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='device',
+            name='expected_interval',
+            field=models.PositiveIntegerField(default=60),
+        ),
+        migrations.AddField(
+            model_name='device',
+            name='last_battery',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='device',
+            name='last_signal',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='device',
+            name='offline_since',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='alert',
+            name='type',
+            field=models.CharField(choices=[('RULE', 'Rule'), ('AI', 'AI'), ('FORECAST', 'Forecast'), ('DEVICE', 'Device')], max_length=20),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-19 07:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitoring', '0011_alert_status_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='device',
+            name='baseline_ntu',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='device',
+            name='baseline_ph',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='device',
+            name='baseline_tds',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='reading',
+            name='baseline_deviation',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='reading',
+            name='quality_band',
+            field=models.CharField(blank=True, choices=[('POTABLE', 'Potable'), ('NON_POTABLE', 'Non-potable')], max_length=12, null=True),
+        ),
+        migrations.AddField(
+            model_name='reading',
+            name='wqi',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='reading',
+            index=models.Index(fields=['quality_band', 'timestamp'], name='monitoring__quality_3b8111_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reading',
+            index=models.Index(fields=['wqi'], name='monitoring__wqi_5ac003_idx'),
+        ),
+    ]
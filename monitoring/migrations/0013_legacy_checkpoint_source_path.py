@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 07:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitoring', '0012_reading_derived_metrics'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='legacyimportcheckpoint',
+            name='source',
+            field=models.CharField(max_length=255),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:20
+
+from django.db import migrations, models
+
+import monitoring.models
+
+
+def fill_keys(apps, schema_editor):
+    Device = apps.get_model('monitoring', 'Device')
+    for device in Device.objects.filter(api_key__isnull=True).only('pk'):
+        device.api_key = monitoring.models.generate_device_key()
+        device.save(update_fields=['api_key'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitoring', '0013_legacy_checkpoint_source_path'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='device',
+            name='api_key',
+            field=models.CharField(editable=False, max_length=64, null=True),
+        ),
+        migrations.RunPython(fill_keys, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='device',
+            name='api_key',
+            field=models.CharField(default=monitoring.models.generate_device_key, editable=False, max_length=64, unique=True),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitoring', '0015_device_last_reading_at_index'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='reading',
+            name='monitoring__quality_3b8111_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='reading',
+            name='monitoring__wqi_5ac003_idx',
+        ),
+        migrations.AddField(
+            model_name='device',
+            name='baseline_updated_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='reading',
+            index=models.Index(fields=['device', 'quality_band', 'timestamp'], name='monitoring__device__5c97fa_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reading',
+            index=models.Index(fields=['device', 'wqi'], name='monitoring__device__522892_idx'),
+        ),
+    ]
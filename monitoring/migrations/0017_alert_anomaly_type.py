@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitoring', '0016_device_leading_derived_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='alert',
+            name='type',
+            field=models.CharField(choices=[('RULE', 'Rule'), ('ANOMALY', 'Anomaly'), ('AI', 'AI'), ('FORECAST', 'Forecast'), ('DEVICE', 'Device')], max_length=20),
+        ),
+    ]
@@ -1,7 +1,11 @@
-from django.db import models
+import secrets
+
+from django.db import models, transaction
 from django.utils import timezone
 from django.contrib.auth.models import AbstractUser
 
+from monitoring.services import render_cache
+
 class User(AbstractUser):
     ROLE_CHOICES = (
         ('admin', 'Admin'),
@@ -13,25 +17,82 @@ class User(AbstractUser):
     def __str__(self):
         return self.username
 
+def generate_device_key():
+    return secrets.token_hex(20)
+
+
 class Device(models.Model):
     name = models.CharField(max_length=100)
     location = models.CharField(max_length=200, blank=True)
     description = models.TextField(blank=True)
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='devices')  # thiết bị thuộc user nào
     created_at = models.DateTimeField(auto_now_add=True)
+    # Giá trị đo mới nhất, cập nhật khi nhận dữ liệu (services/devices.py) để dashboard
+    # không phải tìm bản ghi mới nhất trong bảng Reading
+    last_reading_at = models.DateTimeField(null=True, blank=True)
+    last_ph = models.FloatField(null=True, blank=True)
+    last_tds = models.FloatField(null=True, blank=True)
+    last_ntu = models.FloatField(null=True, blank=True)
+    # Theo dõi kết nối (services/liveness.py): chu kỳ gửi dự kiến; pin/tín hiệu ghi khi nhận dữ liệu,
+    # offline_since do tracker ghi
+    expected_interval = models.PositiveIntegerField(default=60)  # giây
+    last_battery = models.FloatField(null=True, blank=True)
+    last_signal = models.FloatField(null=True, blank=True)
+    offline_since = models.DateTimeField(null=True, blank=True)
+    # Giá trị nền (trung bình gần đây) để tính Reading.baseline_deviation (services/derived.py)
+    baseline_ph = models.FloatField(null=True, blank=True)
+    baseline_tds = models.FloatField(null=True, blank=True)
+    baseline_ntu = models.FloatField(null=True, blank=True)
+    baseline_updated_at = models.DateTimeField(null=True, blank=True)
+    # Khoá thiết bị gửi kèm khi upload Reading có device_id (header X-Device-Key hoặc trường device_key)
+    api_key = models.CharField(max_length=64, unique=True, default=generate_device_key, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['last_reading_at']),  # tracker đọc các thiết bị vừa gửi dữ liệu
+        ]
 
     def __str__(self):
         return self.name
 
+class ReadingQuerySet(models.QuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        """bulk_create không phát post_save: tự đánh dấu dữ liệu hiển thị của các thiết bị đã đổi"""
+        objs = super().bulk_create(objs, *args, **kwargs)
+        render_cache.bump(obj.device_id for obj in objs)
+        return objs
+
+
 class Reading(models.Model):
+    QUALITY_BAND_CHOICES = (
+        ('POTABLE', 'Potable'),
+        ('NON_POTABLE', 'Non-potable'),
+    )
+
     timestamp = models.DateTimeField(default=timezone.now)
     ph = models.FloatField()
     tds = models.FloatField()
     ntu = models.FloatField()
     battery = models.FloatField(null=True, blank=True)
     signal = models.FloatField(null=True, blank=True)
+    potability = models.FloatField(null=True, blank=True)  # xác suất uống được do mô hình AI chấm
     device = models.ForeignKey(Device, on_delete=models.CASCADE, related_name='readings', null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Chỉ số dẫn xuất, tính khi nhận dữ liệu hoặc bằng `manage.py backfill_derived` (services/derived.py)
+    wqi = models.FloatField(null=True, blank=True)
+    quality_band = models.CharField(max_length=12, choices=QUALITY_BAND_CHOICES, null=True, blank=True)
+    baseline_deviation = models.FloatField(null=True, blank=True)
+
+    objects = ReadingQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['device', 'timestamp']),
+            models.Index(fields=['timestamp']),
+            # Bảng dữ liệu luôn lọc theo thiết bị của user rồi mới lọc band/sắp xếp theo wqi
+            models.Index(fields=['device', 'quality_band', 'timestamp']),
+            models.Index(fields=['device', 'wqi']),
+        ]
 
     def __str__(self):
         return f"Reading {self.pk} - {self.timestamp}"
@@ -47,15 +108,115 @@ class Forecast(models.Model):
     def __str__(self):
         return f"Forecast {self.pk} - {self.timestamp}"
 
+class SensorTypeManager(models.Manager):
+    # code -> id, loại cảm biến gần như không đổi nên cache trong process. Chỉ ghi vào sau khi
+    # transaction commit (id của loại vừa tạo trong transaction bị rollback không lọt vào cache),
+    # và xoá khi SensorType được lưu/xoá (monitoring/signals.py).
+    _ids = {}
+
+    def _remember(self, ids):
+        if ids:
+            transaction.on_commit(lambda: self._ids.update(ids))
+
+    def resolve(self, codes, create=True):
+        """Trả về dict {code: id}, tạo loại cảm biến mới nếu chưa có"""
+        known = {code: self._ids[code] for code in codes if code in self._ids}
+        missing = [code for code in codes if code not in known]
+        if missing:
+            found = dict(self.filter(code__in=missing).values_list('code', 'id'))
+            if create:
+                for code in set(missing) - set(found):
+                    found[code] = self.get_or_create(code=code)[0].id
+            self._remember(found)
+            known.update(found)
+        return {code: known[code] for code in codes if code in known}
+
+    def code_for(self, type_id):
+        for code, id_ in self._ids.items():
+            if id_ == type_id:
+                return code
+        code = self.filter(pk=type_id).values_list('code', flat=True).first()
+        if code is not None:
+            self._remember({code: type_id})
+        return code
+
+    def clear_cache(self):
+        self._ids.clear()
+
+
+class SensorType(models.Model):
+    id = models.SmallAutoField(primary_key=True)
+    code = models.CharField(max_length=50, unique=True)  # ví dụ: temperature, salinity
+    name = models.CharField(max_length=100, blank=True)  # ví dụ: nhiệt độ, độ mặn
+    unit = models.CharField(max_length=20, blank=True)
+
+    objects = SensorTypeManager()
+
+    def __str__(self):
+        return self.name or self.code
+
+
+class SensorDataQuerySet(models.QuerySet):
+    def record(self, device, values, timestamp=None):
+        """Ghi nhiều loại cảm biến cùng một thời điểm: values = {code: giá trị}"""
+        timestamp = timestamp or timezone.now()
+        ids = SensorType.objects.resolve(list(values))
+        return self.bulk_create([
+            SensorData(device=device, sensor_type_id=ids[code], value=value, timestamp=timestamp)
+            for code, value in values.items()
+        ])
+
+    def series(self, device, codes, start=None, end=None):
+        """
+        Chuỗi thời gian nhiều cảm biến của một thiết bị, đã pivot sẵn trong một truy vấn.
+        Trả về dict: 'timestamp' (float64, epoch giây) và mỗi code -> mảng float64 cùng độ dài
+        (NaN nếu thời điểm đó không có giá trị của cảm biến).
+        """
+        import numpy as np  # import muộn: tiến trình nhận dữ liệu không cần numpy
+
+        ids = SensorType.objects.resolve(codes, create=False)
+        rows = self.filter(device=device, sensor_type_id__in=list(ids.values()))
+        if start is not None:
+            rows = rows.filter(timestamp__gte=start)
+        if end is not None:
+            rows = rows.filter(timestamp__lt=end)
+        columns = {
+            f'v{i}': models.Max(models.Case(models.When(sensor_type_id=ids[code], then='value')))
+            for i, code in enumerate(codes) if code in ids
+        }
+        rows = list(
+            rows.order_by().values('timestamp').annotate(**columns)
+            .order_by('timestamp').values_list('timestamp', *columns)
+        )
+        n = len(rows)
+        result = {'timestamp': np.fromiter((r[0].timestamp() for r in rows), dtype=np.float64, count=n)}
+        position = 1
+        for i, code in enumerate(codes):
+            if code in ids:
+                result[code] = np.fromiter(
+                    (np.nan if r[position] is None else r[position] for r in rows), dtype=np.float64, count=n)
+                position += 1
+            else:
+                result[code] = np.full(n, np.nan)
+        return result
+
+
 class SensorData(models.Model):
     timestamp = models.DateTimeField(default=timezone.now)
-    sensor_type = models.CharField(max_length=50)  # ví dụ: nhiệt độ, độ mặn
+    sensor_type = models.ForeignKey(SensorType, on_delete=models.PROTECT, related_name='data')
     value = models.FloatField()
     device = models.ForeignKey(Device, on_delete=models.CASCADE, related_name='sensor_data')
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = SensorDataQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['device', 'sensor_type', 'timestamp']),
+        ]
+
     def __str__(self):
-        return f"{self.sensor_type} - {self.value}"
+        return f"{SensorType.objects.code_for(self.sensor_type_id)} - {self.value}"
 
 class Alert(models.Model):
     timestamp = models.DateTimeField(default=timezone.now)
@@ -63,12 +224,19 @@ class Alert(models.Model):
     severity = models.CharField(max_length=20, choices=(
         ("LOW", "Low"), ("MEDIUM", "Medium"), ("HIGH", "High")))
     type = models.CharField(max_length=20, choices=(
-        ("RULE", "Rule"), ("AI", "AI"), ("FORECAST", "Forecast")))
+        ("RULE", "Rule"), ("ANOMALY", "Anomaly"), ("AI", "AI"), ("FORECAST", "Forecast"),
+        ("DEVICE", "Device")))
     status = models.CharField(max_length=20, choices=(
         ("NEW", "New"), ("ACK", "Acknowledged"), ("RESOLVED", "Resolved")))
     device = models.ForeignKey(Device, on_delete=models.SET_NULL, null=True, blank=True, related_name='alerts')
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'severity', 'timestamp']),
+            models.Index(fields=['device', 'status']),
+        ]
+
     def __str__(self):
         return f"Alert {self.pk} - {self.severity}"
 
@@ -121,4 +289,20 @@ class UserActionHistory(models.Model):
     timestamp = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
-        return f"{self.user} - {self.action} - {self.timestamp}"
\ No newline at end of file
+        return f"{self.user} - {self.action} - {self.timestamp}"
+
+class LegacyImportCheckpoint(models.Model):
+    """Tiến độ nhập dữ liệu từ bảng `sensor` cũ, mỗi dòng ứng với một đoạn id"""
+    source = models.CharField(max_length=255)  # mysql:<db>.<bảng> hoặc sqlite:<đường dẫn>:<bảng>
+    range_start = models.BigIntegerField()
+    range_end = models.BigIntegerField()
+    last_id = models.BigIntegerField()
+    imported = models.BigIntegerField(default=0)
+    finished = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('source', 'range_start', 'range_end')
+
+    def __str__(self):
+        return f"{self.source} ({self.range_start}, {self.range_end}] @ {self.last_id}"
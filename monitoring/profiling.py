@@ -0,0 +1,159 @@
+"""
+Đo truy vấn ORM theo view: số truy vấn, thời gian và các truy vấn lặp cùng dạng (dấu hiệu N+1).
+
+- profile_queries(): context manager/decorator ghi lại truy vấn trên mọi kết nối DB.
+- query_budget(n): khai báo số truy vấn tối đa của một view ngay trong code.
+- QueryProfilerMiddleware: bật khi settings.QUERY_PROFILER (mặc định theo DEBUG), thêm các header
+  X-Query-Count, X-Query-Time-Ms, X-Query-Duplicates, X-Query-Budget và ghi log khi view vượt ngân sách.
+- QueryBudgetTestMixin: cho TestCase, fail khi view vượt ngân sách hoặc số truy vấn tăng theo dữ liệu.
+"""
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import ContextDecorator, ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.urls import resolve
+
+from monitoring.services import render_cache
+
+logger = logging.getLogger(__name__)
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\bIN \(\?(?:, \?)*\)", re.IGNORECASE)
+_SPACES = re.compile(r"\s+")
+
+
+def fingerprint(sql):
+    """Dạng của câu SQL: bỏ tham số/hằng số để các truy vấn N+1 trùng nhau"""
+    sql = _SPACES.sub(' ', _LITERALS.sub('?', sql.replace('%s', '?')))
+    return _IN_LIST.sub('IN (...)', sql).strip()
+
+
+class QueryProfile:
+    def __init__(self, label=None):
+        self.label = label
+        self.queries = []  # (alias, sql, giây)
+
+    def __call__(self, execute, sql, params, many, context):
+        """Dùng làm connection.execute_wrapper"""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((context['connection'].alias, sql, time.perf_counter() - started))
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @property
+    def time(self):
+        return sum(elapsed for _, _, elapsed in self.queries)
+
+    def duplicates(self):
+        """[(dạng SQL, số lần)] cho các dạng chạy nhiều hơn một lần, nhiều nhất trước"""
+        counts = Counter(fingerprint(sql) for _, sql, _ in self.queries)
+        return [(sql, n) for sql, n in counts.most_common() if n > 1]
+
+    def summary(self, limit=3):
+        lines = [f"{self.label or 'truy vấn'}: {self.count} truy vấn, {self.time * 1000:.1f} ms"]
+        lines += [f"  {n}x {sql[:200]}" for sql, n in self.duplicates()[:limit]]
+        return '\n'.join(lines)
+
+
+class profile_queries(ContextDecorator):
+    """Ghi lại truy vấn trong phạm vi này; `with profile_queries() as profile: ...`"""
+
+    def __init__(self, label=None):
+        self.label = label
+
+    def _recreate_cm(self):
+        # Mỗi lần gọi hàm được decorate dùng một profile riêng (an toàn khi nhiều thread)
+        return type(self)(self.label)
+
+    def __enter__(self):
+        self.profile = QueryProfile(self.label)
+        self._stack = ExitStack()
+        for alias in connections:
+            self._stack.enter_context(connections[alias].execute_wrapper(self.profile))
+        return self.profile
+
+    def __exit__(self, *exc):
+        self._stack.close()
+        logger.debug(self.profile.summary())
+        return False
+
+
+def query_budget(limit):
+    """Số truy vấn tối đa của view; đặt trên cùng các decorator (hoặc trên class APIView)"""
+    def decorator(view):
+        view.query_budget = limit
+        return view
+    return decorator
+
+
+def budget_for(view):
+    budget = getattr(view, 'query_budget', None)
+    if budget is None:
+        budget = getattr(getattr(view, 'view_class', None), 'query_budget', None)
+    return budget
+
+
+class QueryProfilerMiddleware:
+    def __init__(self, get_response):
+        if not getattr(settings, 'QUERY_PROFILER', settings.DEBUG):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.query_budget = budget_for(view_func)
+
+    def __call__(self, request):
+        with profile_queries(request.path) as profile:
+            response = self.get_response(request)
+        duplicates = profile.duplicates()
+        response['X-Query-Count'] = str(profile.count)
+        response['X-Query-Time-Ms'] = f"{profile.time * 1000:.1f}"
+        response['X-Query-Duplicates'] = str(sum(n - 1 for _, n in duplicates))
+        budget = getattr(request, 'query_budget', None)
+        if budget is not None:
+            response['X-Query-Budget'] = str(budget)
+            if profile.count > budget:
+                logger.warning("Vượt ngân sách %d truy vấn\n%s", budget, profile.summary())
+        return response
+
+
+class QueryBudgetTestMixin:
+    """
+    Mixin cho TestCase: assertQueryBudget(path, grow=...) gọi view, so với query_budget của nó,
+    rồi chạy grow() (thêm dữ liệu) và gọi lại: số truy vấn không được tăng theo số dòng.
+    Đo khi cache trang (services/render_cache.py) trượt, tức trường hợp tốn truy vấn nhất.
+    """
+
+    def _profile_request(self, path, method, client, data):
+        client = client or self.client
+        getattr(client, method)(path, data)  # làm nóng cache (user, session, thiết bị)
+        with self.captureOnCommitCallbacks(execute=True):
+            render_cache.bump_all()
+        with profile_queries(path) as profile:
+            response = getattr(client, method)(path, data)
+        return response, profile
+
+    def assertQueryBudget(self, path, grow=None, method='get', client=None, data=None):
+        budget = budget_for(resolve(path.split('?')[0]).func)
+        if budget is None:
+            self.fail(f"{path} chưa khai báo query_budget")
+        response, profile = self._profile_request(path, method, client, data)
+        if profile.count > budget:
+            self.fail(f"Vượt ngân sách {budget}\n{profile.summary(limit=10)}")
+        if grow is not None:
+            grow()
+            response, grown = self._profile_request(path, method, client, data)
+            if grown.count > profile.count:
+                self.fail(f"Số truy vấn tăng từ {profile.count} lên {grown.count} khi dữ liệu tăng\n"
+                          f"{grown.summary(limit=10)}")
+        return response
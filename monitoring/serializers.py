@@ -1,7 +1,7 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model, authenticate
 from django.utils.translation import gettext_lazy as _
-from .models import Reading
+from .models import Alert, Reading
 
 User = get_user_model()
 
@@ -48,4 +48,9 @@ class PasswordResetSerializer(serializers.Serializer):
 class ReadingSerializer(serializers.ModelSerializer):
     class Meta:
         model = Reading
-        fields = '__all__'
\ No newline at end of file
+        fields = '__all__'
+
+class AlertSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Alert
+        fields = ('id', 'timestamp', 'message', 'severity', 'type', 'status', 'device')
@@ -0,0 +1,144 @@
+"""
+Tạo Alert và chuyển trạng thái (NEW -> ACK -> RESOLVED), kèm bộ đếm số cảnh báo NEW trong cache.
+
+Bộ đếm theo từng thiết bị (và một bộ đếm toàn hệ thống cho admin) được tăng khi tạo cảnh báo và
+giảm khi xác nhận/giải quyết, nên badge số cảnh báo chưa đọc không phải COUNT(*) mỗi trang.
+Bộ đếm thiếu hoặc hết hạn được tính lại bằng COUNT trên index (device, status); sai lệch do
+thay đổi ngoài các hàm này (admin, QuerySet.update) tự hết sau COUNTER_TIMEOUT.
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Q
+
+from monitoring.models import Alert
+from monitoring.services import notifications
+
+COUNTER_KEY = 'alert_new:{}'
+ALL_DEVICES = 'all'
+COUNTER_TIMEOUT = 3600
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+MAX_PAGE_SIZE = 200
+
+TRANSITIONS = {
+    'ACK': ('NEW',),
+    'RESOLVED': ('NEW', 'ACK'),
+}
+
+
+def _key(device_id):
+    return COUNTER_KEY.format(ALL_DEVICES if device_id is None else device_id)
+
+
+def _incr(key, delta):
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        pass  # chưa có bộ đếm: sẽ được tính lại khi đọc
+
+
+def _adjust(deltas):
+    """deltas: device_id (None nếu không gắn thiết bị) -> thay đổi số cảnh báo NEW"""
+    total = sum(deltas.values())
+    if total:
+        _incr(_key(None), total)
+    for device_id, delta in deltas.items():
+        if device_id is not None and delta:
+            _incr(_key(device_id), delta)
+
+
+def _new_per_device(alerts):
+    deltas = {}
+    for alert in alerts:
+        if alert.status == 'NEW':
+            deltas[alert.device_id] = deltas.get(alert.device_id, 0) + 1
+    return deltas
+
+
+def create_alerts(alerts):
+    """bulk_create; sau khi commit thì cập nhật bộ đếm và gửi thông báo"""
+    alerts = Alert.objects.bulk_create(alerts, batch_size=1000)
+    deltas = _new_per_device(alerts)
+    transaction.on_commit(lambda: _adjust(deltas))
+    notifications.notify(alerts)
+    return alerts
+
+
+def transition(queryset, status):
+    """
+    Chuyển các cảnh báo trong queryset sang status (ACK/RESOLVED).
+    Trả về số cảnh báo đã đổi trạng thái.
+    """
+    queryset = queryset.filter(status__in=TRANSITIONS[status])
+    deltas = {}
+    updated = 0
+    with transaction.atomic():
+        device_ids = set(queryset.filter(status='NEW').order_by().values_list('device_id', flat=True).distinct())
+        # Bộ đếm giảm đúng số dòng mà UPDATE thực sự đổi: hai request xác nhận cùng cảnh báo
+        # đồng thời không bị trừ hai lần
+        for device_id in device_ids:
+            rows = queryset.filter(status='NEW')
+            rows = rows.filter(device__isnull=True) if device_id is None else rows.filter(device_id=device_id)
+            n = rows.update(status=status)
+            deltas[device_id] = -n
+            updated += n
+        others = [s for s in TRANSITIONS[status] if s != 'NEW']
+        if others:
+            updated += queryset.filter(status__in=others).update(status=status)
+    transaction.on_commit(lambda: _adjust(deltas))
+    return updated
+
+
+def new_count(device_ids=None):
+    """Số cảnh báo NEW: device_ids=None là toàn hệ thống (admin), ngược lại là tổng các thiết bị"""
+    if device_ids is None:
+        count = cache.get(_key(None))
+        if count is None:
+            count = Alert.objects.filter(status='NEW').count()
+            cache.set(_key(None), count, COUNTER_TIMEOUT)
+        return max(count, 0)
+    if not device_ids:
+        return 0
+    keys = {_key(pk): pk for pk in device_ids}
+    cached = cache.get_many(keys)
+    missing = [pk for key, pk in keys.items() if key not in cached]
+    if missing:
+        counts = dict.fromkeys(missing, 0)
+        counts.update(
+            Alert.objects.filter(status='NEW', device_id__in=missing)
+            .order_by().values_list('device_id').annotate(n=Count('id'))
+        )
+        cache.set_many({_key(pk): n for pk, n in counts.items()}, COUNTER_TIMEOUT)
+        cached.update({_key(pk): n for pk, n in counts.items()})
+    return sum(max(n, 0) for n in cached.values())
+
+
+def encode_cursor(alert):
+    return f"{(alert.timestamp - EPOCH) // timedelta(microseconds=1)}_{alert.pk}"
+
+
+def decode_cursor(cursor):
+    """Ngược lại encode_cursor; ValueError nếu cursor không hợp lệ"""
+    try:
+        micros, pk = cursor.split('_')
+        return EPOCH + timedelta(microseconds=int(micros)), int(pk)
+    except OverflowError as e:
+        raise ValueError(f"cursor không hợp lệ: {cursor}") from e
+
+
+def page(queryset, cursor=None, limit=50):
+    """
+    Phân trang keyset theo (timestamp, id) giảm dần: không OFFSET nên trang sau nhanh như trang đầu.
+    Trả về (danh sách Alert, cursor trang sau hoặc None). limit được giới hạn trong 1..MAX_PAGE_SIZE.
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    queryset = queryset.order_by('-timestamp', '-id')
+    if cursor:
+        timestamp, pk = decode_cursor(cursor)
+        queryset = queryset.filter(Q(timestamp__lt=timestamp) | Q(timestamp=timestamp, id__lt=pk))
+    alerts = list(queryset[:limit + 1])
+    if len(alerts) > limit:
+        return alerts[:limit], encode_cursor(alerts[limit - 1])
+    return alerts, None
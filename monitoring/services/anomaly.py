@@ -0,0 +1,152 @@
+"""
+Phát hiện vi phạm ngưỡng và bất thường theo luồng, trạng thái riêng cho từng thiết bị.
+
+- RULES: ngưỡng chất lượng nước (cùng ngưỡng với dashboard). Mỗi lần giá trị vượt ngưỡng chỉ
+  tạo một cảnh báo; cảnh báo mới chỉ có khi giá trị đã về lại vùng an toàn rồi vượt tiếp.
+- Bất thường: EWMA trung bình/phương sai cho từng chỉ số; giá trị lệch quá Z_THRESHOLD độ lệch
+  chuẩn (sau WARMUP mẫu) tạo một cảnh báo cho mỗi đợt bất thường.
+
+detect() được gọi từ services/ingest.after_ingest cho mọi đường nhận dữ liệu; trạng thái nằm trong
+bộ nhớ của process chạy after_ingest. Khi cấu hình INGEST_SHARDS, đó là worker sở hữu thiết bị (xem
+services/sharding.py) nên mỗi thiết bị có đúng một trạng thái. Không có shard, mỗi process giữ trạng
+thái riêng: thiết bị gửi xen kẽ qua nhiều worker có thể nhận cảnh báo trùng.
+Vi phạm ngưỡng tạo Alert type RULE, bất thường tạo Alert type ANOMALY.
+services/replay.py chạy lại đúng logic này trên dữ liệu lịch sử dạng mảng (không ghi Alert).
+"""
+import math
+import threading
+from dataclasses import dataclass
+
+from monitoring.models import Alert
+
+METRICS = ('ph', 'tds', 'ntu')
+
+
+@dataclass(frozen=True)
+class Rule:
+    field: str
+    low: float = None
+    high: float = None
+    severity: str = 'MEDIUM'
+    label: str = ''
+
+    def violated(self, value):
+        return (self.low is not None and value < self.low) or (self.high is not None and value > self.high)
+
+    def describe(self):
+        if self.low is not None and self.high is not None:
+            return f"ngoài khoảng {self.low}–{self.high}"
+        if self.high is not None:
+            return f"trên {self.high}"
+        return f"dưới {self.low}"
+
+
+RULES = (
+    Rule('ph', low=6.5, high=8.5, severity='HIGH', label='pH'),
+    Rule('tds', high=1000, severity='MEDIUM', label='TDS'),
+    Rule('ntu', high=10, severity='MEDIUM', label='Độ đục'),
+)
+
+def rule_message(rule, value):
+    return f"{rule.label} = {value:g} {rule.describe()}"
+
+
+def anomaly_message(metric, value, mean):
+    return f"{metric} = {value:g} bất thường (trung bình gần đây {mean:.2f})"
+
+
+ALPHA = 0.05        # trọng số mẫu mới trong EWMA
+Z_THRESHOLD = 4.0
+WARMUP = 30         # số mẫu tối thiểu trước khi xét bất thường
+MIN_STD = {'ph': 0.05, 'tds': 5.0, 'ntu': 0.2}  # tránh báo động khi tín hiệu gần như phẳng
+
+
+class Ewma:
+    __slots__ = ('mean', 'var', 'count')
+
+    def __init__(self):
+        self.mean = 0.0
+        self.var = 0.0
+        self.count = 0
+
+    def score(self, value, min_std):
+        """Độ lệch (theo độ lệch chuẩn) của value so với trạng thái hiện tại"""
+        std = max(math.sqrt(self.var), min_std)
+        return abs(value - self.mean) / std
+
+    def update(self, value):
+        if self.count == 0:
+            self.mean = value
+        else:
+            diff = value - self.mean
+            increment = ALPHA * diff
+            self.mean += increment
+            self.var = (1 - ALPHA) * (self.var + diff * increment)
+        self.count += 1
+
+
+class DeviceDetector:
+    """Trạng thái phát hiện của một thiết bị; update() trả về danh sách Alert chưa lưu"""
+
+    __slots__ = ('active', 'ewma')
+
+    def __init__(self):
+        self.active = set()  # các rule/chỉ số đang trong đợt vi phạm hoặc bất thường
+        self.ewma = {metric: Ewma() for metric in METRICS}
+
+    def update(self, device_id, timestamp, values):
+        alerts = []
+        for rule in RULES:
+            value = values.get(rule.field)
+            if value is None:
+                continue
+            key = ('rule', rule.field)
+            if rule.violated(value):
+                if key not in self.active:
+                    self.active.add(key)
+                    alerts.append(Alert(
+                        timestamp=timestamp, device_id=device_id, type='RULE', status='NEW', severity=rule.severity,
+                        message=rule_message(rule, value),
+                    ))
+            else:
+                self.active.discard(key)
+        for metric in METRICS:
+            value = values.get(metric)
+            if value is None:
+                continue
+            ewma = self.ewma[metric]
+            key = ('anomaly', metric)
+            if ewma.count >= WARMUP and ewma.score(value, MIN_STD[metric]) > Z_THRESHOLD:
+                if key not in self.active:
+                    self.active.add(key)
+                    alerts.append(Alert(
+                        timestamp=timestamp, device_id=device_id, type='ANOMALY', status='NEW', severity='LOW',
+                        message=anomaly_message(metric, value, ewma.mean),
+                    ))
+            else:
+                self.active.discard(key)
+            ewma.update(value)
+        return alerts
+
+
+_detectors = {}
+_lock = threading.Lock()
+
+
+def detect(readings):
+    """Cập nhật trạng thái của các thiết bị theo Reading vừa ghi (theo thời gian đo); trả về Alert chưa lưu"""
+    alerts = []
+    with _lock:
+        for reading in sorted((r for r in readings if r.device_id is not None), key=lambda r: r.timestamp):
+            detector = _detectors.get(reading.device_id)
+            if detector is None:
+                detector = _detectors[reading.device_id] = DeviceDetector()
+            alerts += detector.update(reading.device_id, reading.timestamp,
+                                      {metric: getattr(reading, metric) for metric in METRICS})
+    return alerts
+
+
+def reset():
+    """Xoá trạng thái phát hiện trong process (dùng cho test)"""
+    with _lock:
+        _detectors.clear()
@@ -0,0 +1,193 @@
+"""
+Chỉ số dẫn xuất từ ph/tds/ntu, tính theo batch NumPy và lưu thành cột của Reading để dashboard
+lọc/sắp xếp qua index thay vì tính lại mỗi request.
+
+- wqi: chỉ số chất lượng nước, trung bình có trọng số của các chỉ số phụ. Chỉ số phụ của mỗi
+  thông số là 0 tại giá trị lý tưởng và 100 khi chạm ngưỡng của anomaly.RULES.
+- quality_band: POTABLE nếu không vi phạm ngưỡng nào, ngược lại NON_POTABLE.
+- baseline_deviation: độ lệch lớn nhất so với giá trị nền của thiết bị, tính theo đơn vị
+  BASELINE_TOLERANCE (trên 1 là bất thường so với thường ngày của thiết bị đó).
+
+Danh sách chỉ số được tính lấy từ settings.DERIVED_METRICS['METRICS']; thêm chỉ số mới bằng
+@expression('<tên cột Reading>'). Tính khi nhận dữ liệu (services/ingest.py) và cho dữ liệu cũ
+bằng `manage.py backfill_derived`.
+
+Khi nhận dữ liệu chỉ dùng giá trị nền đã lưu trên Device (qua cache), không tính lại. Giá trị nền
+chưa có hoặc cũ hơn BASELINE_REFRESH giây được tính lại bởi `manage.py backfill_derived
+--stale-baselines` (chạy định kỳ, vd. cron mỗi giờ); lệnh này cũng điền baseline_deviation cho các
+bản ghi nhận trước khi thiết bị có giá trị nền.
+
+numpy chỉ được import trong các hàm tính: services/ingest.py import module này và tiến trình nhận
+dữ liệu (settings_ingest) không được nạp numpy lúc khởi động.
+"""
+import math
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Avg, Q
+from django.utils import timezone
+
+from monitoring.models import Device, Reading
+from monitoring.services.anomaly import METRICS, RULES
+
+DEFAULTS = {
+    'METRICS': ('wqi', 'quality_band', 'baseline_deviation'),
+    'WQI_IDEAL': {'ph': 7.0, 'tds': 0.0, 'ntu': 0.0},
+    'WQI_WEIGHTS': {'ph': 1.0, 'tds': 1.0, 'ntu': 1.0},
+    'BASELINE_TOLERANCE': {'ph': 0.5, 'tds': 100.0, 'ntu': 1.0},
+    'BASELINE_DAYS': 30,
+    'BASELINE_REFRESH': 86400,  # giây
+}
+
+BASELINE_KEY = 'device_baseline:{}'
+BASELINE_TIMEOUT = 3600
+
+EXPRESSIONS = {}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'DERIVED_METRICS', {})}
+
+
+def expression(name):
+    """Đăng ký hàm (columns, baselines, config) -> mảng cho cột `name` của Reading"""
+    def decorator(func):
+        EXPRESSIONS[name] = func
+        return func
+    return decorator
+
+
+@expression('wqi')
+def wqi(columns, baselines, config):
+    import numpy as np
+    ideal, weights = config['WQI_IDEAL'], config['WQI_WEIGHTS']
+    total = np.zeros(len(columns['ph']))
+    for rule in RULES:
+        values = columns[rule.field]
+        center = ideal[rule.field]
+        low = -np.inf if rule.low is None else rule.low
+        high = np.inf if rule.high is None else rule.high
+        limit = np.where(values >= center, high, low)
+        total += weights[rule.field] * 100 * np.abs(values - center) / np.abs(limit - center)
+    return total / sum(weights[rule.field] for rule in RULES)
+
+
+@expression('quality_band')
+def quality_band(columns, baselines, config):
+    import numpy as np
+    violated = np.zeros(len(columns['ph']), dtype=bool)
+    for rule in RULES:
+        values = columns[rule.field]
+        if rule.low is not None:
+            violated |= values < rule.low
+        if rule.high is not None:
+            violated |= values > rule.high
+    return np.where(violated, 'NON_POTABLE', 'POTABLE').astype(object)
+
+
+@expression('baseline_deviation')
+def baseline_deviation(columns, baselines, config):
+    import numpy as np
+    tolerance = config['BASELINE_TOLERANCE']
+    deviation = np.zeros(len(columns['ph']))
+    for metric in METRICS:
+        deviation = np.fmax(deviation, np.abs(columns[metric] - baselines[metric]) / tolerance[metric])
+    # NaN khi thiết bị chưa có giá trị nền
+    return np.where(np.isnan(baselines['ph']), np.nan, deviation)
+
+
+def baselines(device_ids):
+    """{device_id: (ph, tds, ntu)} giá trị nền của thiết bị (cache, xoá khi update_baselines)"""
+    keys = {BASELINE_KEY.format(pk): pk for pk in set(device_ids) if pk is not None}
+    found = {keys[key]: value for key, value in cache.get_many(keys).items()}
+    missing = [pk for pk in keys.values() if pk not in found]
+    if missing:
+        loaded = {pk: (None, None, None) for pk in missing}
+        for pk, ph, tds, ntu in Device.objects.filter(pk__in=missing).values_list(
+                'pk', 'baseline_ph', 'baseline_tds', 'baseline_ntu'):
+            loaded[pk] = (ph, tds, ntu)
+        cache.set_many({BASELINE_KEY.format(pk): value for pk, value in loaded.items()}, BASELINE_TIMEOUT)
+        found.update(loaded)
+    return found
+
+
+def _refresh(device_ids=None, days=None):
+    """Ghi giá trị nền mới xuống Device, trả về {device_id: (ph, tds, ntu)} của các thiết bị có dữ liệu"""
+    days = days or get_config()['BASELINE_DAYS']
+    now = timezone.now()
+    readings = Reading.objects.filter(timestamp__gte=now - timedelta(days=days), device__isnull=False)
+    if device_ids is not None:
+        readings = readings.filter(device_id__in=device_ids)
+    means = readings.values('device_id').annotate(ph=Avg('ph'), tds=Avg('tds'), ntu=Avg('ntu')).order_by()
+    devices = [
+        Device(pk=row['device_id'], baseline_ph=row['ph'], baseline_tds=row['tds'], baseline_ntu=row['ntu'],
+               baseline_updated_at=now)
+        for row in means
+    ]
+    Device.objects.bulk_update(
+        devices, ['baseline_ph', 'baseline_tds', 'baseline_ntu', 'baseline_updated_at'], batch_size=500,
+    )
+    cache.delete_many([BASELINE_KEY.format(device.pk) for device in devices])
+    return {device.pk: (device.baseline_ph, device.baseline_tds, device.baseline_ntu) for device in devices}
+
+
+def update_baselines(device_ids=None, days=None):
+    """Tính lại giá trị nền = trung bình BASELINE_DAYS ngày gần nhất; trả về số thiết bị đã cập nhật"""
+    return len(_refresh(device_ids, days))
+
+
+def stale_devices(device_ids=None):
+    """Id các thiết bị chưa có giá trị nền hoặc đã cũ hơn BASELINE_REFRESH giây"""
+    stale_before = timezone.now() - timedelta(seconds=get_config()['BASELINE_REFRESH'])
+    devices = Device.objects.filter(Q(baseline_updated_at__isnull=True) | Q(baseline_updated_at__lt=stale_before))
+    if device_ids is not None:
+        devices = devices.filter(pk__in=device_ids)
+    return list(devices.values_list('pk', flat=True))
+
+
+def compute(device_ids, columns, config=None):
+    """
+    device_ids: danh sách id thiết bị (có thể None), columns: {ph, tds, ntu: mảng float64}.
+    Trả về {tên cột: mảng} cho các chỉ số được bật.
+    """
+    import numpy as np
+    config = config or get_config()
+    known = baselines(device_ids)
+    empty = (None, None, None)
+    rows = [known.get(pk, empty) for pk in device_ids]
+    base = {
+        metric: np.array([np.nan if row[i] is None else row[i] for row in rows], dtype=np.float64)
+        for i, metric in enumerate(METRICS)
+    }
+    return {name: EXPRESSIONS[name](columns, base, config) for name in config['METRICS']}
+
+
+def _python(value):
+    if isinstance(value, str):
+        return value
+    value = float(value)
+    return None if math.isnan(value) else value
+
+
+def assign(readings, values):
+    """Gán kết quả của compute() vào các đối tượng Reading (NaN thành None)"""
+    for name, array in values.items():
+        for reading, value in zip(readings, array.tolist()):
+            setattr(reading, name, _python(value))
+    return readings
+
+
+def fields():
+    """Các cột Reading được tính (dùng cho bulk_update)"""
+    return list(get_config()['METRICS'])
+
+
+def apply(readings):
+    """Gán chỉ số dẫn xuất vào các Reading chưa lưu (gọi ngay trước khi ghi)"""
+    if not readings:
+        return readings
+    import numpy as np
+    columns = {metric: np.fromiter((getattr(r, metric) for r in readings), dtype=np.float64, count=len(readings))
+               for metric in METRICS}
+    return assign(readings, compute([r.device_id for r in readings], columns))
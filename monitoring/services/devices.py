@@ -0,0 +1,57 @@
+"""Thiết bị thuộc user nào (cache), khoá thiết bị và giá trị đo mới nhất của từng thiết bị"""
+from django.core.cache import cache
+from django.db.models import Q
+from django.utils.crypto import constant_time_compare
+
+from monitoring.models import Device
+
+DEVICE_IDS_KEY = 'user_devices:{}'
+DEVICE_IDS_TIMEOUT = 3600
+
+
+def owned_device_ids(user):
+    """Danh sách id thiết bị của user; cache bị xoá khi Device thay đổi (monitoring/signals.py)"""
+    key = DEVICE_IDS_KEY.format(user.pk)
+    ids = cache.get(key)
+    if ids is None:
+        ids = list(Device.objects.filter(user_id=user.pk).order_by('pk').values_list('pk', flat=True))
+        cache.set(key, ids, DEVICE_IDS_TIMEOUT)
+    return ids
+
+
+def invalidate_device_ids(user_id):
+    cache.delete(DEVICE_IDS_KEY.format(user_id))
+
+
+def request_device_key(request):
+    """Khoá thiết bị gửi kèm request: header X-Device-Key hoặc trường form device_key"""
+    return request.headers.get('X-Device-Key') or request.POST.get('device_key') or ''
+
+
+def verify_device_key(device_id, key):
+    """Khoá có đúng của thiết bị device_id không (Reading có device_id phải kèm khoá)"""
+    if not key:
+        return False
+    stored = Device.objects.filter(pk=device_id).values_list('api_key', flat=True).first()
+    return stored is not None and constant_time_compare(stored, key)
+
+
+def update_last_readings(readings):
+    """Ghi giá trị mới nhất vào Device, bỏ qua bản ghi cũ hơn giá trị đang có (dữ liệu đến trễ)"""
+    latest = {}
+    for reading in readings:
+        if reading.device_id is not None:
+            current = latest.get(reading.device_id)
+            if current is None or reading.timestamp > current.timestamp:
+                latest[reading.device_id] = reading
+    for device_id, reading in latest.items():
+        # Đây cũng là heartbeat cho services/liveness.py: thiết bị gửi dữ liệu thì không còn offline
+        fields = {'last_reading_at': reading.timestamp, 'last_ph': reading.ph, 'last_tds': reading.tds,
+                  'last_ntu': reading.ntu, 'offline_since': None}
+        if reading.battery is not None:
+            fields['last_battery'] = reading.battery
+        if reading.signal is not None:
+            fields['last_signal'] = reading.signal
+        Device.objects.filter(
+            Q(last_reading_at__isnull=True) | Q(last_reading_at__lte=reading.timestamp), pk=device_id,
+        ).update(**fields)
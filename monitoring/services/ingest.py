@@ -0,0 +1,212 @@
+"""Ghi nhận dữ liệu mới từ thiết bị và chạy các bước xử lý sau khi ghi"""
+import asyncio
+import logging
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.db import IntegrityError, connections
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from monitoring.models import Reading
+from monitoring.services import alerts as alerts_service, anomaly, derived, devices, potability
+
+logger = logging.getLogger(__name__)
+
+LATEST_READING_KEY = 'latest_reading'
+LATEST_READING_TIMEOUT = 300
+# Bản sao trong process của giá trị mới nhất, để fast path không phải hỏi cache mỗi request
+LATEST_LOCAL_TTL = 1.0
+_latest_local = (0.0, None)
+
+
+OPTIONAL_FIELDS = ('battery', 'signal')
+
+
+def parse_reading(data):
+    """Đọc ph/ntu/tds (+ battery, signal, device_id, timestamp nếu có) từ form; ValueError nếu sai kiểu"""
+    fields = {name: float(data.get(name, 0)) for name in ('ph', 'ntu', 'tds')}
+    for name in OPTIONAL_FIELDS:
+        if data.get(name) not in (None, ''):
+            fields[name] = float(data[name])
+    if data.get('device_id') not in (None, ''):
+        fields['device_id'] = int(data['device_id'])
+    if data.get('timestamp'):
+        # Thời điểm đo do thiết bị gửi (dùng để bỏ bản gửi trùng khi chạy chế độ shard)
+        timestamp = parse_datetime(data['timestamp'])
+        if timestamp is None:
+            raise ValueError(f"timestamp không hợp lệ: {data['timestamp']}")
+        fields['timestamp'] = timestamp if timezone.is_aware(timestamp) else timezone.make_aware(timestamp)
+    return fields
+
+
+def latest_payload(reading):
+    return {
+        "ph": reading.ph,
+        "ntu": reading.ntu,
+        "tds": reading.tds,
+        "timestamp": reading.timestamp.isoformat(),
+    }
+
+
+def remember_latest(payload):
+    global _latest_local
+    _latest_local = (time.monotonic() + LATEST_LOCAL_TTL, payload)
+
+
+def local_latest():
+    expires, payload = _latest_local
+    return payload if time.monotonic() < expires else None
+
+
+def after_ingest(readings, background=False):
+    """Các bước chạy sau khi Reading đã được ghi (một hoặc nhiều bản ghi)"""
+    payload = latest_payload(max(readings, key=lambda r: r.timestamp))
+    cache.set(LATEST_READING_KEY, payload, LATEST_READING_TIMEOUT)
+    remember_latest(payload)
+    devices.update_last_readings(readings)
+    alerts = anomaly.detect(readings)
+    if alerts:
+        alerts_service.create_alerts(alerts)
+    for reading in readings:
+        potability.batcher.submit(reading, background=background)
+
+
+def with_derived(readings):
+    """Gán chỉ số dẫn xuất trước khi ghi; lỗi ở đây không được làm mất dữ liệu đo"""
+    try:
+        derived.apply(readings)
+    except Exception:
+        logger.exception("Lỗi khi tính chỉ số dẫn xuất")
+    return readings
+
+
+def fill_pks(readings):
+    """
+    bulk_create trên MySQL (không có RETURNING) không gán id: đọc lại id theo thiết bị, thời điểm đo
+    và created_at (Django gán lúc chèn). Các dòng trùng cả ba nhận id theo thứ tự đã chèn.
+    """
+    missing = [r for r in readings if r.pk is None]
+    if not missing:
+        return readings
+    created = [r.created_at for r in missing]
+    rows = (
+        Reading.objects.filter(created_at__range=(min(created), max(created)))
+        .order_by('pk').values_list('pk', 'device_id', 'timestamp', 'created_at')
+    )
+    ids = defaultdict(deque)
+    for pk, device_id, timestamp, created_at in rows:
+        ids[device_id, timestamp, created_at].append(pk)
+    for reading in missing:
+        queue = ids.get((reading.device_id, reading.timestamp, reading.created_at))
+        if queue:
+            reading.pk = queue.popleft()
+    return readings
+
+
+def record_reading(ph, tds, ntu, **fields):
+    reading = with_derived([Reading(ph=ph, tds=tds, ntu=ntu, **fields)])[0]
+    reading.save(force_insert=True)
+    after_ingest([reading])
+    return reading
+
+
+def write_readings(readings, background=True):
+    """
+    Ghi một batch Reading bằng bulk_create rồi chạy after_ingest.
+    Trả về danh sách lỗi (None nếu ghi thành công) theo thứ tự readings.
+    """
+    with_derived(readings)
+    try:
+        fill_pks(Reading.objects.bulk_create(readings))
+        errors = [None] * len(readings)
+    except IntegrityError:
+        # Một bản ghi lỗi (vd. device_id không tồn tại) không làm hỏng cả batch
+        errors = []
+        for reading in readings:
+            try:
+                reading.save(force_insert=True)
+                errors.append(None)
+            except IntegrityError as e:
+                errors.append(e)
+    saved = [r for r, e in zip(readings, errors) if e is None]
+    if saved:
+        try:
+            after_ingest(saved, background=background)
+        except Exception:
+            logger.exception("Lỗi khi xử lý sau ghi Reading")
+    return errors
+
+
+class AsyncReadingWriter:
+    """
+    Gộp các Reading từ nhiều request async đồng thời thành một bulk_create (group commit).
+    Mỗi request chờ tới khi batch chứa nó đã được ghi xong. Việc ghi chạy trong một thread
+    riêng của writer (không phải thread của request đã tạo task, vốn kết thúc cùng request đó)
+    nên event loop không bị chặn và chỉ dùng một kết nối database để ghi.
+    """
+
+    def __init__(self, max_batch=500, max_delay=0.005):
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='reading-writer')
+        self._loop = None
+        self._queue = None
+        self._task = None
+
+    def _ensure_task(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._task is None or self._task.done():
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._task = loop.create_task(self._run())
+
+    async def write(self, reading):
+        self._ensure_task()
+        future = self._loop.create_future()
+        await self._queue.put((reading, future))
+        return await future
+
+    async def _run(self):
+        while True:
+            batch = [await self._queue.get()]
+            deadline = self._loop.time() + self.max_delay
+            while len(batch) < self.max_batch:
+                timeout = deadline - self._loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            try:
+                results = await sync_to_async(self._commit, thread_sensitive=False, executor=self._executor)(
+                    [r for r, _ in batch])
+            except Exception as e:
+                # Lỗi ngoài IntegrityError (vd. mất kết nối DB): báo lỗi cho mọi request trong batch
+                # thay vì để task ghi chết và các request chờ mãi
+                logger.exception("Lỗi khi ghi batch Reading")
+                results = [e] * len(batch)
+            for (reading, future), error in zip(batch, results):
+                if future.done():
+                    continue
+                if error is None:
+                    future.set_result(reading)
+                else:
+                    future.set_exception(error)
+
+    def _commit(self, readings):
+        errors = write_readings(readings)
+        connections['default'].close_if_unusable_or_obsolete()
+        return errors
+
+
+writer = AsyncReadingWriter()
+
+
+async def arecord_reading(ph, tds, ntu, **fields):
+    """Bản async của record_reading cho fast path ASGI, ghi theo group commit"""
+    return await writer.write(Reading(ph=ph, tds=tds, ntu=ntu, **fields))
@@ -0,0 +1,180 @@
+"""
+Nhập dữ liệu lịch sử từ bảng `sensor` cũ (insert.php / plot_data.py) sang Reading.
+
+Bảng cũ có dạng: sensor(id, ph, ntu, tds, created_at). Dữ liệu được đọc theo
+từng đoạn khóa chính (id > last_id AND id <= range_end), ghi bằng bulk_create
+và lưu checkpoint trong cùng một transaction, nên có thể dừng/chạy lại bất kỳ
+lúc nào mà không bị trùng dữ liệu. Dòng thiếu ph/ntu/tds (NULL) bị bỏ qua.
+"""
+import os
+import re
+import sqlite3
+from datetime import datetime
+from functools import partial
+from zoneinfo import ZoneInfo
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from monitoring.models import LegacyImportCheckpoint, Reading
+from monitoring.services.ingest import with_derived
+
+IDENTIFIER_RE = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+
+def _mysql_connect(**kwargs):
+    # Hàm cấp module (không phải closure) để LegacySource pickle được sang process con
+    import pymysql
+    from pymysql.cursors import SSCursor
+    # SSCursor: server-side cursor, không nạp cả kết quả vào RAM
+    return pymysql.connect(cursorclass=SSCursor, **kwargs)
+
+
+class LegacySource:
+    """Kết nối tới bảng cũ (MySQL hoặc SQLite thay thế khi test)"""
+
+    def __init__(self, connect, placeholder, table='sensor', label=None):
+        if not IDENTIFIER_RE.match(table):
+            raise ValueError(f"Tên bảng không hợp lệ: {table!r}")
+        self._connect = connect
+        self.placeholder = placeholder
+        self.table = table
+        self.label = label or table
+        self.conn = None
+
+    @classmethod
+    def mysql(cls, host, user, password, database, port=3306, table='sensor'):
+        connect = partial(_mysql_connect, host=host, user=user, password=password, database=database, port=int(port))
+        return cls(connect, '%s', table, label=f"mysql:{database}.{table}")
+
+    @classmethod
+    def sqlite(cls, path, table='sensor'):
+        path = os.path.abspath(path)
+        return cls(partial(sqlite3.connect, path), '?', table, label=f"sqlite:{path}:{table}")
+
+    def open(self):
+        if self.conn is None:
+            self.conn = self._connect()
+        return self
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    def __getstate__(self):
+        # Mỗi process tự mở kết nối riêng
+        state = self.__dict__.copy()
+        state['conn'] = None
+        return state
+
+    def key_bounds(self):
+        cur = self.open().conn.cursor()
+        cur.execute(f"SELECT MIN(id), MAX(id) FROM {self.table}")
+        lo, hi = cur.fetchone()
+        cur.close()
+        return lo, hi
+
+    def fetch_chunk(self, after_id, end_id, limit):
+        p = self.placeholder
+        cur = self.open().conn.cursor()
+        cur.execute(
+            f"SELECT id, created_at, ph, ntu, tds FROM {self.table} "
+            f"WHERE id > {p} AND id <= {p} ORDER BY id LIMIT {p}",
+            (after_id, end_id, limit),
+        )
+        rows = list(cur)
+        cur.close()
+        return rows
+
+
+def split_ranges(lo, hi, parts):
+    """Chia khoảng id [lo, hi] thành `parts` đoạn (start, end] liên tiếp"""
+    parts = max(1, int(parts))
+    start = lo - 1
+    step = max(1, -(-(hi - start) // parts))
+    ranges = []
+    while start < hi:
+        end = min(hi, start + step)
+        ranges.append((start, end))
+        start = end
+    return ranges
+
+
+def plan_ranges(checkpoints, start, end, parts):
+    """
+    Các đoạn cần chạy để phủ (start, end]: đoạn dở dang đã lưu (giữ nguyên biên) cộng với các
+    khoảng chưa có checkpoint nào, chia thành `parts` đoạn. checkpoints: [(range_start, range_end, finished)].
+    Biên đoạn cũ được dùng lại nên đổi --start-id/--workers khi chạy lại không nhập trùng.
+    """
+    ranges, cursor = [], start
+    for range_start, range_end, finished in sorted(checkpoints):
+        if range_end <= start or range_start >= end:
+            continue
+        if range_start > cursor:
+            ranges += split_ranges(cursor + 1, range_start, parts)
+        if not finished:
+            ranges.append((range_start, range_end))
+        cursor = max(cursor, range_end)
+    if cursor < end:
+        ranges += split_ranges(cursor + 1, end, parts)
+    return ranges
+
+
+def _parse_timestamp(value, tz):
+    if value is None:
+        return timezone.now()
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value, tz)
+    return value
+
+
+def import_range(source, range_start, range_end, device_id=None, chunk_size=5000, source_tz=None):
+    """
+    Nhập các dòng có id trong (range_start, range_end].
+    Tiếp tục từ checkpoint nếu đoạn này đã chạy dở. Trả về số dòng đã nhập trong lần chạy này.
+    """
+    tz = ZoneInfo(source_tz or settings.TIME_ZONE)
+    checkpoint, _ = LegacyImportCheckpoint.objects.get_or_create(
+        source=source.label, range_start=range_start, range_end=range_end,
+        defaults={'last_id': range_start},
+    )
+    imported = 0
+    source.open()
+    try:
+        while not checkpoint.finished:
+            rows = source.fetch_chunk(checkpoint.last_id, range_end, chunk_size)
+            readings = [
+                Reading(
+                    timestamp=_parse_timestamp(created_at, tz),
+                    ph=float(ph), ntu=float(ntu), tds=float(tds),
+                    device_id=device_id,
+                )
+                for _, created_at, ph, ntu, tds in rows
+                if ph is not None and ntu is not None and tds is not None
+            ]
+            with_derived(readings)
+            with transaction.atomic():
+                Reading.objects.bulk_create(readings, batch_size=1000)
+                if rows:
+                    checkpoint.last_id = rows[-1][0]
+                    checkpoint.imported += len(readings)
+                checkpoint.finished = len(rows) < chunk_size or checkpoint.last_id >= range_end
+                checkpoint.save(update_fields=['last_id', 'imported', 'finished', 'updated_at'])
+            imported += len(readings)
+    finally:
+        source.close()
+    return imported
+
+
+def _import_range_worker(args):
+    # Chạy trong process con: đóng kết nối DB kế thừa từ process cha
+    from django.db import connections
+    connections.close_all()
+    try:
+        return import_range(*args)
+    finally:
+        connections.close_all()
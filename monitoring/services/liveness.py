@@ -0,0 +1,353 @@
+"""
+Theo dõi thiết bị còn gửi dữ liệu hay không.
+
+Chạy trong đúng một process: `manage.py run_liveness` (không khởi động từ các entry point web/ingest).
+Process thứ hai chỉ chờ: khoá leader giữ trong cache dùng chung bằng cache.add, gia hạn mỗi vòng.
+Heartbeat đi qua DB: mỗi lần nhận dữ liệu, update_last_readings (services/devices.py) ghi
+last_reading_at, pin, tín hiệu và xoá offline_since của Device; mỗi TICK tracker đọc các Device có
+last_reading_at mới (một truy vấn theo chỉ mục), nên thấy thiết bị gửi vào mọi process/worker shard.
+Hạn chót (lần cuối + expected_interval * GRACE) được xếp vào một bánh xe hẹn giờ; mỗi tick chỉ
+duyệt các slot vừa tới hạn nên chi phí không phụ thuộc số thiết bị (hướng tới ~100k thiết bị).
+Thiết bị quá hạn được đánh dấu offline và tạo đúng một Alert cho mỗi lần mất kết nối.
+Số liệu tổng hợp được ghi vào cache cho /api/fleet-health/; phạm vi theo user đọc từ Device.
+"""
+import heapq
+import logging
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, transaction
+from django.db.models import Count, Q
+
+from monitoring.checks import is_shared_cache
+from monitoring.models import Alert, Device
+from monitoring.services import alerts as alerts_service
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ENABLED': True,
+    'GRACE': 3,               # offline khi im lặng quá GRACE * expected_interval
+    'TICK': 1.0,              # giây giữa hai lần đọc heartbeat mới và kiểm tra hạn chót
+    'RELOAD_INTERVAL': 300,   # giây giữa hai lần nạp lại toàn bộ Device (chu kỳ, thiết bị mới/đã xoá)
+    'SYNC_OVERLAP': 5,        # giây đọc lùi mỗi lần sync (transaction commit muộn hơn timestamp)
+    'LEADER_TTL': 30,         # giây khoá leader còn hiệu lực nếu process dừng đột ngột
+    'LOW_BATTERY': 20,        # %, cùng ngưỡng với bảng dữ liệu
+    'WEAK_SIGNAL': -85,       # dBm
+}
+
+LEADER_KEY = 'liveness:leader'
+HEALTH_KEY = 'liveness:health'
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'LIVENESS', {})}
+
+
+def _epoch(value):
+    return value.timestamp() if value is not None else None
+
+
+def _datetime(value):
+    return datetime.fromtimestamp(value, tz=dt_timezone.utc) if value is not None else None
+
+
+class TimerWheel:
+    """
+    Bánh xe hẹn giờ băm theo slot: schedule/cancel O(1), advance() chỉ duyệt các slot đã qua.
+    Hạn chót xa hơn một vòng bánh xe sẽ bị trả về sớm; caller kiểm tra lại và lên lịch tiếp.
+    """
+
+    def __init__(self, slots=4096, resolution=1.0):
+        self.resolution = resolution
+        self._slots = [set() for _ in range(slots)]
+        self._slot_of = {}
+        self._cursor = None
+
+    def start(self, now):
+        self._cursor = int(now // self.resolution)
+
+    def schedule(self, key, deadline):
+        tick = int(deadline // self.resolution)
+        if self._cursor is not None and tick <= self._cursor:
+            tick = self._cursor + 1
+        index = tick % len(self._slots)
+        previous = self._slot_of.get(key)
+        if previous != index:
+            if previous is not None:
+                self._slots[previous].discard(key)
+            self._slots[index].add(key)
+            self._slot_of[key] = index
+
+    def cancel(self, key):
+        index = self._slot_of.pop(key, None)
+        if index is not None:
+            self._slots[index].discard(key)
+
+    def advance(self, now):
+        """Các key nằm trong slot từ lần advance trước tới now"""
+        tick = int(now // self.resolution)
+        if self._cursor is None:
+            self._cursor = tick - 1
+        due = []
+        first = self._cursor + 1
+        for t in range(first, min(tick, first + len(self._slots) - 1) + 1):
+            keys = self._slots[t % len(self._slots)]
+            if keys:
+                due.extend(keys)
+                for key in keys:
+                    del self._slot_of[key]
+                keys.clear()
+        self._cursor = max(self._cursor, tick)
+        return due
+
+
+class DeviceState:
+    __slots__ = ('interval', 'last_seen', 'battery', 'signal', 'offline_since')
+
+    def __init__(self, interval, last_seen=None, battery=None, signal=None, offline_since=None):
+        self.interval = interval
+        self.last_seen = last_seen
+        self.battery = battery
+        self.signal = signal
+        self.offline_since = offline_since
+
+
+class LivenessTracker:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._clear()
+
+    def _clear(self):
+        self._states = {}
+        self._offline = set()
+        self._wheel = TimerWheel()
+        self._counts = dict.fromkeys(('total', 'online', 'offline', 'unknown', 'low_battery', 'weak_signal'), 0)
+        self._cursor = None  # last_reading_at lớn nhất đã đọc
+
+    def reset(self):
+        with self._lock:
+            self._clear()
+
+    # -- đếm tăng dần cho fleet health, không phải duyệt toàn bộ thiết bị --
+    def _classify(self, state, config):
+        if state.last_seen is None:
+            status = 'unknown'
+        elif state.offline_since is not None:
+            status = 'offline'
+        else:
+            status = 'online'
+        return (
+            status,
+            state.battery is not None and state.battery < config['LOW_BATTERY'],
+            state.signal is not None and state.signal < config['WEAK_SIGNAL'],
+        )
+
+    def _count(self, device_id, state, sign, config):
+        status, low_battery, weak_signal = self._classify(state, config)
+        self._counts['total'] += sign
+        self._counts[status] += sign
+        self._counts['low_battery'] += sign * low_battery
+        self._counts['weak_signal'] += sign * weak_signal
+        if status == 'offline':
+            if sign > 0:
+                self._offline.add(device_id)
+            else:
+                self._offline.discard(device_id)
+
+    def _deadline(self, state, config):
+        return state.last_seen + state.interval * config['GRACE']
+
+    def _advance_cursor(self, last_reading_at):
+        if last_reading_at is not None and (self._cursor is None or last_reading_at > self._cursor):
+            self._cursor = last_reading_at
+
+    def load(self, now=None):
+        """Nạp lại mọi thiết bị (một truy vấn, đọc theo từng phần): chu kỳ mới, thiết bị mới/đã xoá"""
+        now = time.time() if now is None else now
+        config = get_config()
+        rows = Device.objects.values_list(
+            'pk', 'expected_interval', 'last_reading_at', 'last_battery', 'last_signal', 'offline_since',
+        ).iterator(chunk_size=5000)
+        with self._lock:
+            if self._wheel._cursor is None:
+                self._wheel.start(now)
+            present = set()
+            for pk, interval, last_reading_at, battery, signal, offline_since in rows:
+                present.add(pk)
+                self._advance_cursor(last_reading_at)
+                state = self._states.get(pk)
+                if state is not None:
+                    # Heartbeat mới hơn đã có trong bộ nhớ, chỉ cập nhật chu kỳ
+                    state.interval = interval
+                else:
+                    state = DeviceState(interval, _epoch(last_reading_at), battery, signal, _epoch(offline_since))
+                    self._states[pk] = state
+                    self._count(pk, state, 1, config)
+                if state.last_seen is not None and state.offline_since is None:
+                    self._wheel.schedule(pk, self._deadline(state, config))
+            for pk in set(self._states) - present:
+                self._forget(pk, config)
+
+    def sync(self, now=None):
+        """Đọc các thiết bị vừa gửi dữ liệu (Device.last_reading_at từ lần sync trước). Trả về số dòng"""
+        now = time.time() if now is None else now
+        config = get_config()
+        rows = Device.objects.filter(last_reading_at__isnull=False)
+        if self._cursor is not None:
+            rows = rows.filter(last_reading_at__gte=self._cursor - timedelta(seconds=config['SYNC_OVERLAP']))
+        rows = list(rows.values_list('pk', 'expected_interval', 'last_reading_at', 'last_battery', 'last_signal'))
+        with self._lock:
+            if self._wheel._cursor is None:
+                self._wheel.start(now)
+            for pk, interval, last_reading_at, battery, signal in rows:
+                self._advance_cursor(last_reading_at)
+                self._observe(pk, _epoch(last_reading_at), battery, signal, interval, config)
+        return len(rows)
+
+    def _observe(self, device_id, seen, battery, signal, interval, config):
+        state = self._states.get(device_id)
+        if state is None:
+            state = DeviceState(interval or Device._meta.get_field('expected_interval').default)
+            self._states[device_id] = state
+        else:
+            self._count(device_id, state, -1, config)
+        if interval is not None:
+            state.interval = interval
+        if state.last_seen is None or seen > state.last_seen:
+            state.last_seen = seen
+            state.offline_since = None
+            if battery is not None:
+                state.battery = battery
+            if signal is not None:
+                state.signal = signal
+        self._count(device_id, state, 1, config)
+        if state.offline_since is None:
+            self._wheel.schedule(device_id, self._deadline(state, config))
+
+    def _forget(self, device_id, config):
+        state = self._states.pop(device_id, None)
+        if state is not None:
+            self._count(device_id, state, -1, config)
+        self._wheel.cancel(device_id)
+
+    def tick(self, now=None):
+        """Đánh dấu offline các thiết bị quá hạn, tạo Alert và ghi trạng thái ngay. Trả về id thiết bị"""
+        now = time.time() if now is None else now
+        config = get_config()
+        went_offline = []
+        with self._lock:
+            for device_id in self._wheel.advance(now):
+                state = self._states.get(device_id)
+                if state is None or state.last_seen is None or state.offline_since is not None:
+                    continue
+                deadline = self._deadline(state, config)
+                if deadline > now:
+                    self._wheel.schedule(device_id, deadline)
+                    continue
+                self._count(device_id, state, -1, config)
+                state.offline_since = deadline
+                self._count(device_id, state, 1, config)
+                went_offline.append((device_id, state.last_seen, state.interval))
+        if went_offline:
+            self._report_offline(went_offline, config)
+        return [device_id for device_id, _, _ in went_offline]
+
+    def _report_offline(self, went_offline, config):
+        alerts = []
+        # Ghi offline_since cùng Alert để sau khi khởi động lại không báo lần nữa
+        with transaction.atomic():
+            for device_id, last_seen, interval in went_offline:
+                offline_since = _datetime(last_seen + interval * config['GRACE'])
+                # Bỏ qua thiết bị đã bị xoá, đã được báo, hoặc vừa gửi dữ liệu mà tracker chưa sync
+                seen_until = _datetime(last_seen) + timedelta(milliseconds=1)
+                updated = Device.objects.filter(
+                    Q(last_reading_at__isnull=True) | Q(last_reading_at__lt=seen_until),
+                    pk=device_id, offline_since__isnull=True,
+                ).update(offline_since=offline_since)
+                if updated:
+                    alerts.append(Alert(
+                        timestamp=offline_since, device_id=device_id, type='DEVICE', severity='MEDIUM', status='NEW',
+                        message=(f"Thiết bị {device_id} mất kết nối: không có dữ liệu từ "
+                                 f"{_datetime(last_seen):%d/%m/%Y %H:%M:%S} (chu kỳ {interval} giây)"),
+                    ))
+            alerts_service.create_alerts(alerts)
+
+    def counts(self):
+        """Số liệu tổng hợp toàn bộ thiết bị trong bộ nhớ (O(1))"""
+        with self._lock:
+            counts = dict(self._counts)
+            counts['offline_devices'] = heapq.nsmallest(100, self._offline)
+        return counts
+
+    def publish(self):
+        """Ghi số liệu tổng hợp vào cache để các process web trả lời /api/fleet-health/"""
+        cache.set(HEALTH_KEY, self.counts(), get_config()['LEADER_TTL'])
+
+    def health(self, device_ids=None):
+        """Số thiết bị online/offline/chưa có dữ liệu, pin yếu, sóng yếu (device_ids=None: toàn bộ)"""
+        if device_ids is None and is_shared_cache():
+            counts = cache.get(HEALTH_KEY)
+            if counts is not None:
+                return counts
+        return self._health_from_db(device_ids, get_config())
+
+    def _health_from_db(self, device_ids, config):
+        """Đọc từ Device: offline_since do tracker ghi, các trường còn lại do ingest ghi"""
+        devices = Device.objects.all() if device_ids is None else Device.objects.filter(pk__in=device_ids)
+        counts = devices.aggregate(
+            total=Count('pk'),
+            unknown=Count('pk', filter=Q(last_reading_at__isnull=True)),
+            offline=Count('pk', filter=Q(offline_since__isnull=False)),
+            low_battery=Count('pk', filter=Q(last_battery__lt=config['LOW_BATTERY'])),
+            weak_signal=Count('pk', filter=Q(last_signal__lt=config['WEAK_SIGNAL'])),
+        )
+        counts['online'] = counts['total'] - counts['unknown'] - counts['offline']
+        counts['offline_devices'] = list(
+            devices.filter(offline_since__isnull=False).order_by('pk').values_list('pk', flat=True)[:100]
+        )
+        return counts
+
+    def _lead(self, token, config):
+        """Giữ khoá leader trong cache: chỉ một process theo dõi thiết bị tại một thời điểm"""
+        if cache.add(LEADER_KEY, token, config['LEADER_TTL']):
+            return True
+        if cache.get(LEADER_KEY) == token:
+            cache.touch(LEADER_KEY, config['LEADER_TTL'])
+            return True
+        return False
+
+    def run(self):
+        """Vòng lặp của manage.py run_liveness: sync + tick mỗi TICK giây, nạp lại định kỳ"""
+        config = get_config()
+        token = uuid.uuid4().hex
+        leading = False
+        next_reload = 0.0
+        while True:
+            try:
+                if self._lead(token, config):
+                    if not leading:
+                        logger.info("Bắt đầu theo dõi thiết bị")
+                        leading = True
+                    if time.monotonic() >= next_reload:
+                        self.load()
+                        next_reload = time.monotonic() + config['RELOAD_INTERVAL']
+                    self.sync()
+                    self.tick()
+                    self.publish()
+                elif leading:
+                    logger.warning("Process khác đã giữ khoá leader, dừng theo dõi thiết bị")
+                    self.reset()
+                    leading, next_reload = False, 0.0
+            except Exception:
+                logger.exception("Lỗi trong vòng lặp theo dõi thiết bị")
+            finally:
+                connections.close_all()
+            time.sleep(config['TICK'])
+
+
+tracker = LivenessTracker()
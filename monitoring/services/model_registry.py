@@ -0,0 +1,55 @@
+"""
+Lưu/đọc artifact mô hình theo phiên bản: <name>-v<N>.joblib kèm <name>-v<N>.json mô tả.
+Module này không phụ thuộc Django để các script trong sensor_analysis/ dùng được.
+"""
+import json
+import re
+from datetime import datetime, timezone
+from pathlib import Path
+
+
+def _versions(directory, name):
+    pattern = re.compile(rf'^{re.escape(name)}-v(\d+)\.joblib$')
+    found = []
+    for path in Path(directory).glob(f'{name}-v*.joblib'):
+        match = pattern.match(path.name)
+        if match:
+            found.append(int(match.group(1)))
+    return sorted(found)
+
+
+def latest_version(directory, name):
+    versions = _versions(directory, name)
+    return versions[-1] if versions else None
+
+
+def save_artifact(directory, name, model, features, metrics=None, extra=None):
+    """Ghi mô hình thành phiên bản mới, trả về số phiên bản"""
+    import joblib
+
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    version = (latest_version(directory, name) or 0) + 1
+    meta = {
+        'name': name,
+        'version': version,
+        'features': list(features),
+        'trained_at': datetime.now(timezone.utc).isoformat(),
+        'metrics': metrics or {},
+        **(extra or {}),
+    }
+    joblib.dump({'model': model, 'meta': meta}, directory / f'{name}-v{version}.joblib')
+    (directory / f'{name}-v{version}.json').write_text(json.dumps(meta, indent=2, ensure_ascii=False))
+    return version
+
+
+def load_artifact(directory, name, version=None):
+    """Đọc artifact (mặc định bản mới nhất). Trả về (model, meta)"""
+    if version is None:
+        version = latest_version(directory, name)
+        if version is None:
+            raise FileNotFoundError(f"Chưa có artifact '{name}' trong {directory}")
+    import joblib  # chỉ import (kéo theo numpy) khi thật sự có mô hình để nạp
+
+    data = joblib.load(Path(directory) / f'{name}-v{version}.joblib')
+    return data['model'], data['meta']
@@ -0,0 +1,273 @@
+"""
+Gửi email thông báo cảnh báo ở nền, gộp theo người nhận và thiết bị.
+
+Alert mới được đưa vào dispatcher.submit() (sau khi transaction commit). Trong mỗi cửa sổ
+WINDOW giây, các cảnh báo cùng người nhận + thiết bị được gộp thành một email, ví dụ
+"12 cảnh báo HIGH (AI) trên Bể 1 trong 5 phút". Mọi email của một lần gửi dùng chung một kết nối
+(get_connection + send_messages), thử lại với backoff khi lỗi, và mỗi người nhận chỉ nhận tối đa
+RATE_LIMIT email mỗi giờ; chỉ email gửi thành công mới bị tính vào giới hạn. Phần vượt được gộp
+thành một email tổng hợp cho người nhận đó (chỉ giữ số đếm và MAX_LINES cảnh báo mới nhất), gửi
+khi còn quota.
+
+Cảnh báo đang chờ và bộ đếm RATE_LIMIT nằm trong bộ nhớ của từng process: với N worker, một người
+nhận có thể nhận tới N × RATE_LIMIT email mỗi giờ. Khi process thoát, shutdown() (đăng ký với atexit)
+gửi nốt cảnh báo đang chờ và các email tổng hợp, kể cả khi đã hết quota.
+
+Người nhận: chủ thiết bị; cảnh báo không gắn thiết bị gửi cho các admin.
+"""
+import atexit
+import heapq
+import logging
+import threading
+import time
+from collections import Counter, defaultdict, deque
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import connections, transaction
+
+from monitoring.models import Device, User
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ENABLED': True,
+    'WINDOW': 300,           # giây gộp cảnh báo trước khi gửi
+    'MIN_SEVERITY': 'MEDIUM',
+    'RATE_LIMIT': 12,        # email mỗi người nhận mỗi giờ, tính riêng trong từng process
+    'MAX_RETRIES': 3,
+    'BACKOFF': 2.0,          # giây, nhân đôi sau mỗi lần thử lại
+    'MAX_LINES': 10,         # số cảnh báo liệt kê chi tiết trong một email
+}
+
+SEVERITY_ORDER = {'LOW': 0, 'MEDIUM': 1, 'HIGH': 2}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'NOTIFICATIONS', {})}
+
+
+def notify(alerts):
+    """Gọi sau khi tạo Alert (bulk_create hoặc create); chỉ gửi nếu transaction commit"""
+    alerts = list(alerts)
+    if alerts:
+        transaction.on_commit(lambda: dispatcher.submit(alerts))
+
+
+class Deferred:
+    """Cảnh báo bị hoãn của một người nhận; bộ nhớ không tăng theo số cảnh báo"""
+
+    def __init__(self):
+        self.total = 0
+        self.counts = Counter()  # (severity, type) -> số cảnh báo
+        self.targets = set()
+        self.latest = []
+
+    def add(self, target, items, max_lines):
+        self.total += len(items)
+        self.counts.update((severity, alert_type) for _, severity, alert_type, _, _ in items)
+        self.targets.add(target)
+        self.latest = heapq.nlargest(max_lines, self.latest + items, key=lambda row: row[4])
+
+    def merge(self, other, max_lines):
+        self.total += other.total
+        self.counts.update(other.counts)
+        self.targets |= other.targets
+        self.latest = heapq.nlargest(max_lines, self.latest + other.latest, key=lambda row: row[4])
+
+
+class NotificationDispatcher:
+    def __init__(self):
+        self._pending = []
+        self._deferred = {}  # người nhận -> Deferred
+        self._lock = threading.Lock()
+        self._timer = None
+        self._sent = defaultdict(deque)  # người nhận -> thời điểm các email đã gửi trong giờ qua
+
+    def submit(self, alerts):
+        config = get_config()
+        if not config['ENABLED']:
+            return
+        minimum = SEVERITY_ORDER[config['MIN_SEVERITY']]
+        rows = [
+            (alert.device_id, alert.severity, alert.type, alert.message, alert.timestamp)
+            for alert in alerts if SEVERITY_ORDER.get(alert.severity, 0) >= minimum
+        ]
+        if not rows:
+            return
+        with self._lock:
+            self._pending.extend(rows)
+            self._schedule(config)
+
+    def _schedule(self, config):
+        if self._timer is None:
+            self._timer = threading.Timer(config['WINDOW'], self._flush_from_timer)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _take(self):
+        rows, self._pending = self._pending, []
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        return rows
+
+    def flush(self, now=None, final=False):
+        """Gộp và gửi mọi cảnh báo đang chờ; trả về số email đã gửi (final: gửi cả email tổng hợp đã hết quota)"""
+        now = time.monotonic() if now is None else now
+        config = get_config()
+        with self._lock:
+            rows = self._take()
+            deferred, self._deferred = self._deferred, {}
+        if not rows and not deferred:
+            return 0
+        by_recipient = defaultdict(list)
+        for (recipient, device_name), items in (self._group(rows) if rows else {}).items():
+            by_recipient[recipient].append((device_name, items))
+        messages, held = [], {}
+        planned = Counter()
+        for recipient in by_recipient.keys() | deferred.keys():
+            digest = deferred.get(recipient)
+            for device_name, items in by_recipient.get(recipient, ()):
+                if digest is None and self._allow(recipient, planned[recipient], now, config):
+                    messages.append(self._message(recipient, device_name, items, config))
+                    planned[recipient] += 1
+                    continue
+                # Đã có cảnh báo bị hoãn hoặc hết quota: gộp vào email tổng hợp
+                if digest is None:
+                    digest = Deferred()
+                digest.add(device_name or 'hệ thống', items, config['MAX_LINES'])
+            if digest is None:
+                continue
+            if final or self._allow(recipient, planned[recipient], now, config):
+                messages.append(self._digest(recipient, digest, config))
+                planned[recipient] += 1
+            else:
+                held[recipient] = digest
+        if held:
+            logger.info("Hoãn %d cảnh báo do vượt giới hạn email/giờ", sum(d.total for d in held.values()))
+            with self._lock:
+                for recipient, digest in held.items():
+                    if recipient in self._deferred:
+                        digest.merge(self._deferred[recipient], config['MAX_LINES'])
+                    self._deferred[recipient] = digest
+                self._schedule(config)
+        sent = self._send(messages, config)
+        for message in sent:
+            self._sent[message.to[0]].append(now)
+        return len(sent)
+
+    def shutdown(self):
+        """Huỷ timer rồi gửi nốt mọi thứ đang chờ (gọi khi process thoát)"""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        try:
+            self.flush(final=True)
+        except Exception:
+            logger.exception("Lỗi khi gửi thông báo cảnh báo lúc thoát")
+
+    def _group(self, rows):
+        device_ids = {row[0] for row in rows if row[0] is not None}
+        devices = {
+            pk: (name, email)
+            for pk, name, email in Device.objects.filter(pk__in=device_ids).values_list('pk', 'name', 'user__email')
+        }
+        admins = None
+        groups = defaultdict(list)
+        for row in rows:
+            device = devices.get(row[0])
+            if device is not None and device[1]:
+                groups[(device[1], device[0])].append(row)
+                continue
+            if admins is None:
+                admins = list(User.objects.filter(role='admin', is_active=True)
+                              .exclude(email='').values_list('email', flat=True))
+            for email in admins:
+                groups[(email, device[0] if device else None)].append(row)
+        return groups
+
+    def _allow(self, recipient, planned, now, config):
+        """Còn quota cho thêm một email không (planned: số email đã xếp trong lần gửi này)"""
+        sent = self._sent.get(recipient)
+        while sent and now - sent[0] >= 3600:
+            sent.popleft()
+        if sent is not None and not sent:
+            del self._sent[recipient]
+        return len(sent or ()) + planned < config['RATE_LIMIT']
+
+    def _message(self, recipient, device_name, items, config):
+        target = device_name or 'hệ thống'
+        counts = Counter((severity, alert_type) for _, severity, alert_type, _, _ in items)
+        minutes = max(1, round(config['WINDOW'] / 60))
+        items = sorted(items, key=lambda row: row[4], reverse=True)
+        return self._compose(
+            recipient, counts, len(items), items[:config['MAX_LINES']],
+            f"trên {target} trong {minutes} phút qua.",
+            f"{len(items)} cảnh báo trên {target} trong {minutes} phút",
+        )
+
+    def _digest(self, recipient, digest, config):
+        """Email tổng hợp các cảnh báo đã bị hoãn vì vượt RATE_LIMIT"""
+        target = ", ".join(sorted(digest.targets)) if len(digest.targets) <= 3 else f"{len(digest.targets)} thiết bị"
+        return self._compose(
+            recipient, digest.counts, digest.total, digest.latest,
+            f"trên {target} (tổng hợp do vượt giới hạn {config['RATE_LIMIT']} email/giờ).",
+            f"{digest.total} cảnh báo trên {target} (tổng hợp)",
+        )
+
+    def _compose(self, recipient, counts, total, latest, scope, subject):
+        summary = ", ".join(
+            f"{n} cảnh báo {severity} ({alert_type})"
+            for (severity, alert_type), n in sorted(counts.items(), key=lambda kv: -SEVERITY_ORDER[kv[0][0]])
+        )
+        lines = [f"- {timestamp:%d/%m/%Y %H:%M:%S} [{severity}] {message}"
+                 for _, severity, _, message, timestamp in latest]
+        if total > len(latest):
+            lines.append(f"... và {total - len(latest)} cảnh báo khác")
+        body = "\n".join([
+            f"{summary} {scope}",
+            "",
+            *lines,
+            "",
+            f"Xem chi tiết: {getattr(settings, 'SITE_URL', '')}/dashboard/",
+        ])
+        return EmailMessage(f"[Water Monitor] {subject}", body, settings.DEFAULT_FROM_EMAIL, [recipient])
+
+    def _send(self, messages, config):
+        """Gửi qua một kết nối dùng chung, thử lại phần chưa gửi được với backoff. Trả về các email đã gửi"""
+        if not messages:
+            return []
+        pending = deque(messages)
+        sent = []
+        delay = config['BACKOFF']
+        for attempt in range(config['MAX_RETRIES'] + 1):
+            try:
+                with get_connection(fail_silently=False) as connection:
+                    while pending:
+                        # Từng email một để khi lỗi giữa chừng không gửi lại email đã đi
+                        if connection.send_messages([pending[0]]):
+                            sent.append(pending[0])
+                        pending.popleft()
+                return sent
+            except Exception:
+                if attempt == config['MAX_RETRIES']:
+                    logger.exception("Không gửi được %d email cảnh báo", len(pending))
+                    return sent
+                logger.warning("Lỗi gửi email cảnh báo, thử lại sau %.1f giây", delay, exc_info=True)
+                time.sleep(delay)
+                delay *= 2
+        return sent
+
+    def _flush_from_timer(self):
+        try:
+            self.flush()
+        except Exception:
+            logger.exception("Lỗi khi gửi thông báo cảnh báo")
+        finally:
+            connections.close_all()
+
+
+dispatcher = NotificationDispatcher()
+atexit.register(dispatcher.shutdown)
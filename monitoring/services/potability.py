@@ -0,0 +1,195 @@
+"""
+Chấm điểm khả năng uống được (potability) cho Reading bằng mô hình RandomForest
+huấn luyện từ water_potability.csv (xem sensor_analysis/train_potability.py).
+
+Mô hình chỉ được nạp một lần cho mỗi worker, khi có Reading đầu tiên cần chấm.
+Reading mới được gom thành micro-batch rồi dự đoán một lần bằng mảng NumPy
+thay vì gọi predict cho từng dòng. Khi chưa có artifact, worker kiểm tra lại sau
+MISSING_RECHECK giây nên tự nạp mô hình được huấn luyện sau đó. Batch còn dở được
+chấm nốt khi process thoát.
+"""
+import atexit
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections, transaction
+
+from monitoring.models import Alert, Reading
+from monitoring.services import alerts as alerts_service, model_registry
+
+logger = logging.getLogger(__name__)
+
+MODEL_NAME = 'potability'
+# Trường của Reading -> cột tương ứng trong water_potability.csv
+FEATURE_MAP = {'ph': 'ph', 'tds': 'Solids', 'ntu': 'Turbidity'}
+FEATURES = tuple(FEATURE_MAP)
+
+DEFAULTS = {
+    'MODEL_DIR': settings.BASE_DIR / 'artifacts' / 'potability',
+    'MODEL_VERSION': None,  # None = dùng bản mới nhất
+    'BATCH_SIZE': 64,
+    'MAX_DELAY': 2.0,  # giây tối đa một Reading chờ trong batch
+    'ALERT_THRESHOLD': 0.3,
+    'MISSING_RECHECK': 60.0,  # giây trước khi tìm lại artifact khi chưa có mô hình
+}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'POTABILITY', {})}
+
+
+_model = None
+_missing_until = 0.0  # monotonic: trước thời điểm này không tìm lại artifact
+_model_lock = threading.Lock()
+
+
+def _stale():
+    return _model is None or (_model[0] is None and time.monotonic() >= _missing_until)
+
+
+def get_model():
+    """Trả về (model, meta); (None, None) nếu chưa có artifact"""
+    global _model, _missing_until
+    if _stale():
+        with _model_lock:
+            if _stale():
+                config = get_config()
+                try:
+                    _model = model_registry.load_artifact(config['MODEL_DIR'], MODEL_NAME, config['MODEL_VERSION'])
+                    logger.info("Đã nạp mô hình potability v%s", _model[1]['version'])
+                except FileNotFoundError:
+                    if _model is None:
+                        logger.warning("Chưa có mô hình potability trong %s, bỏ qua chấm điểm", config['MODEL_DIR'])
+                    _model = (None, None)
+                    _missing_until = time.monotonic() + config['MISSING_RECHECK']
+    return _model
+
+
+def reset_model():
+    """Bỏ mô hình đã nạp (ví dụ sau khi huấn luyện lại)"""
+    global _model, _missing_until
+    with _model_lock:
+        _model = None
+        _missing_until = 0.0
+
+
+def predict(features):
+    """
+    features: mảng (n, 3) theo thứ tự FEATURES.
+    Trả về mảng xác suất uống được (n,), hoặc None nếu chưa có mô hình.
+    """
+    model, meta = get_model()
+    if model is None:
+        return None
+    import numpy as np
+
+    X = np.asarray(features, dtype=np.float64).reshape(-1, len(FEATURES))
+    X = X[:, [FEATURES.index(f) for f in meta['features']]]
+    positive = list(model.classes_).index(1)
+    return model.predict_proba(X)[:, positive]
+
+
+def _severity(score, threshold):
+    return 'HIGH' if score < threshold / 2 else 'MEDIUM'
+
+
+def store_scores(rows, scores):
+    """
+    rows: danh sách (id, device_id, timestamp) tương ứng với scores.
+    Ghi điểm vào Reading.potability và tạo Alert loại AI cho các điểm dưới ngưỡng.
+    """
+    threshold = get_config()['ALERT_THRESHOLD']
+    version = get_model()[1]['version']
+    readings = [Reading(pk=pk, potability=float(score)) for (pk, _, _), score in zip(rows, scores)]
+    alerts = [
+        Alert(
+            timestamp=timestamp, device_id=device_id, type='AI', status='NEW',
+            severity=_severity(score, threshold),
+            message=f"Reading {pk}: khả năng uống được thấp ({score:.2f}, mô hình v{version})",
+        )
+        for (pk, device_id, timestamp), score in zip(rows, scores)
+        if score < threshold
+    ]
+    with transaction.atomic():
+        Reading.objects.bulk_update(readings, ['potability'], batch_size=500)
+        alerts_service.create_alerts(alerts)
+    return alerts
+
+
+def score_rows(rows):
+    """rows: danh sách (id, device_id, timestamp, ph, tds, ntu)"""
+    if not rows:
+        return []
+    scores = predict([row[3:] for row in rows])
+    if scores is None:
+        return []
+    return store_scores([row[:3] for row in rows], scores)
+
+
+class PotabilityBatcher:
+    """Gom Reading mới và chấm điểm khi đủ BATCH_SIZE hoặc sau MAX_DELAY giây"""
+
+    def __init__(self):
+        self._pending = []
+        self._lock = threading.Lock()
+        self._timer = None
+
+    def submit(self, reading, background=False):
+        """background=True: khi batch đầy, chấm điểm ở thread riêng (dùng từ code async)"""
+        if get_model()[0] is None:
+            return
+        config = get_config()
+        batch = None
+        with self._lock:
+            self._pending.append((reading.pk, reading.device_id, reading.timestamp,
+                                  reading.ph, reading.tds, reading.ntu))
+            if len(self._pending) >= config['BATCH_SIZE']:
+                batch = self._take()
+            elif self._timer is None:
+                self._timer = threading.Timer(config['MAX_DELAY'], self._flush_from_timer)
+                self._timer.daemon = True
+                self._timer.start()
+        if batch and background:
+            threading.Thread(target=self._score_in_thread, args=(batch,), daemon=True).start()
+        elif batch:
+            score_rows(batch)
+
+    def flush(self):
+        with self._lock:
+            batch = self._take()
+        return score_rows(batch)
+
+    def shutdown(self):
+        """Chấm nốt batch còn dở (gọi khi process thoát)"""
+        with self._lock:
+            batch = self._take()
+        try:
+            score_rows(batch)
+        except Exception:
+            logger.exception("Lỗi khi chấm điểm potability lúc thoát")
+
+    def _take(self):
+        batch, self._pending = self._pending, []
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        return batch
+
+    def _flush_from_timer(self):
+        with self._lock:
+            batch = self._take()
+        self._score_in_thread(batch)
+
+    def _score_in_thread(self, batch):
+        try:
+            score_rows(batch)
+        except Exception:
+            logger.exception("Lỗi khi chấm điểm potability")
+        finally:
+            connections.close_all()
+
+
+batcher = PotabilityBatcher()
+atexit.register(batcher.shutdown)
@@ -0,0 +1,133 @@
+"""
+Cache nội dung hiển thị (dữ liệu biểu đồ, trang bảng, đoạn template) theo phiên bản dữ liệu thiết bị.
+
+Mỗi thiết bị có một số phiên bản trong cache, tăng khi Reading được ghi/xoá (save, delete và
+Reading.objects.bulk_create, xem monitoring/signals.py và models.ReadingQuerySet) hoặc khi Device thay
+đổi; phạm vi "tất cả" (admin) có phiên bản riêng tăng cùng mọi thiết bị. Khoá cache chứa phiên bản
+của các thiết bị đang xem, nên dữ liệu mới chỉ làm trượt đúng các trang có thiết bị đó, không cần
+đoán TTL. Thay đổi không qua các đường trên (QuerySet.update, SQL thô) thì gọi bump()/bump_all().
+
+Phiên bản tăng ở một process phải được mọi process thấy, nên chỉ cache khi CACHES['default'] dùng
+chung (monitoring/checks.py); với LocMem/Dummy make_key() trả về None và nội dung luôn được tính lại.
+
+Khi nhiều request cùng trượt một khoá, chỉ một request tính lại (single-flight): các thread trong
+process chờ kết quả của thread đầu tiên, các process khác chờ khoá `<key>:lock` trong cache.
+"""
+import hashlib
+import threading
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+from monitoring.checks import is_shared_cache
+
+VERSION_KEY = 'data_version:{}'
+ALL = 'all'      # phiên bản của phạm vi tất cả thiết bị
+EPOCH = 'epoch'  # tăng bởi bump_all(), làm mới mọi khoá
+RENDER_TIMEOUT = 24 * 3600  # chỉ để giải phóng bộ nhớ; nội dung không cũ vì khoá theo phiên bản
+LOCK_TIMEOUT = 10
+WAIT_INTERVAL = 0.02
+
+_MISSING = object()
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+
+def _incr(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Chưa có (hoặc đã bị đẩy khỏi cache): khởi tạo bằng thời điểm hiện tại để không trùng giá trị cũ
+        if not cache.add(key, time.time_ns(), None):
+            cache.incr(key)
+
+
+def _bump(names):
+    for name in names:
+        _incr(VERSION_KEY.format(name))
+
+
+def bump(device_ids):
+    """Đánh dấu dữ liệu của các thiết bị đã thay đổi (chạy sau khi transaction commit)"""
+    if not is_shared_cache():
+        return
+    names = sorted({pk for pk in device_ids if pk is not None}) + [ALL]
+    transaction.on_commit(lambda: _bump(names))
+
+
+def bump_all():
+    if not is_shared_cache():
+        return
+    transaction.on_commit(lambda: _bump([EPOCH]))
+
+
+def version_token(device_ids):
+    """Chuỗi đại diện cho phiên bản dữ liệu của phạm vi (None: tất cả thiết bị)"""
+    names = [EPOCH] + ([ALL] if device_ids is None else sorted(device_ids))
+    keys = [VERSION_KEY.format(name) for name in names]
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        initial = time.time_ns()
+        for key in missing:
+            cache.add(key, initial, None)
+        versions.update(cache.get_many(missing))  # process khác có thể đã khởi tạo trước
+    return ','.join(f'{name}={versions[key]}' for name, key in zip(names, keys))
+
+
+def make_key(name, device_ids, **params):
+    """Khoá cache cho nội dung `name` của phạm vi device_ids với các tham số hiển thị (None: không cache)"""
+    if not is_shared_cache():
+        return None
+    parts = [version_token(device_ids)] + [f'{k}={params[k]}' for k in sorted(params)]
+    if device_ids is not None:
+        parts.append('devices=' + ','.join(map(str, sorted(device_ids))))
+    digest = hashlib.blake2b('|'.join(parts).encode(), digest_size=16).hexdigest()
+    return f'render:{name}:{digest}'
+
+
+def get_or_compute(key, compute, timeout=RENDER_TIMEOUT):
+    if key is None:
+        return compute()
+    value = cache.get(key, _MISSING)
+    if value is not _MISSING:
+        return value
+    with _inflight_lock:
+        event = _inflight.get(key)
+        leader = event is None
+        if leader:
+            event = _inflight[key] = threading.Event()
+    if not leader:
+        event.wait(LOCK_TIMEOUT)
+        value = cache.get(key, _MISSING)
+        return compute() if value is _MISSING else value  # thread đầu tiên lỗi: tự tính
+    try:
+        return _compute_once(key, compute, timeout)
+    finally:
+        with _inflight_lock:
+            _inflight.pop(key, None)
+        event.set()
+
+
+def _compute_once(key, compute, timeout):
+    lock = f'{key}:lock'
+    if not cache.add(lock, 1, LOCK_TIMEOUT):
+        # Process khác đang tính: chờ kết quả, hoặc tự tính nếu nó lỗi/quá hạn
+        deadline = time.monotonic() + LOCK_TIMEOUT
+        while time.monotonic() < deadline:
+            time.sleep(WAIT_INTERVAL)
+            value = cache.get(key, _MISSING)
+            if value is not _MISSING:
+                return value
+            if cache.get(lock) is None:
+                break
+        value = compute()
+        cache.set(key, value, timeout)
+        return value
+    try:
+        value = compute()
+        cache.set(key, value, timeout)
+        return value
+    finally:
+        cache.delete(lock)
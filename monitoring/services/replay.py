@@ -0,0 +1,214 @@
+"""
+Chạy lại logic cảnh báo/bất thường (services/anomaly.py) trên dữ liệu lịch sử để chỉnh ngưỡng.
+
+Dữ liệu của mỗi thiết bị được nạp thành mảng cột (từ DB hoặc file CSV của `export_readings`) và
+xử lý vectơ hoá theo thời gian mô phỏng: vi phạm ngưỡng là phép so sánh trên cả mảng, EWMA là
+hệ thức truy hồi tuyến tính tính theo khối. Kết quả giống hệt DeviceDetector chạy từng dòng
+(cùng số cảnh báo, cùng thời điểm) nhưng không ghi gì vào bảng Alert.
+Các thiết bị độc lập với nhau nên được chia cho một pool process.
+"""
+import math
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timezone as dt_timezone
+
+import django
+import numpy as np
+
+from monitoring.db_router import use_replica
+from monitoring.models import Reading
+from monitoring.services.anomaly import (
+    ALPHA, METRICS, MIN_STD, RULES, WARMUP, Z_THRESHOLD, anomaly_message, rule_message,
+)
+from monitoring.services.timeseries import iter_reading_chunks
+
+FIELDS = METRICS
+
+
+@dataclass(frozen=True)
+class ReplayAlert:
+    device_id: int
+    timestamp: datetime
+    type: str
+    severity: str
+    message: str
+    source: str  # 'rule:ph', 'anomaly:tds', ...
+
+
+@dataclass
+class ReplayResult:
+    alerts: list = field(default_factory=list)
+    readings: int = 0
+    start: float = None  # epoch giây của Reading đầu/cuối đã chạy lại
+    end: float = None
+    elapsed: float = 0.0
+
+    @property
+    def speedup(self):
+        """Số giây dữ liệu được chạy lại trong một giây thực"""
+        if self.start is None or not self.elapsed:
+            return None
+        return (self.end - self.start) / self.elapsed
+
+
+def _linear_recursion(inputs, decay, initial):
+    """
+    y_t = decay * y_{t-1} + inputs_t với y_{-1} = initial, tính theo khối bằng cumsum.
+    Khối đủ ngắn để decay^k không nhỏ hơn 1e-4 (giữ độ chính xác khi chia cho decay^k).
+    """
+    if decay <= 0:
+        return inputs.copy()
+    block = max(1, int(math.log(1e-4) / math.log(decay))) if decay < 1 else len(inputs) or 1
+    powers = decay ** np.arange(1, block + 1, dtype=np.float64)
+    out = np.empty_like(inputs)
+    carry = initial
+    for begin in range(0, len(inputs), block):
+        chunk = inputs[begin:begin + block]
+        p = powers[:len(chunk)]
+        out[begin:begin + len(chunk)] = p * (carry + np.cumsum(chunk / p))
+        carry = out[begin + len(chunk) - 1]
+    return out
+
+
+def _starts(mask):
+    """Vị trí bắt đầu mỗi đợt True liên tiếp (mỗi đợt vi phạm chỉ cảnh báo một lần)"""
+    return np.flatnonzero(mask & ~np.concatenate(([False], mask[:-1])))
+
+
+def _ewma_scores(values, alpha, min_std):
+    """Độ lệch của mỗi mẫu so với EWMA trước nó, và trung bình trước nó (giống Ewma.score/update)"""
+    decay = 1.0 - alpha
+    mean = _linear_recursion(alpha * values, decay, values[0])
+    previous_mean = np.concatenate(([0.0], mean[:-1]))  # Ewma chưa có mẫu: mean = 0
+    diff = values - previous_mean
+    diff[0] = 0.0
+    var = _linear_recursion(decay * alpha * diff * diff, decay, 0.0)
+    previous_var = np.concatenate(([0.0], var[:-1]))
+    std = np.maximum(np.sqrt(previous_var), min_std)
+    return np.abs(values - previous_mean) / std, previous_mean
+
+
+def detect(device_id, timestamps, columns, rules=RULES, alpha=ALPHA, z_threshold=Z_THRESHOLD, warmup=WARMUP):
+    """
+    Cảnh báo mà DeviceDetector sẽ tạo cho chuỗi Reading của một thiết bị (đã sắp theo thời gian).
+    columns: dict trường -> mảng float64, NaN cho giá trị thiếu (bị bỏ qua như None).
+    """
+    fired = []  # (vị trí, thứ tự trong một Reading, severity, message, source)
+    order = 0
+    for rule in rules:
+        values = columns[rule.field]
+        valid = np.flatnonzero(~np.isnan(values))
+        v = values[valid]
+        violated = np.zeros(len(v), dtype=bool)
+        if rule.low is not None:
+            violated |= v < rule.low
+        if rule.high is not None:
+            violated |= v > rule.high
+        for i in _starts(violated):
+            fired.append((valid[i], order, 'RULE', rule.severity, rule_message(rule, v[i]), f'rule:{rule.field}'))
+        order += 1
+    for metric in METRICS:
+        values = columns[metric]
+        valid = np.flatnonzero(~np.isnan(values))
+        if len(valid) <= warmup:
+            order += 1
+            continue
+        v = values[valid]
+        scores, means = _ewma_scores(v, alpha, MIN_STD[metric])
+        anomalous = scores > z_threshold
+        anomalous[:warmup] = False
+        for i in _starts(anomalous):
+            fired.append((valid[i], order, 'ANOMALY', 'LOW', anomaly_message(metric, v[i], means[i]), f'anomaly:{metric}'))
+        order += 1
+    fired.sort(key=lambda item: item[:2])
+    return [
+        ReplayAlert(device_id, datetime.fromtimestamp(timestamps[position], tz=dt_timezone.utc), type_, severity,
+                    message, source)
+        for position, _, type_, severity, message, source in fired
+    ]
+
+
+@use_replica()
+def load_device(device_id, start=None, end=None):
+    """(timestamps epoch giây, {trường: float64}) của một thiết bị từ DB, theo thời gian tăng dần"""
+    chunks = list(iter_reading_chunks(device_id, start, end, FIELDS, dtype=np.float64))
+    if not chunks:
+        return np.empty(0), {f: np.empty(0) for f in FIELDS}
+    return (np.concatenate([c['timestamp'] for c in chunks]),
+            {f: np.concatenate([c[f] for c in chunks]) for f in FIELDS})
+
+
+def load_archive(path, device_ids=None, start=None, end=None):
+    """{device_id: (timestamps, columns)} từ file CSV do `manage.py export_readings` tạo ra"""
+    import pandas as pd
+
+    frame = pd.read_csv(path, usecols=['id', 'device_id', 'timestamp', *FIELDS])
+    frame = frame.dropna(subset=['device_id'])
+    frame['timestamp'] = pd.to_datetime(frame['timestamp'], utc=True, format='ISO8601')
+    if device_ids:
+        frame = frame[frame['device_id'].isin(device_ids)]
+    if start is not None:
+        frame = frame[frame['timestamp'] >= pd.Timestamp(start)]
+    if end is not None:
+        frame = frame[frame['timestamp'] < pd.Timestamp(end)]
+    frame = frame.sort_values(['device_id', 'timestamp', 'id'])
+    epoch = (frame['timestamp'] - pd.Timestamp(0, tz='UTC')) / pd.Timedelta(seconds=1)
+    frame = frame.assign(epoch=epoch)
+    return {
+        int(device_id): (group['epoch'].to_numpy(np.float64),
+                         {f: group[f].to_numpy(np.float64) for f in FIELDS})
+        for device_id, group in frame.groupby('device_id', sort=False)
+    }
+
+
+def _replay_one(task):
+    """Một đơn vị việc trong pool: (device_id, dữ liệu hoặc None để tự nạp từ DB, start, end, tham số)"""
+    device_id, data, start, end, params = task
+    timestamps, columns = data if data is not None else load_device(device_id, start, end)
+    alerts = detect(device_id, timestamps, columns, **params) if len(timestamps) else []
+    span = (float(timestamps[0]), float(timestamps[-1])) if len(timestamps) else None
+    return alerts, len(timestamps), span
+
+
+@use_replica()
+def replay(device_ids=None, start=None, end=None, archive=None, workers=None, **params):
+    """
+    Chạy lại cảnh báo cho các thiết bị trong [start, end). params: rules, alpha, z_threshold, warmup.
+    workers > 1 chia thiết bị cho một pool process; mặc định bằng số CPU.
+    """
+    started = time.perf_counter()
+    if archive is not None:
+        data = load_archive(archive, device_ids, start, end)
+        tasks = [(device_id, arrays, None, None, params) for device_id, arrays in data.items()]
+    else:
+        if device_ids is None:
+            readings = Reading.objects.filter(device__isnull=False)
+            if start is not None:
+                readings = readings.filter(timestamp__gte=start)
+            if end is not None:
+                readings = readings.filter(timestamp__lt=end)
+            device_ids = list(readings.order_by().values_list('device_id', flat=True).distinct())
+        tasks = [(device_id, None, start, end, params) for device_id in sorted(device_ids)]
+
+    workers = min(workers or os.cpu_count() or 1, len(tasks))
+    if workers > 1:
+        # Process con (spawn) nạp Django trước khi nhận việc và tự mở kết nối DB riêng
+        with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn'),
+                                 initializer=django.setup) as pool:
+            outcomes = list(pool.map(_replay_one, tasks))
+    else:
+        outcomes = [_replay_one(task) for task in tasks]
+
+    result = ReplayResult()
+    for alerts, count, span in outcomes:
+        result.alerts += alerts
+        result.readings += count
+        if span is not None:
+            result.start = span[0] if result.start is None else min(result.start, span[0])
+            result.end = span[1] if result.end is None else max(result.end, span[1])
+    result.alerts.sort(key=lambda alert: (alert.timestamp, alert.device_id))
+    result.elapsed = time.perf_counter() - started
+    return result
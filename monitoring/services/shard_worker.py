@@ -0,0 +1,151 @@
+"""
+Worker ingestion sở hữu một phần thiết bị (xem services/sharding.py).
+
+Vòng lặp asyncio nhận các dòng JSON từ front, gom thành batch (group commit) và giao cho một
+thread xử lý duy nhất. Chỉ thread đó đọc/ghi trạng thái thiết bị (giá trị cuối, mốc chống trùng)
+nên không cần khoá, giữa các process cũng không chia sẻ gì. Phát hiện vi phạm/bất thường chạy trong
+after_ingest như mọi đường nhận dữ liệu khác; worker chỉ bảo đảm nó chạy ở process sở hữu thiết bị.
+"""
+import asyncio
+import json
+import logging
+import os
+import socket
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connections
+
+from monitoring.models import Device, Reading
+from monitoring.services.ingest import write_readings
+from monitoring.services.sharding import HashRing, decode, parse_address
+
+logger = logging.getLogger(__name__)
+
+READING_FIELDS = ('ph', 'tds', 'ntu', 'battery', 'signal', 'device_id', 'timestamp')
+
+
+class DeviceShardState:
+    __slots__ = ('watermark', 'last')
+
+    def __init__(self, watermark):
+        self.watermark = watermark  # timestamp lớn nhất đã ghi; bản gửi lại <= mốc này bị bỏ qua
+        self.last = None
+
+
+class ShardWorker:
+    def __init__(self, address, addresses=None, max_batch=500, max_delay=0.005):
+        self.address = address
+        self.ring = HashRing(addresses or [address])
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.devices = {}
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='shard')
+
+    def owns(self, device_id):
+        return self.ring.node_for(device_id) == self.address
+
+    def _states(self, device_ids):
+        """Trạng thái của các thiết bị; thiết bị mới thấy lần đầu lấy mốc từ Device.last_reading_at"""
+        missing = [pk for pk in device_ids if pk not in self.devices]
+        if missing:
+            known = dict(Device.objects.filter(pk__in=missing).values_list('pk', 'last_reading_at'))
+            for pk in missing:
+                self.devices[pk] = DeviceShardState(known.get(pk))
+        return self.devices
+
+    def process(self, rows):
+        """Chạy trong thread xử lý: chống trùng, ghi batch (after_ingest phát hiện bất thường), cập nhật trạng thái"""
+        states = self._states({row['device_id'] for row in rows if row.get('device_id') is not None})
+        results = [None] * len(rows)
+        readings, positions = [], []
+        marks = {}  # mốc chống trùng tạm thời trong batch (bản gửi trùng trong cùng batch)
+        for position, row in enumerate(rows):
+            device_id, timestamp = row.get('device_id'), row.get('timestamp')
+            if device_id is not None and timestamp is not None:
+                mark = marks[device_id] if device_id in marks else states[device_id].watermark
+                if mark is not None and timestamp <= mark:
+                    results[position] = {'duplicate': True}
+                    continue
+                marks[device_id] = timestamp
+            readings.append(Reading(**{k: row[k] for k in READING_FIELDS if row.get(k) is not None}))
+            positions.append(position)
+
+        errors = write_readings(readings, background=False) if readings else []
+        for position, reading, error in zip(positions, readings, errors):
+            if error is not None:
+                results[position] = {'error': str(error)}
+                continue
+            results[position] = {'id': reading.pk}
+            state = states.get(reading.device_id)
+            if state is None:
+                continue
+            if state.watermark is None or reading.timestamp > state.watermark:
+                state.watermark = reading.timestamp
+                state.last = (reading.ph, reading.tds, reading.ntu)
+        connections['default'].close_if_unusable_or_obsolete()
+        return results
+
+    async def _batches(self, queue):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await queue.get()]
+            deadline = loop.time() + self.max_delay
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            try:
+                results = await loop.run_in_executor(self._executor, self.process, [row for row, _ in batch])
+            except Exception as e:
+                logger.exception("Lỗi khi xử lý batch")
+                results = [{'error': str(e)}] * len(batch)
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+    async def _handle(self, queue, reader, writer):
+        loop = asyncio.get_running_loop()
+        try:
+            while line := await reader.readline():
+                try:
+                    row = decode(line)
+                except ValueError as e:
+                    result = {'error': str(e)}
+                else:
+                    if row.get('device_id') is not None and not self.owns(row['device_id']):
+                        result = {'error': f"Thiết bị {row['device_id']} không thuộc worker {self.address}"}
+                    else:
+                        future = loop.create_future()
+                        await queue.put((row, future))
+                        result = await future
+                writer.write((json.dumps(result) + '\n').encode())
+                await writer.drain()
+        except ConnectionError:
+            pass
+        except asyncio.CancelledError:
+            # Worker dừng (asyncio.run huỷ các task còn lại): đóng kết nối, không log traceback
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self):
+        queue = asyncio.Queue()
+        batches = asyncio.create_task(self._batches(queue))
+        family, target = parse_address(self.address)
+        handler = lambda r, w: self._handle(queue, r, w)  # noqa: E731
+        if family == socket.AF_UNIX:
+            if os.path.exists(target):
+                os.unlink(target)
+            server = await asyncio.start_unix_server(handler, path=target)
+        else:
+            server = await asyncio.start_server(handler, host=target[0], port=target[1], reuse_address=True)
+        logger.info("Worker shard %s sẵn sàng", self.address)
+        async with server:
+            await asyncio.gather(server.serve_forever(), batches)
+
+    def run(self):
+        asyncio.run(self.serve())
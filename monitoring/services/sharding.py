@@ -0,0 +1,151 @@
+"""
+Chia thiết bị cho các worker ingestion theo consistent hashing trên device_id.
+
+Mỗi worker (services/shard_worker.py, chạy bằng `manage.py run_ingest_shards`) sở hữu một phần
+thiết bị và giữ trạng thái của chúng trong bộ nhớ. Tiến trình front (ứng dụng ingestion,
+water_monitor/ingest_wsgi.py) chỉ đọc form rồi chuyển Reading tới worker sở hữu thiết bị
+qua socket: mỗi dòng JSON một Reading, mỗi dòng JSON trả lời theo đúng thứ tự.
+
+Địa chỉ worker khai báo trong settings.INGEST_SHARDS ("host:port" hoặc "unix:/đường/dẫn.sock").
+Khi đã cấu hình, mọi endpoint nhận dữ liệu (views.upload_reading, ingest_views.upload_reading,
+async_views.upload_reading_fast) đều chuyển qua get_client(), không tự ghi Reading.
+Thêm một worker chỉ chuyển khoảng 1/N thiết bị sang chủ mới nhờ các điểm ảo trên vòng băm.
+"""
+import bisect
+import hashlib
+import json
+import socket
+import threading
+from datetime import datetime
+
+from django.conf import settings
+from django.utils.dateparse import parse_datetime
+
+VIRTUAL_NODES = 128
+
+
+def _hash(key):
+    return int.from_bytes(hashlib.blake2b(str(key).encode(), digest_size=8).digest(), 'big')
+
+
+class HashRing:
+    def __init__(self, nodes=(), virtual_nodes=VIRTUAL_NODES):
+        self.virtual_nodes = virtual_nodes
+        self._points = []
+        self._owners = []
+        self.nodes = []
+        for node in nodes:
+            self.add(node)
+
+    def add(self, node):
+        if node in self.nodes:
+            return
+        self.nodes.append(node)
+        for i in range(self.virtual_nodes):
+            point = _hash(f'{node}#{i}')
+            index = bisect.bisect(self._points, point)
+            self._points.insert(index, point)
+            self._owners.insert(index, node)
+
+    def remove(self, node):
+        self.nodes.remove(node)
+        kept = [(p, o) for p, o in zip(self._points, self._owners) if o != node]
+        self._points = [p for p, _ in kept]
+        self._owners = [o for _, o in kept]
+
+    def node_for(self, device_id):
+        if not self._points:
+            raise LookupError("Vòng băm chưa có worker nào")
+        index = bisect.bisect(self._points, _hash(device_id if device_id is not None else 0))
+        return self._owners[index % len(self._owners)]
+
+
+def parse_address(address):
+    """'unix:/tmp/a.sock' -> (AF_UNIX, '/tmp/a.sock'); 'host:port' -> (AF_INET, (host, port))"""
+    if address.startswith('unix:'):
+        return socket.AF_UNIX, address[len('unix:'):]
+    host, _, port = address.rpartition(':')
+    return socket.AF_INET, (host or '127.0.0.1', int(port))
+
+
+def encode(fields):
+    data = dict(fields)
+    if isinstance(data.get('timestamp'), datetime):
+        data['timestamp'] = data['timestamp'].isoformat()
+    return (json.dumps(data) + '\n').encode()
+
+
+def decode(line):
+    data = json.loads(line)
+    if data.get('timestamp'):
+        data['timestamp'] = parse_datetime(data['timestamp'])
+    return data
+
+
+class ShardClient:
+    """Gửi Reading tới worker sở hữu thiết bị; mỗi thread giữ một kết nối tới mỗi worker"""
+
+    def __init__(self, addresses, timeout=5.0):
+        self.ring = HashRing(addresses)
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self, address):
+        connections = self._local.__dict__.setdefault('connections', {})
+        if address not in connections:
+            family, target = parse_address(address)
+            sock = socket.socket(family, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(target)
+            connections[address] = (sock, sock.makefile('rwb'))
+        return connections[address]
+
+    def _drop(self, address):
+        sock, stream = self._local.connections.pop(address)
+        stream.close()
+        sock.close()
+
+    def submit(self, fields):
+        """Trả về dict trả lời của worker: {'id': ...}, {'duplicate': True} hoặc {'error': ...}"""
+        address = self.ring.node_for(fields.get('device_id'))
+        payload = encode(fields)
+        for attempt in range(2):
+            reused = address in self._local.__dict__.get('connections', {})
+            _, stream = self._connection(address)
+            try:
+                stream.write(payload)
+                stream.flush()
+                line = stream.readline()
+                if not line:
+                    raise ConnectionError("Worker đóng kết nối")
+                return json.loads(line)
+            except OSError:
+                self._drop(address)
+                # Chỉ thử lại khi kết nối cũ đã hỏng từ trước (worker khởi động lại)
+                if attempt or not reused:
+                    raise
+
+
+def reply(result):
+    """(nội dung, mã HTTP) trả cho thiết bị từ câu trả lời của worker"""
+    if 'error' in result:
+        return result, 400
+    if result.get('duplicate'):
+        return {'message': 'Duplicate ignored', 'id': None}, 200
+    return {'message': 'Data received successfully', 'id': result['id']}, 200
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """ShardClient theo settings.INGEST_SHARDS, hoặc None nếu không chạy chế độ shard"""
+    global _client
+    addresses = tuple(getattr(settings, 'INGEST_SHARDS', ()))
+    if not addresses:
+        return None
+    with _client_lock:
+        if _client is None or tuple(_client.ring.nodes) != addresses:
+            _client = ShardClient(addresses)
+    return _client
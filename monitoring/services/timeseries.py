@@ -0,0 +1,83 @@
+"""
+Đọc Reading theo từng đoạn thành mảng NumPy có kiểu cố định, và giảm mẫu theo pixel
+trong lúc đọc, để vẽ/thống kê trên bảng rất lớn mà bộ nhớ không tăng theo số dòng.
+"""
+import numpy as np
+
+from monitoring.models import Reading
+
+SERIES = ('ph', 'tds', 'ntu')
+
+
+def iter_reading_chunks(device_id=None, start=None, end=None, fields=SERIES, chunk_size=50000, dtype=np.float32):
+    """
+    Duyệt Reading theo (timestamp, id) bằng keyset pagination, mỗi lần một đoạn.
+    Trả về dict: 'id' (int64), 'timestamp' (float64, epoch giây) và mỗi trường trong fields (dtype).
+    """
+    readings = Reading.objects.all()
+    if device_id is not None:
+        readings = readings.filter(device_id=device_id)
+    if start is not None:
+        readings = readings.filter(timestamp__gte=start)
+    if end is not None:
+        readings = readings.filter(timestamp__lt=end)
+    columns = ('id', 'timestamp') + tuple(fields)
+
+    after = None
+    while True:
+        page = readings
+        if after is not None:
+            last_ts, last_id = after
+            page = page.filter(timestamp__gte=last_ts).exclude(timestamp=last_ts, id__lte=last_id)
+        rows = list(page.order_by('timestamp', 'id').values_list(*columns)[:chunk_size])
+        if not rows:
+            return
+        n = len(rows)
+        chunk = {
+            'id': np.fromiter((r[0] for r in rows), dtype=np.int64, count=n),
+            'timestamp': np.fromiter((r[1].timestamp() for r in rows), dtype=np.float64, count=n),
+        }
+        for i, field in enumerate(fields, start=2):
+            chunk[field] = np.fromiter((np.nan if r[i] is None else r[i] for r in rows), dtype=dtype, count=n)
+        yield chunk
+        if n < chunk_size:
+            return
+        after = (rows[-1][1], rows[-1][0])
+
+
+class MinMaxDownsampler:
+    """
+    Gom dữ liệu vào `width` ô thời gian bằng nhau trong [start, end) và giữ min/max/tổng/số lượng
+    từng ô. Bộ nhớ chỉ phụ thuộc vào width, không phụ thuộc số điểm đã đưa vào.
+    """
+
+    def __init__(self, start, end, width, fields=SERIES):
+        self.start = float(start)
+        self.end = float(end)
+        self.width = int(width)
+        self.fields = tuple(fields)
+        self.count = {f: np.zeros(self.width, dtype=np.int64) for f in self.fields}
+        self.sum = {f: np.zeros(self.width, dtype=np.float64) for f in self.fields}
+        self.min = {f: np.full(self.width, np.inf, dtype=np.float32) for f in self.fields}
+        self.max = {f: np.full(self.width, -np.inf, dtype=np.float32) for f in self.fields}
+
+    def add(self, timestamps, columns):
+        span = max(self.end - self.start, 1e-9)
+        buckets = ((np.asarray(timestamps) - self.start) * (self.width / span)).astype(np.int64)
+        np.clip(buckets, 0, self.width - 1, out=buckets)
+        for field in self.fields:
+            values = np.asarray(columns[field])
+            valid = ~np.isnan(values)
+            b, v = buckets[valid], values[valid]
+            self.count[field] += np.bincount(b, minlength=self.width)
+            self.sum[field] += np.bincount(b, weights=v, minlength=self.width)
+            np.minimum.at(self.min[field], b, v)
+            np.maximum.at(self.max[field], b, v)
+
+    def result(self, field):
+        """Trả về (tâm ô thời gian, min, mean, max) chỉ cho các ô có dữ liệu"""
+        filled = self.count[field] > 0
+        step = (self.end - self.start) / self.width
+        centers = self.start + (np.arange(self.width) + 0.5) * step
+        mean = self.sum[field][filled] / self.count[field][filled]
+        return centers[filled], self.min[field][filled], mean, self.max[field][filled]
@@ -1,7 +1,11 @@
 # accounts/signals.py
 from django.contrib.auth.signals import user_logged_in, user_login_failed, user_logged_out
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
-from .models import LoginHistory
+from .auth_backends import invalidate_user
+from .models import Device, LoginHistory, Reading, SensorType, User
+from .services.devices import invalidate_device_ids
+from .services import render_cache
 
 def get_client_ip(request):
     x_forwarded_for = request.META.get("HTTP_X_FORWARDED_FOR")
@@ -31,3 +35,39 @@ def log_user_login_failed(sender, credentials, request, **kwargs):
 def log_user_logout(sender, request, user, **kwargs):
     # bạn có thể ghi thêm nếu muốn log logout
     print(f"User {user} đã logout")
+    if user is not None:
+        invalidate_user(user.pk)
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    # Đổi vai trò, đổi/đặt lại mật khẩu... đều đi qua User.save()
+    invalidate_user(instance.pk)
+    if kwargs.get('created', True):  # tạo mới hoặc xoá user
+        invalidate_device_ids(instance.pk)
+
+
+@receiver(pre_save, sender=Device)
+def remember_previous_owner(sender, instance, **kwargs):
+    # Chuyển thiết bị sang user khác thì cache của chủ cũ cũng phải xoá
+    if instance.pk is not None and not kwargs.get('raw'):
+        instance._previous_user_id = sender.objects.filter(pk=instance.pk).values_list('user_id', flat=True).first()
+
+@receiver(post_save, sender=Device)
+@receiver(post_delete, sender=Device)
+def invalidate_owned_devices(sender, instance, **kwargs):
+    invalidate_device_ids(instance.user_id)
+    render_cache.bump([instance.pk])  # tên/vị trí hiển thị trên dashboard và bảng dữ liệu
+    previous = getattr(instance, '_previous_user_id', None)
+    if previous is not None and previous != instance.user_id:
+        invalidate_device_ids(previous)
+
+@receiver(post_save, sender=Reading)
+@receiver(post_delete, sender=Reading)
+def bump_reading_device(sender, instance, **kwargs):
+    render_cache.bump([instance.device_id])  # bulk_create: xem models.ReadingQuerySet
+
+@receiver(post_save, sender=SensorType)
+@receiver(post_delete, sender=SensorType)
+def invalidate_sensor_types(sender, **kwargs):
+    SensorType.objects.clear_cache()
@@ -0,0 +1,32 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from monitoring.services import render_cache
+
+register = template.Library()
+
+
+class CachedFragmentNode(template.Node):
+    def __init__(self, nodelist, key):
+        self.nodelist = nodelist
+        self.key = key
+
+    def render(self, context):
+        key = self.key.resolve(context)
+        if not key:
+            return self.nodelist.render(context)
+        return mark_safe(render_cache.get_or_compute(key, lambda: str(self.nodelist.render(context))))
+
+
+@register.tag
+def cachedfragment(parser, token):
+    """
+    {% cachedfragment key %}...{% endcachedfragment %}: đoạn template được cache theo `key`
+    (tạo bằng services.render_cache.make_key); các truy vấn lười bên trong chỉ chạy khi trượt cache.
+    """
+    bits = token.split_contents()
+    if len(bits) != 2:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' cần đúng một tham số: khoá cache")
+    nodelist = parser.parse(('endcachedfragment',))
+    parser.delete_first_token()
+    return CachedFragmentNode(nodelist, parser.compile_filter(bits[1]))
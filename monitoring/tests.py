@@ -1,3 +1,1251 @@
-from django.test import TestCase
+import asyncio
+import functools
+import importlib
+import json
+import os
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+from io import StringIO
+from pathlib import Path
 
-# Create your tests here.
+from datetime import datetime, timedelta, timezone as dt_timezone
+from unittest import mock
+
+import numpy as np
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import OperationalError, connections, router
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from .models import User, Device, Reading, Alert, LegacyImportCheckpoint, LoginHistory, SensorData, SensorType, UserActionHistory
+from . import db_router
+from .auth_backends import user_cache_key
+from .checks import check_shared_cache
+from .middleware import PRIMARY_COOKIE, ReplicaStickyMiddleware
+from .profiling import QueryBudgetTestMixin, fingerprint, profile_queries
+from .services import alerts as alerts_service, model_registry, potability
+from .services.timeseries import MinMaxDownsampler, iter_reading_chunks
+from .services import replay
+from .services import derived, render_cache
+from .services.devices import owned_device_ids, update_last_readings
+from .services.legacy_import import LegacySource, plan_ranges
+from .services.ingest import record_reading
+from .services.liveness import get_config as get_liveness_config, tracker
+from .services import anomaly
+from .services.anomaly import DeviceDetector
+from .services.shard_worker import ShardWorker
+from .services.sharding import HashRing, ShardClient
+from .services.notifications import NotificationDispatcher, dispatcher
+
+
+def make_legacy_db(path, rows):
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS sensor (id INTEGER PRIMARY KEY, ph REAL, ntu REAL, tds REAL, "
+        "created_at TEXT DEFAULT CURRENT_TIMESTAMP)"
+    )
+    conn.executemany("INSERT INTO sensor (id, ph, ntu, tds, created_at) VALUES (?, ?, ?, ?, ?)", rows)
+    conn.commit()
+    conn.close()
+
+
+def tearDownModule():
+    # Cảnh báo do các test tạo ra: gửi nốt khi database test còn tồn tại, không để tới atexit
+    dispatcher.shutdown()
+
+
+class LegacyImportTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='owner', email='owner@example.com', password='secret123')
+        self.device = Device.objects.create(name='Bể 1', user=self.user)
+        fd, self.path = tempfile.mkstemp(suffix='.sqlite3')
+        os.close(fd)
+        self.addCleanup(os.remove, self.path)
+        make_legacy_db(self.path, [
+            (i, 7.0 + i / 100, 1.5, 300 + i, f"2024-01-01 00:{i // 60:02d}:{i % 60:02d}") for i in range(1, 26)
+        ])
+
+    def test_import_assigns_device_and_checkpoints(self):
+        call_command('import_legacy_sensor', sqlite=self.path, device=self.device.pk, chunk_size=10, stdout=StringIO())
+
+        self.assertEqual(Reading.objects.filter(device=self.device).count(), 25)
+        reading = Reading.objects.get(tds=301)
+        self.assertAlmostEqual(reading.ph, 7.01)
+        self.assertEqual(reading.timestamp.year, 2024)
+        checkpoint = LegacyImportCheckpoint.objects.get()
+        self.assertTrue(checkpoint.finished)
+        self.assertEqual((checkpoint.last_id, checkpoint.imported), (25, 25))
+
+    def test_rerun_only_imports_new_rows(self):
+        call_command('import_legacy_sensor', sqlite=self.path, chunk_size=10, stdout=StringIO())
+        make_legacy_db(self.path, [(26, 8.0, 2.0, 400, "2024-01-02 00:00:00")])
+        call_command('import_legacy_sensor', sqlite=self.path, chunk_size=10, stdout=StringIO())
+
+        self.assertEqual(Reading.objects.count(), 26)
+
+    def test_resumes_unfinished_range(self):
+        source = LegacySource.sqlite(self.path).label
+        LegacyImportCheckpoint.objects.create(source=source, range_start=0, range_end=25, last_id=20)
+        call_command('import_legacy_sensor', sqlite=self.path, chunk_size=10, stdout=StringIO())
+
+        self.assertEqual(Reading.objects.count(), 5)
+        self.assertEqual(Reading.objects.order_by('tds').first().tds, 321)
+
+    def test_rerun_with_other_boundaries_reuses_checkpoints(self):
+        call_command('import_legacy_sensor', sqlite=self.path, end_id=15, workers=1, stdout=StringIO())
+        call_command('import_legacy_sensor', sqlite=self.path, start_id=5, stdout=StringIO())
+
+        self.assertEqual(Reading.objects.count(), 25)
+        self.assertEqual(Reading.objects.values('tds').distinct().count(), 25)
+        # Đổi số worker: đoạn dở giữ nguyên biên, chỉ chia phần chưa có checkpoint
+        self.assertEqual(plan_ranges([(0, 10, True), (10, 20, False)], 5, 40, 2), [(10, 20), (20, 30), (30, 40)])
+
+    def test_skips_rows_with_missing_values(self):
+        make_legacy_db(self.path, [(26, None, 2.0, 400, "2024-01-02 00:00:00")])
+        call_command('import_legacy_sensor', sqlite=self.path, stdout=StringIO())
+
+        self.assertEqual(Reading.objects.count(), 25)
+        self.assertFalse(Reading.objects.filter(ph=0).exists())
+        self.assertEqual(LegacyImportCheckpoint.objects.get().last_id, 26)
+
+
+class PotabilityTests(TestCase):
+    def setUp(self):
+        from sklearn.ensemble import RandomForestClassifier
+
+        self.model_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.model_dir)
+        # Mô hình nhỏ: uống được khi pH trong khoảng trung tính
+        ph = np.linspace(0, 14, 200)
+        X = np.column_stack([ph, np.full(200, 300.0), np.full(200, 2.0)])
+        y = ((ph > 6.5) & (ph < 8.5)).astype(int)
+        model = RandomForestClassifier(n_estimators=10, random_state=0).fit(X, y)
+        model_registry.save_artifact(self.model_dir, 'potability', model, potability.FEATURES)
+        potability.reset_model()
+        self.addCleanup(potability.reset_model)
+
+    def test_artifact_versions(self):
+        self.assertEqual(model_registry.latest_version(self.model_dir, 'potability'), 1)
+        model_registry.save_artifact(self.model_dir, 'potability', object(), potability.FEATURES)
+        self.assertEqual(model_registry.latest_version(self.model_dir, 'potability'), 2)
+
+    def test_ingest_scores_in_batches_and_raises_ai_alert(self):
+        config = {'MODEL_DIR': self.model_dir, 'BATCH_SIZE': 3, 'MAX_DELAY': 60}
+        with override_settings(POTABILITY=config):
+            good = record_reading(ph=7.2, tds=300, ntu=2)
+            bad = record_reading(ph=2.0, tds=300, ntu=2)
+            good.refresh_from_db()
+            self.assertIsNone(good.potability)  # batch chưa đầy
+
+            record_reading(ph=7.5, tds=300, ntu=2)
+
+        good.refresh_from_db()
+        bad.refresh_from_db()
+        self.assertGreater(good.potability, 0.5)
+        self.assertLess(bad.potability, 0.3)
+        alert = Alert.objects.get()
+        self.assertEqual((alert.type, alert.status), ('AI', 'NEW'))
+        self.assertIn(f"Reading {bad.pk}", alert.message)
+
+    def test_score_readings_command(self):
+        Reading.objects.bulk_create([Reading(ph=ph, tds=300, ntu=2) for ph in (7.0, 7.4, 1.0)])
+        with override_settings(POTABILITY={'MODEL_DIR': self.model_dir}):
+            call_command('score_readings', stdout=StringIO())
+
+        self.assertFalse(Reading.objects.filter(potability__isnull=True).exists())
+        self.assertEqual(Alert.objects.filter(type='AI').count(), 1)
+
+    def test_missing_artifact_is_rechecked(self):
+        empty = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, empty)
+        with override_settings(POTABILITY={'MODEL_DIR': empty, 'MISSING_RECHECK': 0}):
+            self.assertIsNone(potability.get_model()[0])
+            shutil.copytree(self.model_dir, empty, dirs_exist_ok=True)
+            self.assertIsNotNone(potability.get_model()[0])
+
+    def test_pending_batch_is_scored_on_shutdown(self):
+        with override_settings(POTABILITY={'MODEL_DIR': self.model_dir, 'BATCH_SIZE': 10, 'MAX_DELAY': 60}):
+            reading = record_reading(ph=7.2, tds=300, ntu=2)
+            potability.batcher.shutdown()
+
+        reading.refresh_from_db()
+        self.assertIsNotNone(reading.potability)
+
+
+def sensor_analysis_module(name):
+    """Script trong sensor_analysis/ import lẫn nhau theo tên file (thư mục không phải package)"""
+    path = str(settings.BASE_DIR / 'sensor_analysis')
+    if path not in sys.path:
+        sys.path.insert(0, path)
+    return importlib.import_module(name)
+
+
+def write_potability_csv(path, start, stop, mode='w'):
+    """Các dòng start..stop của một tập dữ liệu cố định (pH thiếu mỗi 7 dòng), cùng cột với water_potability.csv"""
+    rng = np.random.default_rng(0)
+    ph, solids, turbidity = rng.uniform(0, 14, 1000), rng.normal(20000, 3000, 1000), rng.uniform(2, 5, 1000)
+    with open(path, mode) as f:
+        if mode == 'w':
+            f.write('ph,Solids,Turbidity,Potability\n')
+        for i in range(start, stop):
+            label = int(6.5 < ph[i] < 8.5)
+            f.write(f"{'' if i % 7 == 0 else ph[i]},{solids[i]},{turbidity[i]},{label}\n")
+
+
+class TrainPotabilityTests(TestCase):
+    def setUp(self):
+        self.tp = sensor_analysis_module('train_potability')
+        self.dataset = sensor_analysis_module('dataset')
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.csv = os.path.join(self.directory, 'potability.csv')
+        self.cache_dir = os.path.join(self.directory, 'cache')
+        self.out = os.path.join(self.directory, 'out')
+        write_potability_csv(self.csv, 0, 300)
+        # Cache dạng cột của dataset.py cũng nằm trong thư mục tạm, không ghi vào sensor_analysis/.cache
+        columns = functools.partial(self.dataset.load_columns, cache_dir=os.path.join(self.directory, 'columns'))
+        patches = [
+            mock.patch.object(self.tp, 'load_columns', columns),
+            mock.patch.object(self.tp, 'source_hash',
+                              functools.partial(self.dataset.source_hash, cache_dir=os.path.join(self.directory, 'columns'))),
+            mock.patch.object(self.tp, 'PARAM_GRID', {'n_estimators': [10], 'max_depth': [None, 4]}),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def prepare(self, refit=False):
+        return self.tp.prepare_features(self.csv, self.cache_dir, 'Potability', None, refit=refit)
+
+    def train(self, *args):
+        call = ['--csv', self.csv, '--out', self.out, '--cache-dir', self.cache_dir, '--folds', '2', '--jobs', '1']
+        with mock.patch('sys.stdout', new_callable=StringIO):
+            self.tp.main(call + list(args))
+        latest = sorted(Path(self.out).glob('potability-v*-metrics.json'))[-1]
+        return json.loads(latest.read_text())
+
+    def test_incremental_mode_reuses_the_fitted_imputer(self):
+        X_train, X_test, y_train, y_test, imputer, mode = self.prepare()
+        self.assertEqual((mode, len(y_train) + len(y_test)), ('full', 300))
+        self.assertFalse(np.isnan(X_train).any() or np.isnan(X_test).any())
+        self.assertEqual(self.prepare()[-1], 'cache')
+
+        write_potability_csv(self.csv, 300, 360, mode='a')
+        new_train, new_test, new_y_train, new_y_test, new_imputer, mode = self.prepare()
+        self.assertEqual(mode, 'incremental')
+        self.assertEqual((len(new_y_train) + len(new_y_test)), 360)
+        # Dòng cũ giữ nguyên, imputer không fit lại, dòng mới được impute bằng imputer đã lưu
+        np.testing.assert_array_equal(new_train[:len(X_train)], X_train)
+        np.testing.assert_array_equal(new_test[:len(X_test)], X_test)
+        np.testing.assert_array_equal(new_imputer.initial_imputer_.statistics_, imputer.initial_imputer_.statistics_)
+        X, _ = self.tp.load_matrix(self.csv, 'Potability', None)
+        added = np.vstack([new_train[len(X_train):], new_test[len(X_test):]])
+        self.assertFalse(np.isnan(added).any())
+        self.assertEqual(len(added), len(X[300:]))
+
+        self.assertEqual(self.prepare(refit=True)[-1], 'full')
+
+    def test_changed_rows_invalidate_the_cache(self):
+        self.prepare()
+        with open(self.csv) as f:
+            lines = f.readlines()
+        lines[5] = '7.0,20000,3.0,1\n'
+        with open(self.csv, 'w') as f:
+            f.writelines(lines)
+        self.assertEqual(self.prepare()[-1], 'full')
+
+    def test_full_incremental_and_cached_training(self):
+        first = self.train()
+        self.assertEqual((first['preprocess'], first['rows']), ('full', 300))
+        self.assertEqual(len(first['search']), 2)
+
+        # Dữ liệu không đổi: tiền xử lý và kết quả tìm tham số đều lấy từ cache
+        with mock.patch.object(self.tp, 'ProcessPoolExecutor', side_effect=AssertionError('search đã được cache')):
+            cached = self.train()
+        self.assertEqual(cached['preprocess'], 'cache')
+        self.assertEqual(cached['best_params'], first['best_params'])
+
+        write_potability_csv(self.csv, 300, 360, mode='a')
+        with mock.patch.object(self.tp, 'search', side_effect=AssertionError('--reuse-params bỏ qua tìm kiếm')):
+            incremental = self.train('--reuse-params')
+        self.assertEqual((incremental['preprocess'], incremental['rows']), ('incremental', 360))
+        self.assertEqual(model_registry.latest_version(self.out, 'potability'), 3)
+
+
+class ColumnarDatasetTests(TestCase):
+    def setUp(self):
+        self.dataset = sensor_analysis_module('dataset')
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.csv = os.path.join(self.directory, 'readings.csv')
+        self.cache_dir = os.path.join(self.directory, 'cache')
+        self.write('ph,count,timestamp,device\n7.1,3,2026-01-02T03:04:05+00:00,Bể 1\n,4,,Giếng\n')
+
+    def write(self, content):
+        with open(self.csv, 'w') as f:
+            f.write(content)
+
+    def load(self, columns=None):
+        return self.dataset.load_columns(self.csv, columns, cache_dir=self.cache_dir)
+
+    def test_columns_are_typed_and_memory_mapped(self):
+        columns = self.load()
+        self.assertEqual({name: array.dtype.kind for name, array in columns.items()},
+                         {'ph': 'f', 'count': 'i', 'timestamp': 'f', 'device': 'U'})
+        self.assertTrue(all(isinstance(array, np.memmap) for array in columns.values()))
+        self.assertTrue(np.isnan(columns['ph'][1]))
+        self.assertEqual(columns['timestamp'][0], datetime(2026, 1, 2, 3, 4, 5, tzinfo=dt_timezone.utc).timestamp())
+        # Văn bản không phải số hay thời gian ISO được giữ nguyên dạng chuỗi
+        self.assertEqual(list(columns['device']), ['Bể 1', 'Giếng'])
+        self.assertEqual(list(self.load(['device'])), ['device'])
+        with self.assertRaises(KeyError):
+            self.load(['tds'])
+
+    def test_cache_is_rebuilt_only_when_content_changes(self):
+        self.load()
+        with mock.patch.object(self.dataset, '_build', side_effect=AssertionError('không cần build lại')):
+            self.load()
+            # Chỉ đổi mtime (copy/checkout lại): so sha256 rồi dùng lại cache
+            os.utime(self.csv, ns=(0, 0))
+            self.load()
+        self.assertEqual(self.dataset.ensure_cache(self.csv, self.cache_dir)[1]['mtime_ns'], 0)
+
+        self.write('ph,count,timestamp,device\n6.0,5,2026-01-03T00:00:00+00:00,Bể 2\n')
+        columns = self.load()
+        self.assertEqual((float(columns['ph'][0]), list(columns['device'])), (6.0, ['Bể 2']))
+
+
+class ExportReadingsTests(TestCase):
+    def test_export_filters_by_device(self):
+        user = User.objects.create_user(username='owner', email='owner@example.com', password='secret123')
+        device = Device.objects.create(name='Bể 1', user=user)
+        Reading.objects.create(ph=7.1, tds=300, ntu=2, device=device)
+        Reading.objects.create(ph=6.9, tds=310, ntu=3)
+        out = StringIO()
+        call_command('export_readings', device=device.pk, stdout=out)
+
+        lines = out.getvalue().strip().splitlines()
+        self.assertEqual(lines[0], 'id,device_id,timestamp,ph,tds,ntu,battery,signal,potability')
+        self.assertEqual(len(lines), 2)
+        self.assertIn(',7.1,300.0,2.0,', lines[1])
+
+
+class TimeseriesTests(TestCase):
+    def test_chunks_cover_range_with_equal_timestamps(self):
+        now = timezone.now()
+        # Nhiều dòng cùng timestamp nằm vắt qua ranh giới các đoạn
+        Reading.objects.bulk_create([Reading(timestamp=now + timedelta(seconds=i // 3), ph=i, tds=0, ntu=0) for i in range(10)])
+        chunks = list(iter_reading_chunks(chunk_size=4))
+
+        self.assertEqual([len(c['id']) for c in chunks], [4, 4, 2])
+        ph = np.concatenate([c['ph'] for c in chunks])
+        self.assertEqual(ph.dtype, np.float32)
+        self.assertEqual(sorted(ph.tolist()), list(range(10)))
+
+    def test_min_max_downsampler(self):
+        sampler = MinMaxDownsampler(0, 100, 4, fields=['ph'])
+        t = np.arange(100, dtype=np.float64)
+        sampler.add(t[:50], {'ph': t[:50]})
+        sampler.add(t[50:], {'ph': t[50:]})
+
+        centers, lo, mean, hi = sampler.result('ph')
+        self.assertEqual(centers.tolist(), [12.5, 37.5, 62.5, 87.5])
+        self.assertEqual(lo.tolist(), [0, 25, 50, 75])
+        self.assertEqual(hi.tolist(), [24, 49, 74, 99])
+        self.assertEqual(mean.tolist(), [12, 37, 62, 87])
+
+
+class SensorDataSeriesTests(TestCase):
+    def setUp(self):
+        # captureOnCommitCallbacks giả lập commit nhưng TestCase vẫn rollback cuối mỗi test
+        self.addCleanup(SensorType.objects.clear_cache)
+        user = User.objects.create_user(username='owner', email='owner@example.com', password='secret123')
+        self.device = Device.objects.create(name='Bể 1', user=user)
+        self.t0 = timezone.now().replace(microsecond=0)
+
+    def test_record_uses_sensor_type_lookup(self):
+        SensorData.objects.record(self.device, {'temperature': 25.5, 'salinity': 0.3}, self.t0)
+        SensorData.objects.record(self.device, {'temperature': 26.0}, self.t0 + timedelta(minutes=1))
+
+        self.assertEqual(SensorType.objects.count(), 2)
+        self.assertEqual(SensorData.objects.filter(sensor_type__code='temperature').count(), 2)
+        self.assertEqual(str(SensorData.objects.filter(sensor_type__code='salinity').get()), 'salinity - 0.3')
+
+    def test_series_returns_aligned_columns_in_one_query(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            SensorData.objects.record(self.device, {'temperature': 25.5, 'salinity': 0.3}, self.t0)
+            SensorData.objects.record(self.device, {'temperature': 26.0}, self.t0 + timedelta(minutes=1))
+
+        with self.assertNumQueries(1):
+            series = SensorData.objects.series(self.device, ['temperature', 'salinity'])
+
+        self.assertEqual(series['timestamp'].tolist(), [self.t0.timestamp(), self.t0.timestamp() + 60])
+        self.assertEqual(series['temperature'].tolist(), [25.5, 26.0])
+        self.assertEqual(series['salinity'][0], 0.3)
+        self.assertTrue(np.isnan(series['salinity'][1]))
+        self.assertTrue(np.isnan(SensorData.objects.series(self.device, ['oxygen'])['oxygen']).all())
+
+    def test_rolled_back_or_deleted_type_is_not_cached(self):
+        with self.captureOnCommitCallbacks(execute=False):
+            SensorData.objects.record(self.device, {'oxygen': 8.0}, self.t0)
+        self.assertNotIn('oxygen', SensorType.objects._ids)  # transaction chưa commit
+
+        with self.captureOnCommitCallbacks(execute=True):
+            SensorData.objects.record(self.device, {'salinity': 0.3}, self.t0)
+        self.assertIn('salinity', SensorType.objects._ids)
+        SensorData.objects.all().delete()
+        SensorType.objects.filter(code='salinity').get().delete()
+        self.assertEqual(SensorType.objects._ids, {})
+        SensorData.objects.record(self.device, {'salinity': 0.4}, self.t0)
+        self.assertEqual(SensorData.objects.get().value, 0.4)
+
+
+class FastPathTests(TransactionTestCase):
+    # Writer ghi bằng thread và kết nối DB riêng nên không dùng transaction của TestCase
+    async def test_upload_then_latest(self):
+        response = await self.async_client.post('/fast/upload-reading/', {'ph': '7.3', 'ntu': '1.2', 'tds': '310', 'battery': '88'})
+        self.assertEqual(response.status_code, 200)
+        reading = await Reading.objects.aget(pk=response.json()['id'])
+        self.assertEqual((reading.ph, reading.battery), (7.3, 88.0))
+
+        response = await self.async_client.get('/fast/latest-reading/')
+        self.assertEqual(response.json()['ph'], 7.3)
+
+    async def test_readings_get_ids_without_returning_support(self):
+        # MySQL: bulk_create không trả về id, writer phải đọc lại id để chấm điểm và trả về cho thiết bị
+        features = type(connections['default'].features)
+        with mock.patch.object(features, 'can_return_rows_from_bulk_insert', False), \
+                mock.patch.object(potability.batcher, 'submit') as submit:
+            responses = await asyncio.gather(*(
+                self.async_client.post('/fast/upload-reading/', {'ph': str(ph), 'ntu': '1.2', 'tds': '310'})
+                for ph in (7.0, 7.1, 7.2)
+            ))
+        ids = [response.json()['id'] for response in responses]
+        self.assertNotIn(None, ids)
+        self.assertEqual([(await Reading.objects.aget(pk=pk)).ph for pk in ids], [7.0, 7.1, 7.2])
+        self.assertEqual(sorted(call.args[0].pk for call in submit.call_args_list), sorted(ids))
+
+    async def test_upload_rejects_bad_values(self):
+        response = await self.async_client.post('/fast/upload-reading/', {'ph': 'abc'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(await Reading.objects.acount(), 0)
+
+    async def test_writer_survives_database_errors(self):
+        with mock.patch('monitoring.services.ingest.write_readings', side_effect=OperationalError('down')):
+            response = await self.async_client.post('/fast/upload-reading/', {'ph': '7.3', 'ntu': '1.2', 'tds': '310'})
+        self.assertEqual(response.status_code, 503)
+
+        response = await self.async_client.post('/fast/upload-reading/', {'ph': '7.1', 'ntu': '1.2', 'tds': '310'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(await Reading.objects.acount(), 1)
+
+
+class ReplicaRoutingTests(TestCase):
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        db_router._health.update(checked_at=0.0, ok=False)
+        self.addCleanup(db_router._health.update, checked_at=0.0, ok=False)
+
+    def test_only_marked_reads_of_replicated_models_use_replica(self):
+        self.assertEqual(Reading.objects.all().db, 'default')
+        with db_router.use_replica():
+            self.assertEqual(Reading.objects.all().db, 'replica')
+            self.assertEqual(Alert.objects.all().db, 'replica')
+            self.assertEqual(User.objects.all().db, 'default')
+        self.assertEqual(Reading.objects.all().db, 'default')
+
+    def test_write_pins_client_to_primary(self):
+        seen = []
+
+        def view(request):
+            with db_router.use_replica():
+                seen.append(Reading.objects.all().db)
+                if request.method == 'POST':
+                    # Xác định alias ghi như Alert.objects.create, không cần ghi thật vào DB
+                    self.assertEqual(router.db_for_write(Alert), 'default')
+                    seen.append(Reading.objects.all().db)
+            return HttpResponse()
+
+        middleware = ReplicaStickyMiddleware(view)
+        factory = RequestFactory()
+        response = middleware(factory.post('/'))
+        self.assertEqual(seen, ['replica', 'default'])
+        self.assertIn(PRIMARY_COOKIE, response.cookies)
+
+        request = factory.get('/')
+        request.COOKIES[PRIMARY_COOKIE] = response.cookies[PRIMARY_COOKIE].value
+        middleware(request)
+        middleware(factory.get('/'))
+        self.assertEqual(seen[2:], ['default', 'replica'])
+
+    def test_unhealthy_replica_falls_back_to_primary(self):
+        with mock.patch.object(connections['replica'], 'ensure_connection', side_effect=Exception('down')):
+            with db_router.use_replica():
+                self.assertEqual(Reading.objects.all().db, 'default')
+
+    def test_decorated_function_is_thread_safe(self):
+        entered, done, errors = threading.Barrier(2), threading.Event(), []
+
+        @db_router.use_replica()
+        def read(first):
+            entered.wait()
+            if first:
+                # Thread còn lại vào và ra khỏi cùng decorator trước khi thread này ra
+                done.wait()
+            return db_router._use_replica.get()
+
+        def run(first):
+            try:
+                self.assertTrue(read(first))
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                done.set()
+
+        threads = [threading.Thread(target=run, args=(first,)) for first in (True, False)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+
+class SharedCacheMixin:
+    """Dùng cache file (dùng chung giữa các process) thay cho LocMem mặc định khi test"""
+
+    def setUp(self):
+        super().setUp()
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location, True)
+        shared = override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location,
+        }}, SESSION_ENGINE='django.contrib.sessions.backends.cached_db')
+        shared.enable()
+        self.addCleanup(shared.disable)
+
+
+class CachedAuthTests(SharedCacheMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='admin1', email='a@example.com', password='secret123', role='admin')
+        self.client.login(username='admin1', password='secret123')
+
+    def auth_queries(self, url):
+        with CaptureQueriesContext(connections['default']) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return [q['sql'] for q in ctx.captured_queries if 'monitoring_user' in q['sql'] or 'django_session' in q['sql']]
+
+    def test_authenticated_page_view_has_no_auth_queries(self):
+        self.client.get('/dashboard/')  # làm nóng cache
+        self.assertEqual(self.auth_queries('/dashboard/'), [])
+        self.assertEqual(self.auth_queries('/readings/'), [])
+
+    def test_role_change_invalidates_cached_user(self):
+        self.assertEqual(self.client.get('/admin-dashboard/').status_code, 200)
+        self.user.role = 'user'
+        self.user.save()
+        self.assertEqual(self.client.get('/admin-dashboard/').status_code, 403)
+
+    def test_password_change_logs_out_other_sessions(self):
+        self.client.get('/dashboard/')
+        self.user.set_password('another123')
+        self.user.save()
+        self.assertEqual(self.client.get('/dashboard/').status_code, 302)
+
+    def test_cache_holds_no_password_hash(self):
+        self.client.get('/dashboard/')
+        fields, session_hash = cache.get(user_cache_key(self.user.pk))
+        self.assertNotIn('password', fields)
+        self.assertNotIn(self.user.password, repr(fields))
+        self.assertEqual(session_hash, self.user.get_session_auth_hash())
+
+    def test_sessions_from_model_backend_stay_valid(self):
+        session = self.client.session
+        session[BACKEND_SESSION_KEY] = 'django.contrib.auth.backends.ModelBackend'
+        session.save()
+        self.assertEqual(self.client.get('/dashboard/').status_code, 200)
+
+    def test_process_local_cache_is_not_used(self):
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}):
+            self.client.get('/dashboard/')
+            self.assertIsNone(cache.get(user_cache_key(self.user.pk)))
+            self.assertEqual(check_shared_cache(None)[0].id, 'monitoring.W001')
+
+    def test_sessions_use_cache_only_when_shared(self):
+        code = "from django.conf import settings; print(settings.SESSION_ENGINE)"
+        env = {key: value for key, value in os.environ.items() if key != 'REDIS_URL'}
+        env['DJANGO_SETTINGS_MODULE'] = 'water_monitor.settings'
+        for redis_url, engine in ((None, 'db'), ('redis://localhost:6379/0', 'cached_db')):
+            if redis_url:
+                env['REDIS_URL'] = redis_url
+            result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, env=env,
+                                    cwd=settings.BASE_DIR, check=True)
+            self.assertEqual(result.stdout.strip(), f'django.contrib.sessions.backends.{engine}')
+
+
+class DeviceScopingTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(username='alice', email='alice@example.com', password='secret123')
+        self.bob = User.objects.create_user(username='bob', email='bob@example.com', password='secret123')
+        self.tank = Device.objects.create(name='Bể Alice', user=self.alice)
+        self.well = Device.objects.create(name='Giếng Bob', user=self.bob)
+
+    def test_owned_device_ids_cached_and_invalidated(self):
+        self.assertEqual(owned_device_ids(self.alice), [self.tank.pk])
+        with self.assertNumQueries(0):
+            owned_device_ids(self.alice)
+        self.well.user = self.alice
+        self.well.save()
+        self.assertEqual(owned_device_ids(self.alice), [self.tank.pk, self.well.pk])
+        self.assertEqual(owned_device_ids(self.bob), [])
+
+    def test_ingest_keeps_latest_value_on_device(self):
+        now = timezone.now()
+        record_reading(ph=7.0, tds=300, ntu=1.0, device=self.tank, timestamp=now)
+        record_reading(ph=9.0, tds=900, ntu=8.0, device=self.tank, timestamp=now - timedelta(minutes=5))
+        self.tank.refresh_from_db()
+        self.assertEqual((self.tank.last_reading_at, self.tank.last_ph), (now, 7.0))
+
+    def test_dashboard_shows_only_owned_readings(self):
+        record_reading(ph=7.1, tds=300, ntu=1.0, device=self.tank)
+        record_reading(ph=6.2, tds=300, ntu=1.0, device=self.well)
+        self.client.login(username='alice', password='secret123')
+        response = self.client.get('/dashboard/')
+        self.assertEqual([r['device_id'] for r in response.context['latest_readings']], [self.tank.pk])
+        self.assertEqual([d['pk'] for d in response.context['devices']], [self.tank.pk])
+        response = self.client.get('/readings/')
+        self.assertEqual(response.context['page_obj'].paginator.count, 1)
+
+
+class LivenessTests(SharedCacheMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        tracker.reset()
+        self.addCleanup(tracker.reset)
+        self.owner = User.objects.create_user(username='owner', email='owner@example.com', password='secret123')
+        self.device = Device.objects.create(name='Bể 1', user=self.owner, expected_interval=60)
+        self.other = Device.objects.create(name='Bể 2', user=self.owner, expected_interval=600)
+        tracker.load(now=1000)
+
+    def send(self, device, at, **fields):
+        """Ingest ghi heartbeat xuống Device (update_last_readings), tracker đọc ở lần sync sau"""
+        timestamp = datetime.fromtimestamp(at, tz=dt_timezone.utc)
+        update_last_readings([Reading(device=device, ph=7.0, tds=300, ntu=1.0, timestamp=timestamp, **fields)])
+
+    def test_single_alert_per_outage(self):
+        self.send(self.device, 1000, battery=80, signal=-60)
+        self.send(self.other, 1000, battery=10, signal=-90)
+        self.assertEqual(tracker.sync(now=1000), 2)
+        self.assertEqual(tracker.tick(now=1150), [])
+        self.assertEqual(tracker.tick(now=1181), [self.device.pk])
+        self.assertEqual(tracker.tick(now=1500), [])
+        self.assertEqual(Alert.objects.filter(type='DEVICE', device=self.device).count(), 1)
+        self.device.refresh_from_db()
+        self.assertIsNotNone(self.device.offline_since)
+
+        self.send(self.device, 1600, battery=75)
+        self.device.refresh_from_db()
+        self.assertEqual((self.device.offline_since, self.device.last_battery, self.device.last_signal), (None, 75, -60))
+        tracker.sync(now=1600)
+        self.assertEqual(tracker.counts()['offline'], 0)
+        self.assertEqual(tracker.tick(now=1700), [])
+
+    def test_reading_not_yet_synced_prevents_alert(self):
+        self.send(self.device, 1000)
+        tracker.sync(now=1000)
+        self.send(self.device, 1170)
+        self.assertEqual(tracker.tick(now=1181), [self.device.pk])
+        self.device.refresh_from_db()
+        self.assertIsNone(self.device.offline_since)
+        self.assertFalse(Alert.objects.filter(type='DEVICE').exists())
+        tracker.sync(now=1181)
+        self.assertEqual(tracker.counts()['offline'], 0)
+
+    def test_health_counts_and_endpoint(self):
+        self.send(self.device, 1000, battery=80, signal=-60)
+        self.send(self.other, 1000, battery=10, signal=-90)
+        tracker.sync(now=1000)
+        tracker.tick(now=1200)
+        expected = {'total': 2, 'online': 1, 'offline': 1, 'unknown': 0, 'low_battery': 1, 'weak_signal': 1,
+                    'offline_devices': [self.device.pk]}
+        self.assertEqual(tracker.health(), expected)  # chưa publish: đọc từ Device
+        self.assertEqual(tracker.counts(), expected)
+        tracker.publish()
+        with self.assertNumQueries(0):
+            self.assertEqual(tracker.health(), expected)
+
+        client = APIClient()
+        client.force_authenticate(self.owner)
+        response = client.get('/api/fleet-health/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['offline_devices'], [self.device.pk])
+
+    def test_single_leader(self):
+        config = get_liveness_config()
+        self.assertTrue(tracker._lead('a', config))
+        self.assertFalse(tracker._lead('b', config))
+        self.assertTrue(tracker._lead('a', config))
+
+
+@override_settings(NOTIFICATIONS={'WINDOW': 300, 'RATE_LIMIT': 2, 'MAX_RETRIES': 2, 'BACKOFF': 0})
+class NotificationTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(username='owner', email='owner@example.com', password='secret123')
+        self.admin = User.objects.create_user(username='boss', email='boss@example.com', password='secret123', role='admin')
+        self.device = Device.objects.create(name='Bể 1', user=self.owner)
+        self.dispatcher = NotificationDispatcher()
+        self.addCleanup(self.dispatcher.flush)
+
+    def alerts(self, n, device=None, severity='HIGH'):
+        return [Alert(message=f'pH thấp #{i}', severity=severity, type='RULE', status='NEW', device=device)
+                for i in range(n)]
+
+    def test_coalesces_per_recipient_and_device(self):
+        self.dispatcher.submit(self.alerts(12, self.device) + self.alerts(3, severity='MEDIUM') + self.alerts(5, self.device, 'LOW'))
+        self.assertEqual(self.dispatcher.flush(), 2)
+        by_recipient = {m.to[0]: m for m in mail.outbox}
+        self.assertEqual(set(by_recipient), {'owner@example.com', 'boss@example.com'})
+        self.assertIn('12 cảnh báo HIGH (RULE) trên Bể 1', by_recipient['owner@example.com'].body)
+        self.assertIn('... và 2 cảnh báo khác', by_recipient['owner@example.com'].body)
+
+    def test_rate_limit_defers_to_next_window(self):
+        for now in (0, 1, 2):
+            self.dispatcher.submit(self.alerts(1, self.device))
+            self.dispatcher.flush(now=now)
+        self.assertEqual(len(mail.outbox), 2)
+        self.dispatcher.submit(self.alerts(1, self.device))
+        self.assertEqual(self.dispatcher.flush(now=3600), 1)
+        self.assertIn('2 cảnh báo', mail.outbox[-1].subject)
+
+    def test_deferred_alerts_become_one_bounded_digest(self):
+        other = Device.objects.create(name='Bể 2', user=self.owner)
+        self.dispatcher.submit(self.alerts(2, self.device))
+        self.dispatcher.submit(self.alerts(1, other))
+        self.assertEqual(self.dispatcher.flush(now=0), 2)
+        for now in range(1, 31):
+            self.dispatcher.submit(self.alerts(1, self.device) + self.alerts(1, other))
+            self.assertEqual(self.dispatcher.flush(now=now), 0)
+        digest = self.dispatcher._deferred['owner@example.com']
+        self.assertEqual((digest.total, len(digest.latest)), (60, 10))
+
+        self.assertEqual(self.dispatcher.flush(now=3600), 1)
+        self.assertEqual(mail.outbox[-1].subject, '[Water Monitor] 60 cảnh báo trên Bể 1, Bể 2 (tổng hợp)')
+        self.assertIn('... và 50 cảnh báo khác', mail.outbox[-1].body)
+        self.assertEqual(self.dispatcher._deferred, {})
+
+    def test_shutdown_sends_pending_and_deferred(self):
+        for now in (0, 1, 2):
+            self.dispatcher.submit(self.alerts(1, self.device))
+            self.dispatcher.flush(now=now)
+        self.dispatcher.submit(self.alerts(1, self.device))
+        self.assertIsNotNone(self.dispatcher._timer)
+        self.dispatcher.shutdown()
+        self.assertIsNone(self.dispatcher._timer)
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(mail.outbox[-1].subject, '[Water Monitor] 2 cảnh báo trên Bể 1 (tổng hợp)')
+        self.assertEqual((self.dispatcher._pending, self.dispatcher._deferred), ([], {}))
+
+    def test_failed_sends_do_not_use_quota(self):
+        with mock.patch.object(mail.backends.locmem.EmailBackend, 'send_messages', side_effect=OSError('SMTP down')):
+            for now in (0, 1):
+                self.dispatcher.submit(self.alerts(1, self.device))
+                self.assertEqual(self.dispatcher.flush(now=now), 0)
+        self.dispatcher.submit(self.alerts(1, self.device))
+        self.assertEqual(self.dispatcher.flush(now=2), 1)
+
+    def test_retries_on_send_failure(self):
+        self.dispatcher.submit(self.alerts(1, self.device))
+        calls = []
+        original = mail.backends.locmem.EmailBackend.send_messages
+
+        def flaky(backend, messages):
+            calls.append(1)
+            if len(calls) == 1:
+                raise OSError('SMTP down')
+            return original(backend, messages)
+
+        with mock.patch.object(mail.backends.locmem.EmailBackend, 'send_messages', flaky):
+            self.assertEqual(self.dispatcher.flush(), 1)
+        self.assertEqual((len(calls), len(mail.outbox)), (2, 1))
+
+    def test_alerts_are_dispatched_after_commit(self):
+        with mock.patch('monitoring.services.notifications.dispatcher.submit') as submit:
+            with self.captureOnCommitCallbacks(execute=True):
+                tracker.reset()
+                tracker._report_offline([(self.device.pk, 1000.0, 60)], {'GRACE': 3})
+        self.assertEqual(submit.call_args[0][0][0].type, 'DEVICE')
+
+
+class AlertInboxTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(username='owner', email='owner@example.com', password='secret123')
+        self.device = Device.objects.create(name='Bể 1', user=self.owner)
+        other = Device.objects.create(name='Bể 2', user=User.objects.create_user(
+            username='other', email='other@example.com', password='secret123'))
+        now = timezone.now()
+        with self.captureOnCommitCallbacks(execute=True):
+            alerts_service.create_alerts(
+                [Alert(message=f'#{i}', severity='HIGH' if i % 2 else 'LOW', type='RULE', status='NEW',
+                       device=self.device, timestamp=now - timedelta(minutes=i // 2)) for i in range(7)]
+                + [Alert(message='khác', severity='HIGH', type='RULE', status='NEW', device=other)]
+            )
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+
+    def test_keyset_pages_cover_owned_alerts_once(self):
+        seen, cursor = [], None
+        while True:
+            response = self.client.get('/api/alerts/', {'limit': 3, **({'cursor': cursor} if cursor else {})})
+            seen += [a['message'] for a in response.json()['results']]
+            cursor = response.json()['next_cursor']
+            if cursor is None:
+                break
+        self.assertEqual(sorted(seen), [f'#{i}' for i in range(7)])
+        response = self.client.get('/api/alerts/', {'severity': 'HIGH'})
+        self.assertEqual(len(response.json()['results']), 3)
+
+    def test_page_size_is_clamped(self):
+        for limit, expected in ((0, 1), (-5, 1), (1000, 7)):
+            response = self.client.get('/api/alerts/', {'limit': limit})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.json()['results']), expected)
+
+    def test_malformed_ids_and_cursor_are_rejected(self):
+        pk = Alert.objects.filter(device=self.device).values_list('pk', flat=True).first()
+        for ids in (['abc'], [pk, 'x'], [1.5], [True], [{'id': pk}], [10 ** 30], '1,2', []):
+            with self.subTest(ids=ids):
+                response = self.client.post('/api/alerts/ack/', {'ids': ids}, format='json')
+                self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.post('/api/alerts/ack/', {'ids': [str(pk)]}, format='json').json()['updated'], 1)
+        for cursor in ('abc', '1_x', '1_2_3', f'{10 ** 20}_1'):
+            with self.subTest(cursor=cursor):
+                self.assertEqual(self.client.get('/api/alerts/', {'cursor': cursor}).status_code, 400)
+
+    def test_bulk_ack_updates_cached_counter(self):
+        self.assertEqual(self.client.get('/api/alerts/unread-count/').json()['count'], 7)
+        ids = list(Alert.objects.filter(device=self.device).values_list('pk', flat=True)[:4])
+        foreign = Alert.objects.exclude(device=self.device).values_list('pk', flat=True).first()
+        with self.captureOnCommitCallbacks(execute=True):
+            with CaptureQueriesContext(connections['default']) as ctx:
+                response = self.client.post('/api/alerts/ack/', {'ids': ids + [foreign]}, format='json')
+        self.assertEqual(response.json()['updated'], 4)
+        self.assertEqual(sum(q['sql'].startswith('UPDATE') for q in ctx.captured_queries), 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/api/alerts/unread-count/').json()['count'], 3)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/alerts/resolve/', {'ids': ids}, format='json')
+        self.assertEqual(alerts_service.new_count([self.device.pk]), 3)
+        self.assertEqual(Alert.objects.filter(status='RESOLVED').count(), 4)
+
+
+@override_settings(ROOT_URLCONF='water_monitor.urls_ingest', MIDDLEWARE=[])
+class IngestAppTests(TestCase):
+    def test_upload_then_latest_without_drf(self):
+        response = self.client.post('/api/upload-reading/', {'ph': 7.3, 'ntu': 2, 'tds': 410, 'battery': 88})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Reading.objects.get(pk=response.json()['id']).battery, 88)
+        self.assertEqual(self.client.get('/api/latest-reading/').json()['ph'], 7.3)
+        self.assertEqual(self.client.post('/api/upload-reading/', {'ph': 'abc'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/upload-reading/').status_code, 405)
+
+    @override_settings(ROOT_URLCONF='water_monitor.urls')
+    def test_web_app_upload_parses_like_ingest_app(self):
+        data = {'ph': 7.3, 'ntu': 2, 'tds': 410, 'battery': 88, 'signal': -70, 'timestamp': '2026-01-02T03:04:05'}
+        response = self.client.post('/api/upload-reading/', data)
+        self.assertEqual(response.status_code, 200)
+        reading = Reading.objects.get(pk=response.json()['id'])
+        self.assertEqual((reading.battery, reading.signal), (88, -70))
+        self.assertEqual(reading.timestamp, datetime(2026, 1, 2, 3, 4, 5, tzinfo=dt_timezone.utc))
+        self.assertEqual(self.client.post('/api/upload-reading/', {**data, 'timestamp': 'hôm qua'}).status_code, 400)
+
+    def test_readings_for_a_device_need_its_key(self):
+        owner = User.objects.create_user(username='owner', email='owner@example.com', password='secret123')
+        device = Device.objects.create(name='Bể 1', user=owner)
+        other = Device.objects.create(name='Bể 2', user=owner)
+        data = {'ph': 7.3, 'ntu': 2, 'tds': 410, 'device_id': device.pk}
+        for url in ('/api/upload-reading/', '/fast/upload-reading/'):
+            self.assertEqual(self.client.post(url, data).status_code, 403)
+            self.assertEqual(self.client.post(url, {**data, 'device_key': other.api_key}).status_code, 403)
+        self.assertFalse(Reading.objects.exists())
+
+        self.assertEqual(self.client.post('/api/upload-reading/', {**data, 'device_key': device.api_key}).status_code, 200)
+        with override_settings(ROOT_URLCONF='water_monitor.urls_ingest', MIDDLEWARE=[]):
+            response = self.client.post('/api/upload-reading/', data, headers={'X-Device-Key': device.api_key})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Reading.objects.filter(device=device).count(), 2)
+
+
+class ShardingTests(TestCase):
+    def setUp(self):
+        anomaly.reset()
+        self.addCleanup(anomaly.reset)
+        self.owner = User.objects.create_user(username='owner', email='owner@example.com', password='secret123')
+        self.device = Device.objects.create(name='Bể 1', user=self.owner)
+
+    def test_adding_worker_moves_only_its_share(self):
+        ring = HashRing(['w0', 'w1', 'w2', 'w3'])
+        before = {pk: ring.node_for(pk) for pk in range(10000)}
+        ring.add('w4')
+        moved = [pk for pk in before if ring.node_for(pk) != before[pk]]
+        self.assertTrue(1000 < len(moved) < 3000, len(moved))
+        self.assertTrue(all(ring.node_for(pk) == 'w4' for pk in moved))
+
+    def test_worker_drops_duplicates_and_alerts_once_per_excursion(self):
+        worker = ShardWorker('w0')
+        now = timezone.now().replace(microsecond=0)
+        rows = [{'ph': ph, 'tds': 300, 'ntu': 1, 'device_id': self.device.pk, 'timestamp': now + timedelta(seconds=i)}
+                for i, ph in enumerate([7.0, 9.1, 9.3])]
+        results = worker.process(rows + [dict(rows[1])])
+        self.assertEqual(results[-1], {'duplicate': True})
+        self.assertEqual(worker.process([dict(rows[2])]), [{'duplicate': True}])
+        self.assertEqual(Reading.objects.filter(device=self.device).count(), 3)
+        self.assertEqual(Alert.objects.filter(device=self.device, type='RULE').count(), 1)
+        self.assertEqual(worker.devices[self.device.pk].watermark, rows[2]['timestamp'])
+
+    def test_detector_flags_anomaly_after_warmup(self):
+        detector = DeviceDetector()
+        now = timezone.now()
+        for i in range(40):
+            self.assertEqual(detector.update(1, now, {'ph': 7.0 + (i % 3) * 0.05, 'tds': 300, 'ntu': 1}), [])
+        alerts = detector.update(1, now, {'ph': 8.2, 'tds': 300, 'ntu': 1}) + detector.update(1, now, {'ph': 8.3, 'tds': 300, 'ntu': 1})
+        self.assertEqual([(a.type, a.severity) for a in alerts], [('ANOMALY', 'LOW')])
+
+    def test_unsharded_ingest_runs_detection(self):
+        for ph in (7.0, 9.1, 9.3, 7.0, 9.2):
+            record_reading(ph, 300, 1, device=self.device)
+        self.assertEqual(Alert.objects.filter(device=self.device, type='RULE').count(), 2)
+
+    def serve_in_thread(self, worker):
+        started, running = threading.Event(), {}
+
+        async def main():
+            running['loop'], running['task'] = asyncio.get_running_loop(), asyncio.current_task()
+            started.set()
+            try:
+                await worker.serve()
+            except asyncio.CancelledError:
+                pass
+
+        thread = threading.Thread(target=asyncio.run, args=(main(),), daemon=True)
+        thread.start()
+        started.wait(5)
+        self.addCleanup(thread.join, 5)
+        self.addCleanup(lambda: running['loop'].call_soon_threadsafe(running['task'].cancel))
+
+    def test_handler_closes_connection_on_shutdown(self):
+        worker = ShardWorker('w0')
+        writer = mock.Mock()
+
+        async def main():
+            task = asyncio.create_task(worker._handle(asyncio.Queue(), asyncio.StreamReader(), writer))
+            await asyncio.sleep(0)
+            task.cancel()
+            await asyncio.wait([task])
+            return task
+
+        task = asyncio.run(main())
+        self.assertIsNone(task.exception())
+        writer.close.assert_called_once_with()
+
+    def test_front_routes_to_worker_over_socket(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        addresses = [f'unix:{directory}/s{i}.sock' for i in range(2)]
+        workers = [ShardWorker(address, addresses) for address in addresses]
+        for worker in workers:
+            worker.process = lambda rows, w=worker: [{'id': w.address} for _ in rows]
+            self.serve_in_thread(worker)
+        client = ShardClient(addresses)
+        for _ in range(50):
+            if all(os.path.exists(a[5:]) for a in addresses):
+                break
+            threading.Event().wait(0.02)
+        for device_id in range(1, 20):
+            self.assertEqual(client.submit({'ph': 7, 'tds': 1, 'ntu': 1, 'device_id': device_id}),
+                             {'id': client.ring.node_for(device_id)})
+        data = {'ph': 7, 'tds': 1, 'ntu': 1, 'device_id': self.device.pk}
+        with override_settings(INGEST_SHARDS=addresses):
+            # Mọi endpoint nhận dữ liệu, ở cả ứng dụng web lẫn ứng dụng ingestion, đi qua worker
+            for urlconf in ('water_monitor.urls', 'water_monitor.urls_ingest'):
+                for url in ('/api/upload-reading/', '/fast/upload-reading/'):
+                    with self.subTest(urlconf=urlconf, url=url), override_settings(ROOT_URLCONF=urlconf):
+                        response = self.client.post(url, data, headers={'X-Device-Key': self.device.api_key})
+                        self.assertEqual(response.json()['id'], client.ring.node_for(self.device.pk))
+        self.assertFalse(Reading.objects.exists())
+
+
+class PrimaryOnlyMixin:
+    """Đọc từ primary dù replica có sẵn: kết quả không phụ thuộc lần kiểm tra replica của test trước"""
+
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch.object(db_router, 'replica_available', return_value=False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+class QueryBudgetTests(QueryBudgetTestMixin, PrimaryOnlyMixin, SharedCacheMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.admin = User.objects.create_user(username='admin', email='admin@example.com', password='secret123',
+                                              role='admin', is_staff=True)
+        self.owner = User.objects.create_user(username='owner', email='owner@example.com', password='secret123')
+        self.client.force_login(self.owner)
+
+    def add_readings(self, devices=3, per_device=5):
+        with self.captureOnCommitCallbacks(execute=True):  # bulk_create đánh dấu trang của thiết bị sau commit
+            for i in range(devices):
+                device = Device.objects.create(name=f'Bể {i}', user=self.owner)
+                Reading.objects.bulk_create([Reading(ph=7, tds=300, ntu=1, device=device) for _ in range(per_device)])
+
+    def add_users(self, count=20):
+        start = User.objects.count()
+        users = User.objects.bulk_create([User(username=f'u{i}', email=f'u{i}@example.com')
+                                          for i in range(start, start + count)])
+        LoginHistory.objects.bulk_create([LoginHistory(user=user, status='SUCCESS') for user in users])
+        UserActionHistory.objects.bulk_create([UserActionHistory(user=user, action='login') for user in users])
+
+    def test_user_pages_do_not_grow_with_devices(self):
+        self.add_readings(devices=1)
+        self.assertQueryBudget('/dashboard/', grow=self.add_readings)
+        self.assertQueryBudget('/readings/', grow=self.add_readings)
+
+    def test_admin_pages_do_not_grow_with_users(self):
+        self.client.force_login(self.admin)
+        self.add_users(2)
+        self.assertQueryBudget('/admin-dashboard/', grow=self.add_users)
+        self.assertQueryBudget('/access-report/', grow=self.add_users)
+
+    def test_admin_users_api_is_paginated(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+        self.add_users(5)
+        response = self.assertQueryBudget('/api/admin/users/?limit=3', grow=self.add_users)
+        self.assertEqual(len(response.json()['users']), 3)
+        following = self.client.get('/api/admin/users/', {'after': response.json()['next_after'], 'limit': 3})
+        self.assertEqual(following.json()['users'][0]['id'], response.json()['users'][-1]['id'] + 1)
+        for limit in (0, -1):
+            response = self.client.get('/api/admin/users/', {'limit': limit})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.json()['users']), 1)
+            self.assertEqual(response.json()['next_after'], response.json()['users'][0]['id'])
+
+    def test_fingerprint_groups_repeated_shapes(self):
+        with profile_queries() as profile:
+            for user in User.objects.all():
+                list(user.login_history.all())
+        self.assertEqual(profile.duplicates()[0][1], 2)
+        self.assertEqual(fingerprint("SELECT 1 FROM t WHERE id IN (%s, %s) AND name = 'x'"),
+                         "SELECT ? FROM t WHERE id IN (...) AND name = ?")
+
+    @override_settings(QUERY_PROFILER=True)
+    def test_middleware_reports_queries_and_budget(self):
+        response = self.client.get('/dashboard/')
+        self.assertEqual(response['X-Query-Budget'], '5')
+        self.assertLessEqual(int(response['X-Query-Count']), 5)
+        self.assertIn('X-Query-Duplicates', response)
+
+
+class ReplayTests(TestCase):
+    def make_series(self, n=400):
+        rng = np.random.default_rng(7)
+        columns = {
+            'ph': 7 + 0.1 * rng.standard_normal(n) + (rng.random(n) < 0.02) * 2,
+            'tds': 300 + 10 * rng.standard_normal(n) + (rng.random(n) < 0.01) * 900,
+            'ntu': np.abs(1 + 0.5 * rng.standard_normal(n)),
+        }
+        columns['ph'][rng.random(n) < 0.05] = np.nan
+        return 1.7e9 + np.arange(n) * 60.0, columns
+
+    def test_vectorized_replay_matches_streaming_detector(self):
+        timestamps, columns = self.make_series()
+        detector, expected = DeviceDetector(), []
+        for i, ts in enumerate(timestamps):
+            values = {f: None if np.isnan(columns[f][i]) else float(columns[f][i]) for f in columns}
+            expected += [(ts, a.severity, a.message) for a in detector.update(1, ts, values)]
+        replayed = [(a.timestamp.timestamp(), a.severity, a.message) for a in replay.detect(1, timestamps, columns)]
+        self.assertGreater(len(expected), 5)
+        self.assertEqual(replayed, expected)
+
+    def test_replay_from_db_and_archive_without_writing_alerts(self):
+        owner = User.objects.create(username='owner', email='owner@example.com')
+        device = Device.objects.create(name='Bể 1', user=owner)
+        start = timezone.now() - timedelta(days=1)
+        Reading.objects.bulk_create([
+            Reading(ph=ph, tds=300, ntu=1, device=device, timestamp=start + timedelta(minutes=i))
+            for i, ph in enumerate([7.0, 9.0, 9.1, 7.0, 5.0, 7.1])
+        ])
+        from_db = replay.replay(workers=1)
+        self.assertEqual([a.source for a in from_db.alerts], ['rule:ph', 'rule:ph'])
+        self.assertEqual(from_db.readings, 6)
+        self.assertFalse(Alert.objects.exists())
+
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        archive = os.path.join(directory, 'readings.csv')
+        call_command('export_readings', out=archive, stdout=StringIO())
+        self.assertEqual(replay.replay(archive=archive, workers=1).alerts, from_db.alerts)
+
+        out = StringIO()
+        call_command('replay_alerts', '--ph-high', '9.05', '--workers', '1', stdout=out)
+        self.assertIn('2 cảnh báo từ 6 bản ghi', out.getvalue())
+
+
+class DerivedMetricsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create(username='owner', email='owner@example.com')
+        self.device = Device.objects.create(name='Bể 1', user=self.owner)
+
+    def test_expressions_match_thresholds(self):
+        columns = {'ph': np.array([7.0, 8.5, 6.5, 9.0]), 'tds': np.array([0.0, 1000.0, 0.0, 0.0]),
+                   'ntu': np.array([0.0, 10.0, 0.0, 0.0])}
+        values = derived.compute([None] * 4, columns)
+        np.testing.assert_allclose(values['wqi'], [0, 100, 100 / 3, 400 / 9])
+        self.assertEqual(list(values['quality_band']), ['POTABLE', 'POTABLE', 'POTABLE', 'NON_POTABLE'])
+        self.assertTrue(np.isnan(values['baseline_deviation']).all())
+
+    def test_ingest_stores_derived_columns(self):
+        record_reading(7.0, 300, 1, device=self.device)
+        self.assertEqual(derived.update_baselines(), 1)  # nền = (7, 300, 1)
+        reading = record_reading(9.0, 350, 1, device=self.device)
+        reading.refresh_from_db()
+        self.assertEqual(reading.quality_band, 'NON_POTABLE')
+        self.assertAlmostEqual(reading.wqi, (400 / 3 + 35 + 10) / 3)
+        self.assertAlmostEqual(reading.baseline_deviation, 2.0 / 0.5)
+
+    def test_backfill_matches_ingest(self):
+        reading = record_reading(6.0, 1200, 12, device=self.device)
+        Reading.objects.bulk_create([Reading(ph=6.0, tds=1200, ntu=12, device=self.device)])
+        call_command('backfill_derived', stdout=StringIO())
+        backfilled = Reading.objects.exclude(pk=reading.pk).get()
+        reading.refresh_from_db()
+        self.assertEqual((backfilled.wqi, backfilled.quality_band), (reading.wqi, reading.quality_band))
+
+    def test_ingest_never_refreshes_baselines(self):
+        Reading.objects.bulk_create([Reading(ph=7.0, tds=300, ntu=1, device=self.device)])
+        with CaptureQueriesContext(connections['default']) as ctx:
+            reading = record_reading(9.0, 350, 1, device=self.device)
+        self.assertFalse([q for q in ctx.captured_queries if 'AVG' in q['sql'].upper()])
+        reading.refresh_from_db()
+        self.assertIsNone(reading.baseline_deviation)
+
+        call_command('backfill_derived', '--stale-baselines', stdout=StringIO())
+        self.device.refresh_from_db()
+        self.assertIsNotNone(self.device.baseline_updated_at)
+        reading.refresh_from_db()
+        self.assertAlmostEqual(reading.baseline_deviation, (9.0 - 8.0) / 0.5)  # nền ph = 8
+        self.assertEqual(derived.stale_devices(), [])
+
+    def test_ingest_app_does_not_load_numpy(self):
+        code = ("import sys, django; django.setup(); import water_monitor.ingest_wsgi, water_monitor.urls_ingest; "
+                "print('numpy' in sys.modules)")
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': 'water_monitor.settings_ingest'}
+        result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, env=env,
+                                cwd=settings.BASE_DIR, check=True)
+        self.assertEqual(result.stdout.strip(), 'False')
+
+    def test_backfill_fills_any_missing_column(self):
+        record_reading(7.0, 300, 1, device=self.device)
+        derived.update_baselines()
+        Reading.objects.bulk_create([Reading(ph=9.0, tds=300, ntu=1, device=self.device, wqi=0, quality_band='POTABLE')])
+        call_command('backfill_derived', stdout=StringIO())
+        backfilled = Reading.objects.get(ph=9.0)
+        self.assertEqual(backfilled.quality_band, 'NON_POTABLE')
+        self.assertAlmostEqual(backfilled.baseline_deviation, 2.0 / 0.5)
+
+    def test_readings_table_filters_by_band(self):
+        self.owner.set_password('secret123')
+        self.owner.save()
+        record_reading(7.0, 300, 1, device=self.device)
+        record_reading(9.0, 300, 1, device=self.device)
+        self.client.force_login(self.owner)
+        response = self.client.get('/readings/', {'band': 'NON_POTABLE', 'sort': '-wqi'})
+        self.assertEqual([r.ph for r in response.context['readings']], [9.0])
+
+
+class RenderCacheTests(PrimaryOnlyMixin, SharedCacheMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.owner = User.objects.create(username='owner', email='owner@example.com')
+        self.device = Device.objects.create(name='Bể 1', user=self.owner)
+        other = User.objects.create(username='other', email='other@example.com')
+        self.other_device = Device.objects.create(name='Bể 2', user=other)
+        self.client.force_login(self.owner)
+
+    def ingest(self, ph, device):
+        with self.captureOnCommitCallbacks(execute=True):
+            record_reading(ph, 300, 1, device=device)
+
+    def get(self, path):
+        with profile_queries() as profile:
+            response = self.client.get(path)
+        return response.content.decode(), [sql for _, sql, _ in profile.queries if 'monitoring_reading' in sql]
+
+    def test_pages_recompute_only_when_own_devices_ingest(self):
+        self.ingest(7.1, self.device)
+        for path in ('/dashboard/', '/readings/'):
+            content, queries = self.get(path)
+            self.assertIn('7.10', content)
+            self.assertTrue(queries)
+            self.assertEqual(self.get(path)[1], [])
+
+        self.ingest(7.2, self.other_device)
+        for path in ('/dashboard/', '/readings/'):
+            self.assertEqual(self.get(path)[1], [])
+
+        self.ingest(7.3, self.device)
+        for path in ('/dashboard/', '/readings/'):
+            content, queries = self.get(path)
+            self.assertIn('7.30', content)
+            self.assertTrue(queries)
+
+    def test_bulk_create_and_delete_refresh_pages(self):
+        self.ingest(7.1, self.device)
+        self.get('/dashboard/')
+        with self.captureOnCommitCallbacks(execute=True):
+            Reading.objects.bulk_create([Reading(ph=6.4, tds=300, ntu=1, device=self.device)])
+        content, queries = self.get('/dashboard/')
+        self.assertIn('6.40', content)
+        self.assertTrue(queries)
+        with self.captureOnCommitCallbacks(execute=True):
+            Reading.objects.get(ph=6.4).delete()
+        self.assertNotIn('6.40', self.get('/dashboard/')[0])
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_process_local_cache_disables_render_cache(self):
+        self.assertIsNone(render_cache.make_key('dashboard', [self.device.pk]))
+        self.ingest(7.1, self.device)
+        for _ in range(2):
+            content, queries = self.get('/dashboard/')
+            self.assertIn('7.10', content)
+            self.assertTrue(queries)
+
+    def test_concurrent_misses_compute_once(self):
+        calls, results = [], []
+
+        def compute():
+            calls.append(1)
+            threading.Event().wait(0.05)
+            return 'trang'
+
+        threads = [threading.Thread(target=lambda: results.append(render_cache.get_or_compute('k', compute)))
+                   for _ in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual((len(calls), results), (1, ['trang'] * 20))
@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views
+from . import views, async_views
 from .views import AdminOnlyAPIView, UserProfileAPIView, change_user_role, change_password, latest_reading, upload_reading, readings_table_view
 
 urlpatterns = [
@@ -10,6 +10,7 @@ urlpatterns = [
     path("dashboard/", views.dashboard_view, name="dashboard"),
     path("readings/", readings_table_view, name="readings_table"),
     path("admin-dashboard/", views.admin_dashboard_view, name="admin_dashboard"),
+    path("access-report/", views.access_report, name="access_report"),
     path("password-reset-request/", views.password_reset_request, name="password_reset_request"),
     path("reset-password/<uidb64>/<token>/", views.password_reset_confirm, name="password_reset_confirm"),
     
@@ -20,6 +21,15 @@ urlpatterns = [
     path("api/user/change-password/", change_password, name="change_password_api"),
     path('api/latest-reading/', latest_reading, name='latest-reading'),
     path('api/upload-reading/', upload_reading, name='upload-reading'),
+    path('api/fleet-health/', views.fleet_health, name='fleet-health'),
+    path('api/alerts/', views.alert_list, name='alert-list'),
+    path('api/alerts/ack/', views.acknowledge_alerts, name='alert-ack'),
+    path('api/alerts/resolve/', views.resolve_alerts, name='alert-resolve'),
+    path('api/alerts/unread-count/', views.alert_unread_count, name='alert-unread-count'),
+
+    # Fast path async cho thiết bị (xem water_monitor/asgi.py)
+    path('fast/upload-reading/', async_views.upload_reading_fast, name='fast-upload-reading'),
+    path('fast/latest-reading/', async_views.latest_reading_fast, name='fast-latest-reading'),
     
     
 
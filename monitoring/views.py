@@ -7,21 +7,30 @@ from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
 from django.utils.encoding import force_bytes, force_str
 from django.core.mail import send_mail
 from django.conf import settings
+from django.db import IntegrityError
 from django.http import JsonResponse
 from django.views import View
 from django.contrib.auth.decorators import login_required
+from django.core.paginator import Paginator
+from django.utils.functional import SimpleLazyObject
 from rest_framework import status
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from .decorators import admin_required, user_required
+from .db_router import use_replica
+from .profiling import query_budget
 from .mixins import RoleBasedPermission, IsAdminUser, IsUser
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
-from .models import Reading
-from .serializers import ReadingSerializer
-from monitoring.models import UserActionHistory
+from .models import Alert, Device, Reading
+from .serializers import AlertSerializer, ReadingSerializer
+from .services import alerts as alerts_service, render_cache, sharding
+from .services.devices import owned_device_ids, request_device_key, verify_device_key
+from .services.ingest import parse_reading, record_reading
+from .services.liveness import tracker
+from monitoring.models import LoginHistory, UserActionHistory
 from django.contrib.admin.views.decorators import staff_member_required
 
 import json
@@ -113,36 +122,67 @@ def logout_view(request):
     messages.success(request, "Đã đăng xuất thành công.")
     return redirect("home")
 
+def scoped_device_ids(user):
+    """Thiết bị user được xem, None nếu là admin (tất cả)"""
+    return None if user.role == 'admin' else owned_device_ids(user)
+
+def scoped_readings(user):
+    """
+    Reading và Device mà user được xem: admin xem tất cả, user chỉ xem thiết bị của mình.
+    Lọc theo device_id IN (...) lấy từ cache thay vì join với Device.
+    """
+    if user.role == 'admin':
+        return Reading.objects.all(), Device.objects.order_by('name')
+    device_ids = owned_device_ids(user)
+    if not device_ids:
+        return Reading.objects.none(), Device.objects.none()
+    return Reading.objects.filter(device_id__in=device_ids), Device.objects.filter(pk__in=device_ids).order_by('name')
+
 # Dashboard với phân quyền
+# Khi trượt cache: user, id thiết bị, số cảnh báo chưa đọc (context processor), Reading, Device
+@query_budget(5)
 @login_required
 @user_required
+@use_replica()
 def dashboard_view(request):
     user_role = request.user.role
-    latest_readings = Reading.objects.order_by('-timestamp')[:20]
-    chart_data = []
-    if latest_readings:
-        for reading in latest_readings[:10]:
-            chart_data.append({
-                'timestamp': reading.timestamp.strftime('%H:%M:%S'),
-                'ph': float(reading.ph),
-                'tds': float(reading.tds),
-                'ntu': float(reading.ntu)
-            })
-        chart_data.reverse()
-    
+    key = render_cache.make_key('dashboard', scoped_device_ids(request.user))
+    data = render_cache.get_or_compute(key, lambda: dashboard_data(request.user))
     context = {
         'user_role': user_role,
         'is_admin': user_role == 'admin',
-        'latest_readings': latest_readings,
-        'chart_data': json.dumps(chart_data)
+        **data,
     }
     return render(request, "monitoring/dashboard.html", context)
 
+DASHBOARD_DEVICE_FIELDS = ('pk', 'name', 'location', 'last_reading_at', 'last_ph', 'last_tds', 'last_ntu')
+
+def dashboard_data(user):
+    """Dữ liệu dashboard (cache theo phiên bản dữ liệu các thiết bị, xem services/render_cache.py)"""
+    readings, devices = scoped_readings(user)
+    latest_readings = list(readings.order_by('-timestamp').values('device_id', 'timestamp', 'ph', 'tds', 'ntu')[:20])
+    chart_data = [{
+        'timestamp': reading['timestamp'].strftime('%H:%M:%S'),
+        'ph': float(reading['ph']),
+        'tds': float(reading['tds']),
+        'ntu': float(reading['ntu'])
+    } for reading in latest_readings[:10]]
+    chart_data.reverse()
+    return {
+        'latest_readings': latest_readings,
+        'devices': list(devices.values(*DASHBOARD_DEVICE_FIELDS)),
+        'chart_data': json.dumps(chart_data),
+    }
+
+USER_LIST_FIELDS = ('id', 'username', 'email', 'role', 'is_active')
+
+@query_budget(4)
 @login_required
 @admin_required
 def admin_dashboard_view(request):
-    users = User.objects.all()
-    return render(request, "monitoring/admin_dashboard.html", {"users": users})
+    users = Paginator(User.objects.only(*USER_LIST_FIELDS).order_by('id'), 50)
+    page = users.get_page(request.GET.get('page'))
+    return render(request, "monitoring/admin_dashboard.html", {"users": page, "page_obj": page})
 
 def password_reset_request(request):
     if request.method == "POST":
@@ -210,19 +250,20 @@ def password_reset_confirm(request, uidb64, token):
         return redirect('login')
 
 # API Views với phân quyền
+@query_budget(1)
 class AdminOnlyAPIView(APIView):
+    """Danh sách user, phân trang keyset theo id: ?after=<id cuối trang trước>&limit="""
     permission_classes = [IsAuthenticated, IsAdminUser]
     
     def get(self, request):
-        users = User.objects.all()
-        data = [{
-            'id': user.id,
-            'username': user.username,
-            'email': user.email,
-            'role': user.role,
-            'is_active': user.is_active
-        } for user in users]
-        return Response({'users': data})
+        try:
+            after = int(request.GET.get('after', 0))
+            limit = max(1, min(int(request.GET.get('limit', 100)), 500))
+        except ValueError:
+            return Response({'error': 'Tham số không hợp lệ'}, status=status.HTTP_400_BAD_REQUEST)
+        data = list(User.objects.filter(id__gt=after).order_by('id').values(*USER_LIST_FIELDS)[:limit + 1])
+        next_after = data[limit - 1]['id'] if len(data) > limit else None
+        return Response({'users': data[:limit], 'next_after': next_after})
 
 class UserProfileAPIView(APIView):
     permission_classes = [IsAuthenticated, RoleBasedPermission]
@@ -282,17 +323,43 @@ def change_password(request):
     
     return Response({'message': 'Mật khẩu đã được thay đổi thành công'})
 
+READING_SORTS = ('-wqi', '-baseline_deviation')
+READINGS_PER_PAGE = 50
+
+@query_budget(4)
 @login_required
 @user_required
+@use_replica()
 def readings_table_view(request):
-    """View hiển thị bảng dữ liệu Reading"""
-    readings = Reading.objects.order_by('-timestamp')
+    """
+    Bảng dữ liệu Reading theo trang, lọc ?band= và sắp xếp ?sort= theo chỉ số dẫn xuất.
+    Cả trang bảng được cache (templatetags/render_cache.py); truy vấn chỉ chạy khi trượt cache.
+    """
+    readings, _ = scoped_readings(request.user)
+    band = request.GET.get('band', '')
+    if band not in dict(Reading.QUALITY_BAND_CHOICES):
+        band = ''
+    if band:
+        readings = readings.filter(quality_band=band)
+    sort = request.GET.get('sort', '')
+    if sort not in READING_SORTS:
+        sort = ''
+    readings = readings.select_related('device').order_by(*((sort, '-timestamp') if sort else ('-timestamp',)))
+    page_number = request.GET.get('page', '')
+    page_number = int(page_number) if page_number.isdigit() else 1
+    page = SimpleLazyObject(lambda: Paginator(readings, READINGS_PER_PAGE).get_page(page_number))
     context = {
-        'readings': readings,
-        'total_readings': readings.count()
+        'readings': page,
+        'page_obj': page,
+        'band': band,
+        'band_choices': Reading.QUALITY_BAND_CHOICES,
+        'sort': sort,
+        'table_key': render_cache.make_key('readings_table', scoped_device_ids(request.user),
+                                           band=band, sort=sort, page=page_number),
     }
     return render(request, "monitoring/readings_table.html", context)
 
+@query_budget(1)
 @api_view(['GET'])
 @permission_classes([])  # Bỏ yêu cầu authentication
 def latest_reading(request):
@@ -307,24 +374,92 @@ def latest_reading(request):
         return Response(data)
     return Response({"error": "No data"}, status=404)
 
+@query_budget(2)
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def fleet_health(request):
+    """Tình trạng thiết bị: online/offline, pin yếu, sóng yếu (admin: toàn bộ, user: thiết bị của mình)"""
+    return Response(tracker.health(scoped_device_ids(request.user)))
+
+def scoped_alerts(user):
+    """Alert mà user được xem và danh sách thiết bị tương ứng (None: admin xem tất cả)"""
+    if user.role == 'admin':
+        return Alert.objects.all(), None
+    device_ids = owned_device_ids(user)
+    return Alert.objects.filter(device_id__in=device_ids), device_ids
+
+ALERT_FILTERS = {'status': 'status__in', 'severity': 'severity__in', 'type': 'type__in', 'device': 'device_id__in'}
+
+@query_budget(2)
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@use_replica()
+def alert_list(request):
+    """Hộp cảnh báo: lọc ?status=NEW,ACK&severity=HIGH&device=3, phân trang bằng ?cursor="""
+    alerts, _ = scoped_alerts(request.user)
+    try:
+        for param, lookup in ALERT_FILTERS.items():
+            if request.GET.get(param):
+                values = request.GET[param].split(',')
+                alerts = alerts.filter(**{lookup: [int(v) for v in values] if param == 'device' else values})
+        limit = int(request.GET.get('limit', 50))
+        items, next_cursor = alerts_service.page(alerts, request.GET.get('cursor'), limit)
+    except ValueError:
+        return Response({'error': 'Tham số không hợp lệ'}, status=status.HTTP_400_BAD_REQUEST)
+    return Response({'results': AlertSerializer(items, many=True).data, 'next_cursor': next_cursor})
+
+def _is_alert_id(value):
+    # JSON gửi số nguyên, form gửi chuỗi chữ số; bool, số thực và chuỗi khác đều bị từ chối
+    if isinstance(value, str) and value.isascii() and value.isdigit():
+        value = int(value)
+    return isinstance(value, int) and not isinstance(value, bool) and 0 < value < 2 ** 63
+
+def _transition_alerts(request, new_status):
+    ids = request.data.get('ids')
+    if not isinstance(ids, list) or not ids or not all(_is_alert_id(pk) for pk in ids):
+        return Response({'error': 'Cần danh sách ids (số nguyên dương)'}, status=status.HTTP_400_BAD_REQUEST)
+    alerts, _ = scoped_alerts(request.user)
+    updated = alerts_service.transition(alerts.filter(pk__in=[int(pk) for pk in ids]), new_status)
+    return Response({'updated': updated})
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def acknowledge_alerts(request):
+    return _transition_alerts(request, 'ACK')
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def resolve_alerts(request):
+    return _transition_alerts(request, 'RESOLVED')
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def alert_unread_count(request):
+    _, device_ids = scoped_alerts(request.user)
+    return Response({'count': alerts_service.new_count(device_ids)})
+
 @api_view(['POST'])
 @permission_classes([])
 def upload_reading(request):
     try:
-        ph = float(request.POST.get('ph', 0))
-        ntu = float(request.POST.get('ntu', 0))
-        tds = float(request.POST.get('tds', 0))
-        
-        reading = Reading.objects.create(
-            ph=ph,
-            ntu=ntu,
-            tds=tds
-        )
-        
+        fields = parse_reading(request.data)
+        if 'device_id' in fields and not verify_device_key(fields['device_id'], request_device_key(request)):
+            return Response({'error': 'Khoá thiết bị không hợp lệ'}, status=403)
+
+        client = sharding.get_client()
+        if client is not None:
+            # Chế độ shard: chỉ worker sở hữu thiết bị được ghi Reading của nó
+            try:
+                payload, code = sharding.reply(client.submit(fields))
+            except OSError as e:
+                return Response({'error': f"Worker ingestion không phản hồi: {e}"}, status=503)
+            return Response(payload, status=code)
+
+        reading = record_reading(**fields)
         return Response({'message': 'Data received successfully', 'id': reading.pk})
-    except Exception as e:
+    except (TypeError, ValueError, IntegrityError) as e:
         return Response({'error': str(e)}, status=400)
-    
+
 def log_action(request, action, detail=""):
     ip = request.META.get('REMOTE_ADDR')
     UserActionHistory.objects.create(
@@ -334,10 +469,11 @@ def log_action(request, action, detail=""):
         ip_address=ip
     )
 
+@query_budget(4)
 @staff_member_required
 def access_report(request):
-    login_logs = LoginHistory.objects.all().order_by('-timestamp')[:50]
-    actions = UserActionHistory.objects.all().order_by('-timestamp')[:50]
+    login_logs = LoginHistory.objects.select_related('user').order_by('-timestamp')[:50]
+    actions = UserActionHistory.objects.select_related('user').order_by('-timestamp')[:50]
     return render(request, 'monitoring/access_report.html', {
         'login_logs': login_logs,
         'actions': actions
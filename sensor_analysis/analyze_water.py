@@ -1,13 +1,17 @@
 import pandas as pd
+from dataset import load_frame
 from sklearn.model_selection import train_test_split
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.experimental import enable_iterative_imputer  
 from sklearn.impute import IterativeImputer
+import matplotlib
+matplotlib.use('Agg')  # không cần màn hình, biểu đồ được lưu ra file
 import matplotlib.pyplot as plt
 import seaborn as sns
 
 try:
-    df = pd.read_csv('water_potability.csv')
+    # Đọc từ cache dạng cột (float32), chỉ parse CSV khi file thay đổi
+    df = load_frame('water_potability.csv')
 except FileNotFoundError:
     print("LỖI: Không tìm thấy file 'water_potability.csv'. Vui lòng tải và đặt vào cùng thư mục.")
     exit()
@@ -52,6 +56,7 @@ plt.title('Mức độ Quan trọng của các Thông số đến Chất lượn
 plt.xlabel('Điểm Quan trọng', fontsize=12)
 plt.ylabel('Thông số', fontsize=12)
 plt.tight_layout()
-plt.show()
+plt.savefig('feature_importance.png')
+print("=> Đã lưu biểu đồ vào feature_importance.png")
 
 print("\n--- CHƯƠNG TRÌNH KẾT THÚC ---")
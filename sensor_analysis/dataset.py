@@ -0,0 +1,144 @@
+"""
+Cache dạng cột cho các file CSV phân tích (water_potability.csv, file xuất từ export_readings).
+
+Lần đầu đọc, CSV được chuyển thành mỗi cột một file .npy (float32, hoặc int64 với cột số nguyên
+không thiếu giá trị, float64 epoch giây với cột thời gian ISO 8601, chuỗi độ dài cố định với cột
+văn bản khác) trong .cache/. Các lần sau chỉ cần memory-map các cột cần dùng. Cache tự làm mới khi file nguồn thay đổi (mtime/kích thước,
+rồi so sánh sha256 nội dung).
+
+    from dataset import load_frame, REDUCED_COLUMNS
+    df = load_frame('water_potability.csv', columns=REDUCED_COLUMNS)
+"""
+import csv
+import hashlib
+import json
+import math
+import os
+import shutil
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+HERE = Path(__file__).resolve().parent
+CACHE_DIR = HERE / '.cache'
+# Tăng khi đổi định dạng cache
+FORMAT_VERSION = 1
+
+# Các thông số đo được bằng cảm biến của dự án (trước đây là water_potability_reduced.csv)
+REDUCED_COLUMNS = ('ph', 'Solids', 'Turbidity', 'Potability')
+
+
+def _resolve(source):
+    path = Path(source)
+    if not path.is_absolute() and not path.exists():
+        path = HERE / path
+    return path.resolve()
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _cache_path(path, cache_dir):
+    key = hashlib.sha1(str(path).encode()).hexdigest()[:8]
+    return Path(cache_dir) / f'{path.stem}-{key}'
+
+
+def _parse_float(value):
+    return float(value) if value != '' else math.nan
+
+
+def _convert_column(values):
+    """Chọn kiểu lưu cho một cột chuỗi: int64, float32, thời gian (float64 epoch giây) hoặc giữ chuỗi"""
+    try:
+        numbers = [_parse_float(v) for v in values]
+    except ValueError:
+        try:
+            stamps = [datetime.fromisoformat(v).timestamp() if v else math.nan for v in values]
+        except ValueError:
+            # Cột văn bản (tên thiết bị, ghi chú...): kiểu unicode cố định để vẫn memory-map được
+            return np.asarray(values, dtype=np.str_), 'str'
+        return np.asarray(stamps, dtype=np.float64), 'datetime'
+    array = np.asarray(numbers, dtype=np.float64)
+    if array.size and not np.isnan(array).any() and np.all(array == np.round(array)):
+        return array.astype(np.int64), 'int64'
+    return array.astype(np.float32), 'float32'
+
+
+def _build(path, target, stat, sha256):
+    with open(path, newline='') as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        raw = [[] for _ in header]
+        for row in reader:
+            for i, value in enumerate(row):
+                raw[i].append(value.strip())
+
+    tmp = target.with_name(target.name + '.tmp')
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+    kinds = {}
+    for name, values in zip(header, raw):
+        array, kinds[name] = _convert_column(values)
+        np.save(tmp / f'{name}.npy', array)
+    meta = {
+        'format': FORMAT_VERSION,
+        'source': str(path),
+        'mtime_ns': stat.st_mtime_ns,
+        'size': stat.st_size,
+        'sha256': sha256,
+        'rows': len(raw[0]) if raw else 0,
+        'columns': kinds,
+    }
+    (tmp / 'meta.json').write_text(json.dumps(meta, indent=2))
+    shutil.rmtree(target, ignore_errors=True)
+    os.replace(tmp, target)
+    return meta
+
+
+def ensure_cache(source, cache_dir=CACHE_DIR):
+    """Đảm bảo cache của file nguồn còn mới, trả về (thư mục cache, meta)"""
+    path = _resolve(source)
+    target = _cache_path(path, cache_dir)
+    stat = path.stat()
+    meta_file = target / 'meta.json'
+    if meta_file.exists():
+        meta = json.loads(meta_file.read_text())
+        if meta.get('format') == FORMAT_VERSION:
+            if (meta['mtime_ns'], meta['size']) == (stat.st_mtime_ns, stat.st_size):
+                return target, meta
+            sha256 = _sha256(path)
+            if meta['sha256'] == sha256:
+                # Chỉ đổi mtime (copy/checkout lại), nội dung như cũ
+                meta.update(mtime_ns=stat.st_mtime_ns, size=stat.st_size)
+                meta_file.write_text(json.dumps(meta, indent=2))
+                return target, meta
+            return target, _build(path, target, stat, sha256)
+    return target, _build(path, target, stat, _sha256(path))
+
+
+def load_columns(source, columns=None, cache_dir=CACHE_DIR):
+    """Trả về dict {tên cột: mảng memory-map chỉ đọc}, chỉ mở các cột được yêu cầu"""
+    target, meta = ensure_cache(source, cache_dir)
+    names = list(columns) if columns is not None else list(meta['columns'])
+    missing = [name for name in names if name not in meta['columns']]
+    if missing:
+        raise KeyError(f"Không có cột {missing} trong {meta['source']}")
+    return {name: np.load(target / f'{name}.npy', mmap_mode='r') for name in names}
+
+
+def load_frame(source, columns=None, cache_dir=CACHE_DIR):
+    """Như load_columns nhưng trả về pandas DataFrame"""
+    import pandas as pd
+
+    return pd.DataFrame(load_columns(source, columns, cache_dir), copy=False)
+
+
+def source_hash(source, cache_dir=CACHE_DIR):
+    """sha256 nội dung file nguồn (lấy từ cache, không phải đọc lại file nếu chưa đổi)"""
+    return ensure_cache(source, cache_dir)[1]['sha256']
@@ -1,30 +1,98 @@
-import pandas as pd
-import matplotlib.pyplot as plt
-import mysql.connector
-
-# Kết nối MySQL
-conn = mysql.connector.connect(
-    host="localhost",
-    user="root",
-    password="root",
-    database="water_data"
-)
-
-# Đọc dữ liệu
-query = "SELECT created_at, ph, ntu, tds FROM sensor ORDER BY created_at"
-df = pd.read_sql(query, conn)
-conn.close()
-
-# Vẽ biểu đồ
-plt.figure(figsize=(12,6))
-plt.plot(df["created_at"], df["ph"], label="pH")
-plt.plot(df["created_at"], df["ntu"], label="NTU")
-plt.plot(df["created_at"], df["tds"], label="TDS")
-
-plt.xlabel("Thời gian")
-plt.ylabel("Giá trị")
-plt.title("Biểu đồ dữ liệu cảm biến nước")
-plt.legend()
-plt.xticks(rotation=45)
-plt.tight_layout()
-plt.show()
+"""
+Vẽ biểu đồ dữ liệu cảm biến từ database của Django, không cần màn hình.
+
+Dữ liệu được đọc theo từng đoạn và giảm mẫu theo pixel (min/trung bình/max mỗi cột pixel)
+ngay trong lúc đọc, nên bảng lớn (hàng trăm triệu dòng) vẫn chỉ dùng bộ nhớ cố định.
+
+Chạy:
+    python plot_data.py --device 1 --start 2025-01-01 --end 2025-02-01 --out sensor.png
+    python plot_data.py --out sensor.svg --width 1600
+"""
+import argparse
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.dates as mdates  # noqa: E402
+import matplotlib.pyplot as plt  # noqa: E402
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'water_monitor.settings')
+
+import django  # noqa: E402
+django.setup()
+
+from django.db.models import Max, Min  # noqa: E402
+from django.utils.dateparse import parse_datetime, parse_date  # noqa: E402
+from django.utils import timezone as dj_timezone  # noqa: E402
+
+from monitoring.db_router import use_replica  # noqa: E402
+from monitoring.models import Reading  # noqa: E402
+from monitoring.services.timeseries import MinMaxDownsampler, iter_reading_chunks  # noqa: E402
+
+SERIES = (('ph', 'pH', 'tab:blue'), ('ntu', 'NTU', 'tab:green'), ('tds', 'TDS (ppm)', 'tab:red'))
+DPI = 100
+
+
+def parse_time(value):
+    if value is None:
+        return None
+    parsed = parse_datetime(value) or datetime.combine(parse_date(value), datetime.min.time())
+    return dj_timezone.make_aware(parsed) if dj_timezone.is_naive(parsed) else parsed
+
+
+@use_replica()
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--device', type=int)
+    parser.add_argument('--start', help="YYYY-MM-DD hoặc ISO datetime")
+    parser.add_argument('--end', help="YYYY-MM-DD hoặc ISO datetime (không bao gồm)")
+    parser.add_argument('--out', default='sensor.png', help="File .png hoặc .svg")
+    parser.add_argument('--width', type=int, default=1200, help="Chiều rộng ảnh (pixel)")
+    parser.add_argument('--chunk-size', type=int, default=50000)
+    args = parser.parse_args(argv)
+
+    start, end = parse_time(args.start), parse_time(args.end)
+    if start is None or end is None:
+        readings = Reading.objects.all()
+        if args.device is not None:
+            readings = readings.filter(device_id=args.device)
+        bounds = readings.aggregate(lo=Min('timestamp'), hi=Max('timestamp'))
+        if bounds['lo'] is None:
+            print("Không có dữ liệu để vẽ")
+            return
+        start = start or bounds['lo']
+        end = end or bounds['hi'] + timedelta(microseconds=1)
+
+    fields = [name for name, _, _ in SERIES]
+    sampler = MinMaxDownsampler(start.timestamp(), end.timestamp(), args.width, fields)
+    rows = 0
+    for chunk in iter_reading_chunks(args.device, start, end, fields, args.chunk_size):
+        sampler.add(chunk['timestamp'], chunk)
+        rows += len(chunk['id'])
+
+    fig, axes = plt.subplots(len(SERIES), 1, sharex=True, figsize=(args.width / DPI, 8), dpi=DPI)
+    for ax, (field, label, color) in zip(axes, SERIES):
+        centers, lo, mean, hi = sampler.result(field)
+        x = [datetime.fromtimestamp(t, tz=timezone.utc) for t in centers]
+        ax.fill_between(x, lo, hi, color=color, alpha=0.25, linewidth=0)
+        ax.plot(x, mean, color=color, linewidth=1, label=label)
+        ax.set_ylabel(label)
+        ax.legend(loc='upper right')
+    axes[-1].set_xlabel("Thời gian")
+    axes[-1].xaxis.set_major_formatter(mdates.ConciseDateFormatter(axes[-1].xaxis.get_major_locator()))
+    title = "Biểu đồ dữ liệu cảm biến nước"
+    if args.device is not None:
+        title += f" - thiết bị {args.device}"
+    fig.suptitle(title)
+    fig.tight_layout()
+    fig.savefig(args.out)
+    plt.close(fig)
+    print(f"Đã vẽ {rows} bản ghi ({args.width} cột pixel) vào {args.out}")
+
+
+if __name__ == '__main__':
+    main()
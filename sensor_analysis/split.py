@@ -1,7 +1,7 @@
-import pandas as pd
+from dataset import REDUCED_COLUMNS, load_frame
 
-df = pd.read_csv("water_potability.csv")
-df_reduced = df[["ph", "Solids", "Turbidity", "Potability"]]
-df_reduced.to_csv("water_potability_reduced.csv", index=False)
+# Bộ dữ liệu rút gọn là phép chiếu trên cache dạng cột, không ghi ra CSV mới
+df_reduced = load_frame("water_potability.csv", columns=REDUCED_COLUMNS)
 
 print("Kích thước dataset rút gọn:", df_reduced.shape)
+print(df_reduced.dtypes.to_string())
@@ -0,0 +1,258 @@
+"""
+Pipeline huấn luyện mô hình potability trên 3 thông số đo được
+(ph, Solids ~ tds, Turbidity ~ ntu) và lưu thành artifact có phiên bản để web app dùng
+(monitoring/services/potability.py).
+
+- Chia train/test trước, IterativeImputer chỉ fit trên phần train (phần test chỉ transform)
+  nên metric trên tập test không lẫn thống kê của chính nó.
+- Imputer đã fit và ma trận đã impute được cache theo file đầu vào. Khi file chỉ được thêm
+  dòng mới ở cuối, lần huấn luyện lại chỉ transform các dòng mới bằng imputer đã lưu
+  (--refit-imputer để fit lại từ đầu).
+- Tìm siêu tham số bằng cross-validation, các (tham số, fold) chạy song song trong process pool.
+- Không cần màn hình: metrics ghi ra JSON, biểu đồ ghi ra PNG cạnh artifact.
+
+Nhãn phải là kết quả kiểm nghiệm thật (cột Potability của water_potability.csv). Không dùng cột
+potability của Reading: đó là điểm do chính mô hình này chấm.
+
+Chạy:
+    python train_potability.py [--csv water_potability.csv] [--out ../artifacts/potability] [--jobs 4]
+"""
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import pickle
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt  # noqa: E402
+import numpy as np  # noqa: E402
+from sklearn.ensemble import RandomForestClassifier  # noqa: E402
+from sklearn.experimental import enable_iterative_imputer  # noqa: E402,F401
+from sklearn.impute import IterativeImputer  # noqa: E402
+from sklearn.metrics import accuracy_score, roc_auc_score  # noqa: E402
+from sklearn.model_selection import StratifiedKFold, train_test_split  # noqa: E402
+from sklearn.pipeline import make_pipeline  # noqa: E402
+
+from dataset import load_columns, source_hash  # noqa: E402
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+from monitoring.services.model_registry import save_artifact  # noqa: E402
+
+# Trường của Reading -> cột trong water_potability.csv
+FEATURE_MAP = {'ph': 'ph', 'tds': 'Solids', 'ntu': 'Turbidity'}
+FEATURES = list(FEATURE_MAP)
+RANDOM_STATE = 42
+TEST_SIZE = 0.2
+# Tăng khi đổi cách tiền xử lý để cache cũ tự mất hiệu lực
+PREPROCESS_VERSION = 3
+
+PARAM_GRID = {
+    'n_estimators': [100, 200],
+    'max_depth': [None, 12],
+    'min_samples_leaf': [1, 4],
+}
+
+
+def load_matrix(path, label_column, label_threshold):
+    """Đọc các cột cần thiết từ cache dạng cột (sensor_analysis/dataset.py)"""
+    available = load_columns(path)
+    # File gốc dùng tên cột của water_potability.csv, file export_readings dùng tên trường Reading
+    names = [FEATURE_MAP[f] if FEATURE_MAP[f] in available else f for f in FEATURES]
+    X = np.column_stack([np.asarray(available[name], dtype=np.float64) for name in names])
+    label = np.asarray(available[label_column], dtype=np.float64)
+    keep = ~np.isnan(label)
+    X, label = X[keep], label[keep]
+    y = (label >= label_threshold).astype(int) if label_threshold is not None else label.astype(int)
+    return X, y
+
+
+def cache_key(*parts):
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+
+def _digest(X, y):
+    return hashlib.sha256(np.ascontiguousarray(X).tobytes() + np.ascontiguousarray(y).tobytes()).hexdigest()
+
+
+def _split_new(X, y, offset):
+    """Chia các dòng mới thêm vào train/test với tỉ lệ TEST_SIZE, cố định theo vị trí dòng"""
+    test = np.random.default_rng([RANDOM_STATE, offset]).random(len(y)) < TEST_SIZE
+    return X[~test], X[test], y[~test], y[test]
+
+
+def prepare_features(path, cache_dir, label_column, label_threshold, refit=False):
+    """
+    Trả về (X_train, X_test, y_train, y_test, imputer, mode) đã impute.
+    mode: 'cache' (dữ liệu không đổi), 'incremental' (chỉ impute dòng mới), 'full'.
+    """
+    X, y = load_matrix(path, label_column, label_threshold)
+    key = cache_key(str(Path(path).resolve()), label_column, label_threshold, PREPROCESS_VERSION, RANDOM_STATE)
+    cache_file = Path(cache_dir) / f'features-{key}.pkl'
+    state = None
+    if cache_file.exists() and not refit:
+        with open(cache_file, 'rb') as f:
+            state = pickle.load(f)
+        seen = state['rows']
+        # Chỉ dùng lại khi các dòng đã xử lý không đổi (file chỉ được thêm dòng ở cuối)
+        if seen > len(y) or _digest(X[:seen], y[:seen]) != state['digest']:
+            state = None
+
+    if state is not None and state['rows'] == len(y):
+        mode = 'cache'
+    elif state is not None:
+        mode = 'incremental'
+        seen, imputer = state['rows'], state['imputer']
+        new_train, new_test, new_y_train, new_y_test = _split_new(X[seen:], y[seen:], seen)
+        state.update(
+            X_train=np.vstack([state['X_train'], imputer.transform(new_train)]) if len(new_train) else state['X_train'],
+            X_test=np.vstack([state['X_test'], imputer.transform(new_test)]) if len(new_test) else state['X_test'],
+            y_train=np.concatenate([state['y_train'], new_y_train]),
+            y_test=np.concatenate([state['y_test'], new_y_test]),
+        )
+    else:
+        mode = 'full'
+        X_train, X_test, y_train, y_test = train_test_split(
+            X, y, test_size=TEST_SIZE, random_state=RANDOM_STATE, stratify=y)
+        imputer = IterativeImputer(random_state=RANDOM_STATE)
+        state = {
+            'imputer': imputer,
+            'X_train': imputer.fit_transform(X_train), 'X_test': imputer.transform(X_test),
+            'y_train': y_train, 'y_test': y_test,
+        }
+
+    if mode != 'cache':
+        state.update(rows=len(y), digest=_digest(X, y))
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp = cache_file.with_suffix('.tmp')
+        with open(tmp, 'wb') as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, cache_file)
+    return state['X_train'], state['X_test'], state['y_train'], state['y_test'], state['imputer'], mode
+
+
+_X = _y = None
+
+
+def _init_worker(X, y):
+    # Mỗi process nhận dữ liệu một lần thay vì theo từng task
+    global _X, _y
+    _X, _y = X, y
+
+
+def _fit_fold(task):
+    params, train_idx, test_idx = task
+    model = RandomForestClassifier(random_state=RANDOM_STATE, n_jobs=1, **params)
+    model.fit(_X[train_idx], _y[train_idx])
+    return roc_auc_score(_y[test_idx], model.predict_proba(_X[test_idx])[:, 1])
+
+
+def search(X, y, folds, jobs, cache_file=None):
+    """
+    Cross-validation cho mọi tổ hợp PARAM_GRID; trả về danh sách (params, mean_auc) giảm dần.
+    Kết quả được cache theo dữ liệu + lưới tham số.
+    """
+    if cache_file is not None and cache_file.exists():
+        return [tuple(item) for item in json.loads(cache_file.read_text())]
+    grid = [dict(zip(PARAM_GRID, values)) for values in itertools.product(*PARAM_GRID.values())]
+    splits = list(StratifiedKFold(n_splits=folds, shuffle=True, random_state=RANDOM_STATE).split(X, y))
+    tasks = [(params, train, test) for params in grid for train, test in splits]
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker, initargs=(X, y)) as pool:
+        scores = list(pool.map(_fit_fold, tasks, chunksize=max(1, len(tasks) // (jobs * 4))))
+    results = [
+        (params, float(np.mean(scores[i * folds:(i + 1) * folds])))
+        for i, params in enumerate(grid)
+    ]
+    results = sorted(results, key=lambda item: item[1], reverse=True)
+    if cache_file is not None:
+        cache_file.write_text(json.dumps(results))
+    return results
+
+
+def previous_params(out):
+    """Tham số tốt nhất của artifact mới nhất, dùng khi bỏ qua bước tìm kiếm"""
+    metrics = sorted(Path(out).glob('potability-v*-metrics.json'),
+                     key=lambda p: int(p.name.split('-v')[1].split('-')[0]))
+    if not metrics:
+        return None
+    data = json.loads(metrics[-1].read_text())
+    return data['best_params'], data['cv_roc_auc']
+
+
+def plot_importance(model, path):
+    fig, ax = plt.subplots(figsize=(8, 4))
+    ax.barh(FEATURES, model.feature_importances_)
+    ax.set_xlabel('Điểm Quan trọng')
+    ax.set_title('Mức độ Quan trọng của các Thông số (Random Forest)')
+    fig.tight_layout()
+    fig.savefig(path)
+    plt.close(fig)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--csv', default=str(Path(__file__).parent / 'water_potability.csv'))
+    parser.add_argument('--label-column', default='Potability')
+    parser.add_argument('--label-threshold', type=float, help="Nhị phân hóa nhãn liên tục (nhãn >= ngưỡng là 1)")
+    parser.add_argument('--out', default=str(ROOT / 'artifacts' / 'potability'))
+    parser.add_argument('--cache-dir', default=str(ROOT / 'artifacts' / 'cache'))
+    parser.add_argument('--folds', type=int, default=5)
+    parser.add_argument('--jobs', type=int, default=os.cpu_count())
+    parser.add_argument('--reuse-params', action='store_true',
+                        help="Bỏ qua tìm siêu tham số, dùng tham số của artifact mới nhất")
+    parser.add_argument('--refit-imputer', action='store_true',
+                        help="Fit lại IterativeImputer trên toàn bộ tập train thay vì dùng bản đã cache")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    X_train, X_test, y_train, y_test, imputer, mode = prepare_features(
+        args.csv, args.cache_dir, args.label_column, args.label_threshold, refit=args.refit_imputer)
+    prep_seconds = time.perf_counter() - started
+    rows = len(y_train) + len(y_test)
+    print(f"Tiền xử lý: {rows} dòng ({mode}, {prep_seconds:.2f}s)")
+
+    previous = previous_params(args.out) if args.reuse_params else None
+    if previous is not None:
+        results = [previous]
+    else:
+        key = cache_key(source_hash(args.csv), args.label_column, args.label_threshold,
+                        PREPROCESS_VERSION, RANDOM_STATE, PARAM_GRID, args.folds)
+        results = search(X_train, y_train, args.folds, args.jobs, Path(args.cache_dir) / f'search-{key}.json')
+    best_params, cv_auc = results[0]
+    print(f"Tham số tốt nhất: {best_params} (CV ROC AUC {cv_auc:.4f})")
+
+    model = RandomForestClassifier(random_state=RANDOM_STATE, n_jobs=args.jobs, **best_params)
+    model.fit(X_train, y_train)
+    proba = model.predict_proba(X_test)[:, 1]
+    metrics = {
+        'accuracy': float(accuracy_score(y_test, proba >= 0.5)),
+        'roc_auc': float(roc_auc_score(y_test, proba)),
+        'cv_roc_auc': cv_auc,
+        'best_params': best_params,
+        'search': [{'params': params, 'cv_roc_auc': score} for params, score in results],
+        'rows': int(rows),
+        'preprocess': mode,
+        'seconds': round(time.perf_counter() - started, 2),
+    }
+
+    model.set_params(n_jobs=1)
+    version = save_artifact(args.out, 'potability', make_pipeline(imputer, model), FEATURES, metrics, extra={
+        'source': Path(args.csv).name,
+        'source_sha256': source_hash(args.csv),
+        'label_column': args.label_column,
+    })
+    out = Path(args.out)
+    (out / f'potability-v{version}-metrics.json').write_text(json.dumps(metrics, indent=2))
+    plot_importance(model, out / f'potability-v{version}-importance.png')
+    print(f"=> Đã lưu mô hình potability v{version} vào {out}: "
+          f"accuracy={metrics['accuracy']:.4f} roc_auc={metrics['roc_auc']:.4f} ({metrics['seconds']}s)")
+
+
+if __name__ == '__main__':
+    main()
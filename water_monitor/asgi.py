@@ -3,6 +3,18 @@ ASGI config for water_monitor project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Các request có đường dẫn bắt đầu bằng ``settings.FAST_PATH_PREFIX`` (``/fast/``) được
+xử lý bởi một handler riêng chỉ dùng ``settings.FAST_PATH_MIDDLEWARE`` (không session,
+CSRF, messages, auth); mọi request khác đi qua stack middleware đầy đủ như bình thường.
+
+Chạy bằng uvicorn (fast path cho thiết bị + toàn bộ web app):
+
+    pip install "uvicorn[standard]"
+    uvicorn water_monitor.asgi:application --host 0.0.0.0 --port 8000 --workers 4
+
+Thiết bị gửi dữ liệu tới ``POST /fast/upload-reading/`` và đọc ``GET /fast/latest-reading/``.
+So sánh với đường WSGI: ``python benchmarks/bench_fast_path.py``.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -10,7 +22,32 @@ https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 import os
 
 from django.core.asgi import get_asgi_application
+from django.core.handlers.asgi import ASGIHandler
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'water_monitor.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from django.conf import settings  # noqa: E402
+
+
+class FastPathASGIHandler(ASGIHandler):
+    """ASGIHandler dùng FAST_PATH_MIDDLEWARE thay cho MIDDLEWARE"""
+
+    def load_middleware(self, is_async=False):
+        # Chỉ chạy một lần lúc khởi tạo, trước khi nhận request
+        middleware = settings.MIDDLEWARE
+        settings.MIDDLEWARE = settings.FAST_PATH_MIDDLEWARE
+        try:
+            super().load_middleware(is_async)
+        finally:
+            settings.MIDDLEWARE = middleware
+
+
+fast_application = FastPathASGIHandler()
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'http' and scope['path'].startswith(settings.FAST_PATH_PREFIX):
+        return await fast_application(scope, receive, send)
+    return await django_application(scope, receive, send)
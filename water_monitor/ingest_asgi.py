@@ -0,0 +1,15 @@
+"""
+ASGI cho tiến trình chỉ nhận dữ liệu thiết bị (settings_ingest: không middleware, không DRF).
+
+    uvicorn water_monitor.ingest_asgi:application --workers 4
+
+/fast/upload-reading/ và /fast/latest-reading/ chạy async với group commit;
+/api/... vẫn dùng được (view đồng bộ chạy trong thread).
+"""
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'water_monitor.settings_ingest')
+
+application = get_asgi_application()
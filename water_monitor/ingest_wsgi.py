@@ -0,0 +1,15 @@
+"""
+WSGI cho tiến trình chỉ nhận dữ liệu thiết bị (settings_ingest: không middleware, không DRF).
+
+    gunicorn water_monitor.ingest_wsgi:application --workers 4
+
+Đặt sau reverse proxy, chuyển /api/upload-reading/ và /api/latest-reading/ tới đây,
+các URL còn lại tới water_monitor.wsgi. So sánh: python benchmarks/bench_ingest_app.py
+"""
+import os
+
+from django.core.wsgi import get_wsgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'water_monitor.settings_ingest')
+
+application = get_wsgi_application()
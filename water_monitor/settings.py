@@ -25,6 +25,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'monitoring.profiling.QueryProfilerMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -32,8 +33,18 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'monitoring.middleware.ReplicaStickyMiddleware',
 ]
 
+# Middleware cho fast path ASGI (chỉ các URL bắt đầu bằng FAST_PATH_PREFIX).
+# Để trống: mỗi middleware kiểu MiddlewareMixin tốn 2 lần chuyển thread cho mỗi request async.
+FAST_PATH_PREFIX = '/fast/'
+FAST_PATH_MIDDLEWARE = []
+
+# Header X-Query-Count/X-Query-Time-Ms/X-Query-Duplicates cho mỗi response và cảnh báo khi view
+# vượt query_budget (xem monitoring/profiling.py)
+QUERY_PROFILER = DEBUG
+
 ROOT_URLCONF = 'water_monitor.urls'
 
 TEMPLATES = [
@@ -46,6 +57,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'monitoring.context_processors.alert_badge',
             ],
         },
     },
@@ -63,11 +75,62 @@ DATABASES = {
         'PORT': '3306',                     
         'OPTIONS': {
             'init_command': "SET sql_mode='STRICT_TRANS_TABLES'"
-        }
+        },
+        # Giữ kết nối giữa các request, kiểm tra lại trước khi dùng
+        'CONN_MAX_AGE': 60,
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# Read-replica cho dashboard/báo cáo/export (xem monitoring/db_router.py)
+if os.environ.get('DB_REPLICA_HOST'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'HOST': os.environ['DB_REPLICA_HOST'],
+        'PORT': os.environ.get('DB_REPLICA_PORT', '3306'),
+    }
+
+# Chạy/test local không cần MySQL: hai file SQLite thay cho primary và replica
+if os.environ.get('WATER_MONITOR_DB') == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.sqlite3',
+        },
+        'replica': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db_replica.sqlite3',
+            'TEST': {'MIRROR': 'default'},
+        },
+    }
+
+DATABASE_ROUTERS = ['monitoring.db_router.PrimaryReplicaRouter']
+# Sau khi ghi, đọc từ primary trong bấy nhiêu giây (tránh độ trễ replication)
+REPLICA_STICKY_SECONDS = 5
+REPLICA_HEALTH_CHECK_INTERVAL = 10
+
 AUTH_USER_MODEL = 'monitoring.User'
+# Session và User của request đã đăng nhập được đọc từ cache (cần cache dùng chung, xem REDIS_URL),
+# không truy vấn DB mỗi request. ModelBackend giữ lại để session tạo trước khi đổi backend vẫn hợp lệ.
+AUTHENTICATION_BACKENDS = [
+    'monitoring.auth_backends.CachedModelBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
+AUTH_USER_CACHE_TIMEOUT = 300
+SESSION_ENGINE = 'django.contrib.sessions.backends.db'
+
+# Nhiều process (gunicorn/uvicorn workers) cần cache dùng chung để việc xoá cache
+# khi đổi vai trò/mật khẩu có hiệu lực ở mọi process
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+    # Chỉ đọc session qua cache khi cache dùng chung: với LocMem, session bị xoá (logout, đổi mật khẩu)
+    # ở một worker vẫn còn trong cache của các worker khác
+    SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
     {'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator'},
@@ -113,3 +176,46 @@ EMAIL_HOST_PASSWORD = 'your-app-password'
 DEFAULT_FROM_EMAIL = 'Water Monitor <noreply@watermonitor.com>'
 
 SITE_URL = 'http://localhost:8000'
+
+# Worker ingestion theo shard (monitoring/services/sharding.py, manage.py run_ingest_shards),
+# vd. INGEST_SHARDS=unix:/run/wm/shard0.sock,unix:/run/wm/shard1.sock. Để trống: ghi trực tiếp.
+INGEST_SHARDS = [a for a in os.environ.get('INGEST_SHARDS', '').split(',') if a]
+
+# Theo dõi thiết bị mất kết nối (monitoring/services/liveness.py), chạy bằng `manage.py run_liveness`
+LIVENESS = {
+    'ENABLED': True,
+    'GRACE': 3,
+    'TICK': 1.0,
+    'RELOAD_INTERVAL': 300,
+    'SYNC_OVERLAP': 5,
+    'LEADER_TTL': 30,
+    'LOW_BATTERY': 20,
+    'WEAK_SIGNAL': -85,
+}
+
+# Chỉ số dẫn xuất lưu trên Reading khi nhận dữ liệu (monitoring/services/derived.py);
+# dữ liệu cũ: `manage.py backfill_derived --baselines`
+DERIVED_METRICS = {
+    'METRICS': ('wqi', 'quality_band', 'baseline_deviation'),
+    'BASELINE_DAYS': 30,
+    'BASELINE_REFRESH': 86400,
+}
+
+# Email thông báo cảnh báo, gộp theo người nhận + thiết bị (monitoring/services/notifications.py)
+NOTIFICATIONS = {
+    'ENABLED': True,
+    'WINDOW': 300,
+    'MIN_SEVERITY': 'MEDIUM',
+    'RATE_LIMIT': 12,
+    'MAX_RETRIES': 3,
+    'BACKOFF': 2.0,
+}
+
+# Mô hình dự đoán khả năng uống được (sensor_analysis/train_potability.py)
+POTABILITY = {
+    'MODEL_DIR': BASE_DIR / 'artifacts' / 'potability',
+    'MODEL_VERSION': None,
+    'BATCH_SIZE': 64,
+    'MAX_DELAY': 2.0,
+    'ALERT_THRESHOLD': 0.3,
+}
@@ -0,0 +1,21 @@
+"""
+Cấu hình rút gọn cho tiến trình chỉ nhận dữ liệu từ thiết bị
+(water_monitor/ingest_wsgi.py, water_monitor/ingest_asgi.py).
+
+Dùng chung database/cache với settings.py nhưng không có admin, session, messages, DRF,
+không middleware và chỉ có các URL ingestion (water_monitor/urls_ingest.py).
+"""
+from .settings import *  # noqa: F401,F403
+
+INSTALLED_APPS = [
+    'django.contrib.auth',           # monitoring.User kế thừa AbstractUser
+    'django.contrib.contenttypes',
+    'monitoring.apps.MonitoringConfig',
+]
+
+# Thiết bị không dùng cookie/session/CSRF; ghi luôn vào primary nên không cần ReplicaStickyMiddleware
+MIDDLEWARE = []
+
+ROOT_URLCONF = 'water_monitor.urls_ingest'
+TEMPLATES = []
+WSGI_APPLICATION = 'water_monitor.ingest_wsgi.application'
@@ -0,0 +1,11 @@
+from django.urls import path
+
+from monitoring import async_views, ingest_views
+
+# URL giống ứng dụng chính để thiết bị không phải đổi cấu hình
+urlpatterns = [
+    path('api/upload-reading/', ingest_views.upload_reading, name='upload-reading'),
+    path('api/latest-reading/', ingest_views.latest_reading, name='latest-reading'),
+    path('fast/upload-reading/', async_views.upload_reading_fast, name='fast-upload-reading'),
+    path('fast/latest-reading/', async_views.latest_reading_fast, name='fast-latest-reading'),
+]